@@ -0,0 +1,423 @@
+"""
+基准测试 - 在合成的大数据集上测量内置命令的性能
+生成的工作负载：
+    UTF-8 和 GBK 编码的文本日志
+    包含大量条目的目录、深层目录树
+    包含大量可执行文件的 PATH 目录
+通过 CommandExecutor 接口测量 cat / head / tail / wc / grep / ls / rm -r、
+命令分派、相似命令提示和启动时间，结果写入 JSON，并可与基线比较：
+任一项的中位数比基线慢超过阈值时以退出码 1 结束，用于发布前发现性能回退。
+
+用法:
+    python benchmarks/bench.py                               # quick 规模，结果输出到屏幕
+    python benchmarks/bench.py --scale full -o results.json  # 1G/10G 日志、100万条目目录
+    python benchmarks/bench.py --baseline baseline.json      # 与基线比较
+    python benchmarks/bench.py --only grep,wc -r 10
+
+生成的数据集缓存在工作目录（--workdir）中，再次运行时直接复用。
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.BasicManager.MetricsManager import metrics  # noqa: E402
+from src.BasicManager.OutputManager import redirect_output  # noqa: E402
+from src.CommandManager.Command import CommandExecutor  # noqa: E402
+from src.CommandManager.Completion import command_index  # noqa: E402
+from src.CommandManager.Session import Session  # noqa: E402
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# 各规模的数据集参数
+SCALES = {
+    'quick': {
+        'logs': [('log-64m', 64 * MB)],
+        'dir_entries': 20000,
+        'tree_depth': 200,
+        'path_executables': 2000,
+    },
+    'full': {
+        'logs': [('log-1g', GB), ('log-10g', 10 * GB)],
+        'dir_entries': 1000000,
+        'tree_depth': 2000,
+        'path_executables': 20000,
+    },
+}
+
+# 默认回退阈值：中位数比基线慢 10% 以上
+DEFAULT_THRESHOLD = 0.10
+
+_LOG_LINES = [
+    "2024-05-01 12:00:{sec:02d} INFO  request id={n} path=/api/v1/items status=200 time=12ms\n",
+    "2024-05-01 12:00:{sec:02d} DEBUG cache hit key=item:{n} ttl=300\n",
+    "2024-05-01 12:00:{sec:02d} WARN  slow query table=orders rows={n} time=250ms\n",
+    "2024-05-01 12:00:{sec:02d} INFO  用户 {n} 登录成功 来源=内网\n",
+]
+# grep 的目标：每个数据块只出现一次
+_NEEDLE = "ERROR 数据库连接超时"
+
+
+class _Discard:
+    """丢弃被测命令的输出"""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+# ---------------------------------------------------------------- 数据集
+
+def _log_block():
+    lines = [_LOG_LINES[n % len(_LOG_LINES)].format(sec=n % 60, n=n) for n in range(4096)]
+    lines[2048] = f"2024-05-01 12:00:00 {_NEEDLE} host=db-{len(lines)}\n"
+    return ''.join(lines)
+
+
+def make_log(path, size, encoding):
+    """按数据块重复写出指定大小的日志文件（已存在且大小足够时跳过）"""
+    if os.path.exists(path) and os.path.getsize(path) >= size:
+        return path
+    block = _log_block().encode(encoding)
+    chunk = block * max(1, (4 * MB) // len(block))
+    with open(path + '.tmp', 'wb') as f:
+        written = 0
+        while written < size:
+            f.write(chunk)
+            written += len(chunk)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def make_wide_dir(path, entries):
+    """创建包含大量空文件的目录"""
+    marker = os.path.join(path, '.complete')
+    if os.path.exists(marker):
+        return path
+    os.makedirs(path, exist_ok=True)
+    for i in range(entries):
+        fd = os.open(os.path.join(path, f"file{i:07d}.txt"), os.O_CREAT | os.O_WRONLY, 0o644)
+        os.close(fd)
+    open(marker, 'w').close()
+    return path
+
+
+def max_tree_depth(path, files_per_level=3):
+    """make_deep_tree 在 path 下能创建的最大深度：最深的文件路径不超过 PATH_MAX"""
+    try:
+        path_max = os.pathconf(os.path.dirname(os.path.abspath(path)), 'PC_PATH_MAX')
+    except (AttributeError, OSError, ValueError):
+        path_max = 4096
+    leaf = len(f"/f{files_per_level - 1}") + 1  # 文件名和结尾的 NUL
+    return (path_max - len(os.path.abspath(path)) - leaf) // len(os.sep + _LEVEL_NAME)
+
+
+# 深层目录树每层的目录名（取单个字符，使路径尽量短）
+_LEVEL_NAME = 'd'
+
+
+def make_deep_tree(path, depth, files_per_level=3):
+    """
+    创建深层目录树（每层一个子目录和若干文件）
+    逐层通过目录描述符创建，不拼接完整路径，创建过程本身不受 PATH_MAX 限制
+    """
+    os.makedirs(path, exist_ok=True)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        for _ in range(depth):
+            os.mkdir(_LEVEL_NAME, dir_fd=fd)
+            child = os.open(_LEVEL_NAME, os.O_RDONLY, dir_fd=fd)
+            os.close(fd)
+            fd = child
+            for i in range(files_per_level):
+                file_fd = os.open(f"f{i}", os.O_CREAT | os.O_WRONLY, 0o644, dir_fd=fd)
+                try:
+                    os.write(file_fd, b"x" * 64)
+                finally:
+                    os.close(file_fd)
+    finally:
+        os.close(fd)
+    return path
+
+
+def remove_tree(path):
+    """删除目录树（迭代实现，shutil.rmtree 在深层目录上会超过递归深度）"""
+    if not os.path.lexists(path):
+        return
+    directories = []
+    pending = [path]
+    while pending:
+        directory = pending.pop()
+        directories.append(directory)
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                else:
+                    os.unlink(entry.path)
+    # 父目录先于子目录加入列表，倒序删除
+    for directory in reversed(directories):
+        os.rmdir(directory)
+
+
+def make_path_dir(path, count):
+    """创建包含大量可执行文件的 PATH 目录"""
+    marker = os.path.join(path, '.complete')
+    if os.path.exists(marker):
+        return path
+    os.makedirs(path, exist_ok=True)
+    for i in range(count):
+        name = os.path.join(path, f"tool-{i:05d}")
+        fd = os.open(name, os.O_CREAT | os.O_WRONLY, 0o755)
+        os.close(fd)
+    open(marker, 'w').close()
+    return path
+
+
+# ---------------------------------------------------------------- 测量
+
+def measure(func, repeat, setup=None):
+    """执行 repeat 次，返回每次的耗时（秒）"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(times, per=1, size=None):
+    """
+    :param per: 每次测量包含的操作数（结果换算为单次操作的耗时）
+    :param size: 每次测量处理的字节数，用于计算吞吐量
+    """
+    times = [t / per for t in times]
+    result = {
+        'runs': len(times),
+        'min': min(times),
+        'median': statistics.median(times),
+        'max': max(times),
+    }
+    if size:
+        result['throughput_mb_s'] = size / MB / result['median']
+    return result
+
+
+class Bench:
+    def __init__(self, workdir, scale, repeat, only=None):
+        self.workdir = workdir
+        self.scale = SCALES[scale]
+        self.scale_name = scale
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+        os.makedirs(workdir, exist_ok=True)
+        self.bin_dir = make_path_dir(os.path.join(workdir, 'bin'), self.scale['path_executables'])
+        env = dict(os.environ)
+        env['PATH'] = self.bin_dir + os.pathsep + env.get('PATH', '')
+        self.executor = CommandExecutor(session=Session(workdir, env))
+        # 只测量命令本身，不记录统计
+        metrics.enabled = False
+
+    def wanted(self, name):
+        return not self.only or any(name == key or name.startswith(key + '.') for key in self.only)
+
+    def run_line(self, line):
+        with redirect_output(_Discard()):
+            self.executor.execute(line)
+
+    def record(self, name, result):
+        self.results[name] = result
+        extra = f"  {result['throughput_mb_s']:.1f} MB/s" if 'throughput_mb_s' in result else ''
+        print(f"{name:<28} median {_format_seconds(result['median']):>10}  "
+              f"min {_format_seconds(result['min']):>10}{extra}", flush=True)
+
+    def bench_line(self, name, line, size=None, repeat=None, setup=None):
+        if not self.wanted(name):
+            return
+        times = measure(lambda: self.run_line(line), repeat or self.repeat, setup)
+        self.record(name, summarize(times, size=size))
+
+    # ------------------------------------------------------------ 各项测试
+
+    def bench_files(self):
+        commands = ('cat', 'head', 'tail', 'wc', 'grep')
+        if self.only and not any(c in self.only for c in commands):
+            return
+        for label, size in self.scale['logs']:
+            for encoding in ('utf-8', 'gbk'):
+                suffix = 'utf8' if encoding == 'utf-8' else 'gbk'
+                name = f"{label}-{suffix}.log"
+                path = os.path.join(self.workdir, name)
+                print(f"准备数据: {name}", flush=True)
+                make_log(path, size, encoding)
+                actual = os.path.getsize(path)
+                key = f"{label}.{suffix}"
+                self.bench_line(f"cat.{key}", f"cat {name}", actual)
+                self.bench_line(f"head.{key}", f"head -n 10 {name}")
+                self.bench_line(f"tail.{key}", f"tail -n 10 {name}")
+                self.bench_line(f"wc.{key}", f"wc {name}", actual)
+                self.bench_line(f"grep.{key}", f"grep '{_NEEDLE}' {name}", actual)
+
+    def bench_ls(self):
+        if not self.wanted('ls'):
+            return
+        entries = self.scale['dir_entries']
+        print(f"准备数据: {entries} 个条目的目录", flush=True)
+        make_wide_dir(os.path.join(self.workdir, 'wide'), entries)
+        self.bench_line(f"ls.{entries}", "ls wide")
+        self.bench_line(f"ls.{entries}.long", "ls -l wide")
+
+    def bench_rm(self):
+        if not self.wanted('rm'):
+            return
+        tree = os.path.join(self.workdir, 'deep')
+        depth = self.scale['tree_depth']
+        limit = max_tree_depth(tree)
+        if depth > limit:
+            # rm 按完整路径删除，最深的路径必须在 PATH_MAX 以内
+            print(f"目录树深度 {depth} 超过 PATH_MAX 允许的 {limit} 层，按 {limit} 层测量")
+            depth = limit
+
+        def setup():
+            remove_tree(tree)
+            make_deep_tree(tree, depth)
+
+        self.bench_line(f"rm.deep{depth}", "rm -r -f deep", setup=setup)
+        if os.path.lexists(tree):
+            # 删除失败时测得的只是报错的时间
+            remove_tree(tree)
+            raise RuntimeError(f"rm -r 未能删除 {depth} 层的目录树，rm.deep{depth} 的结果无效")
+
+    def bench_dispatch(self):
+        if not self.wanted('dispatch'):
+            return
+        count = 10000
+        executor = self.executor
+
+        def loop():
+            with redirect_output(_Discard()):
+                for _ in range(count):
+                    executor.execute("pwd")
+
+        self.record('dispatch.pwd', summarize(measure(loop, self.repeat), per=count))
+
+    def bench_suggest(self):
+        if not self.wanted('suggest'):
+            return
+        executor = self.executor
+        command_index.refresh(executor.session.getenv('PATH', ''), force=True)
+        count = 20
+        self.record('suggest.typo', summarize(
+            measure(lambda: [executor.find_similar_commands('gerp') for _ in range(count)], self.repeat),
+            per=count))
+
+    def bench_startup(self):
+        if not self.wanted('startup'):
+            return
+        self.record('startup.executor', summarize(
+            measure(lambda: CommandExecutor(session=Session(self.workdir)), self.repeat)))
+        code = "from src.CommandManager.Command import CommandExecutor; CommandExecutor()"
+        self.record('startup.process', summarize(
+            measure(lambda: subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True),
+                    self.repeat)))
+
+    def run(self):
+        self.bench_startup()
+        self.bench_dispatch()
+        self.bench_suggest()
+        self.bench_files()
+        self.bench_ls()
+        self.bench_rm()
+        return {
+            'meta': {
+                'timestamp': time.time(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'scale': self.scale_name,
+                'repeat': self.repeat,
+            },
+            'results': self.results,
+        }
+
+
+# ---------------------------------------------------------------- 基线比较
+
+def compare(results, baseline, threshold):
+    """
+    与基线比较各项的中位数
+    :return: 回退的测试项列表 [(名称, 基线, 当前, 变化比例)]
+    """
+    regressions = []
+    # 中文标题按显示宽度（每字占两列）对齐
+    print(f"\n{'测试项':<25}{'基线':>10}{'当前':>10}{'变化':>8}")
+    for name, result in sorted(results['results'].items()):
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f"{name:<28}{'-':>12}{_format_seconds(result['median']):>12}{'新增':>8}")
+            continue
+        change = result['median'] / base['median'] - 1 if base['median'] else 0.0
+        flag = '  回退' if change > threshold else ''
+        print(f"{name:<28}{_format_seconds(base['median']):>12}{_format_seconds(result['median']):>12}"
+              f"{change:>+10.1%}{flag}")
+        if change > threshold:
+            regressions.append((name, base['median'], result['median'], change))
+    return regressions
+
+
+def _format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PythonCMD 内置命令基准测试')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='quick', help='数据集规模')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'pcnext-bench'),
+                        help='数据集目录（生成的数据会保留以便复用）')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='每项测试的重复次数')
+    parser.add_argument('--only', help='只运行指定的测试项（逗号分隔，如 grep,wc,dispatch）')
+    parser.add_argument('-o', '--output', help='结果JSON文件')
+    parser.add_argument('--baseline', help='基线结果JSON文件')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='判定为回退的中位数变慢比例（默认 0.10）')
+    options = parser.parse_args(argv)
+
+    only = [item.strip() for item in options.only.split(',')] if options.only else None
+    results = Bench(options.workdir, options.scale, options.repeat, only).run()
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {options.output}")
+
+    if options.baseline:
+        with open(options.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 项性能回退超过 {options.threshold:.0%}")
+            return 1
+        print("\n没有超过阈值的性能回退")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
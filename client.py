@@ -0,0 +1,6 @@
+import sys
+
+import src.DaemonManager.Client
+
+if __name__ == '__main__':
+    sys.exit(src.DaemonManager.Client.main())
@@ -1,5 +1,43 @@
+import argparse
+import atexit
+import sys
+
 import src.PythonCMD
+from src.BasicManager.ErrorManager import error_manager
+from src.BasicManager.LogManager import enable_error_log
+from src.BasicManager.MemoryManager import memory_tracer, parse_size
+from src.TraceManager.Recorder import trace_recorder
 
 if __name__ == '__main__':
-    P = src.PythonCMD.pc()
-    P.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='PythonCMD')
+    parser.add_argument('--daemon', action='store_true', help='以守护进程模式运行，通过Unix套接字接收命令')
+    parser.add_argument('--socket', help='守护进程套接字路径')
+    parser.add_argument('script', nargs='?', help='要执行的脚本文件（省略时进入交互模式）')
+    parser.add_argument('--error-log', help='以NDJSON格式记录错误的日志文件（也可通过 PCNEXT_ERROR_LOG 指定）')
+    parser.add_argument('--trace-memory', action='store_true', help='跟踪每条命令的内存峰值和残留增量')
+    parser.add_argument('--memory-limit', help='命令残留内存上限（如 64M），超过时报告可能的内存泄漏')
+    parser.add_argument('--record', help='把执行的命令行录制到跟踪文件（供 replay.py 回放）')
+    options = parser.parse_args()
+
+    if enable_error_log(options.error_log):
+        atexit.register(error_manager.close_sinks)
+
+    if options.memory_limit:
+        try:
+            memory_tracer.limit = parse_size(options.memory_limit)
+        except ValueError as e:
+            parser.error(str(e))
+    if options.trace_memory:
+        memory_tracer.enable()
+
+    if options.record:
+        trace_recorder.open(options.record)
+
+    if options.daemon:
+        from src.DaemonManager.Server import DaemonServer
+        DaemonServer(options.socket).serve()
+    elif options.script:
+        sys.exit(src.PythonCMD.pc().run_script(options.script) or 0)
+    else:
+        P = src.PythonCMD.pc()
+        P.run()
@@ -0,0 +1,6 @@
+import sys
+
+import src.TraceManager.Replay
+
+if __name__ == '__main__':
+    sys.exit(src.TraceManager.Replay.main())
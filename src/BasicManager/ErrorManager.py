@@ -15,6 +15,15 @@
 1000-1024: 保留错误
 """
 
+import threading
+from contextlib import contextmanager
+from time import time as _now
+
+from .OutputManager import error_output
+
+# 错误历史容量：只保留最近的记录，按错误码的计数不受影响
+ERROR_HISTORY_SIZE = 1000
+
 class PythonCMDError(Exception):
     """基础错误类"""
     def __init__(self, code, message, details=None):
@@ -100,6 +109,7 @@ class ErrorCodes:
     DIRECTORY_EXISTS = 118
     FILE_NOT_DIRECTORY = 119
     DIRECTORY_NOT_FILE = 120
+    DIRECTORY_NOT_EMPTY = 121
     
     # 命令执行错误 (200-299)
     COMMAND_NOT_FOUND = 200
@@ -195,46 +205,181 @@ class ErrorCodes:
     USER_NOT_FOUND = 906
     USER_ALREADY_EXISTS = 907
 
+class ErrorRecord:
+    """一条错误记录"""
+    
+    __slots__ = ('code', 'message', 'details', 'timestamp', 'command')
+    
+    def __init__(self, code, message, details, timestamp, command=None):
+        self.code = code
+        self.message = message
+        self.details = details
+        self.timestamp = timestamp
+        self.command = command
+    
+    def to_dict(self):
+        return {
+            'code': self.code,
+            'message': self.message,
+            'details': self.details,
+            'command': self.command,
+            'timestamp': self.timestamp
+        }
+
 class ErrorManager:
-    """错误管理器"""
+    """
+    错误管理器
+    错误历史保存在固定容量的环形缓冲区中，长时间运行或批量操作产生大量错误时
+    内存占用不会增长；总数和按错误码的计数单独保存，不会因覆盖旧记录而丢失。
+    所有写操作在锁内完成，可在多个线程中同时记录错误。
+    """
     
-    def __init__(self):
+    def __init__(self, capacity=ERROR_HISTORY_SIZE):
+        self.capacity = capacity
         self.error_count = 0
-        self.error_history = []
+        self.code_counts = {}
+        self._records = [None] * capacity
+        self._next = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._code_names = None
+        self._sinks = ()
     
     def raise_error(self, error_class, code, message, details=None):
         """抛出错误"""
-        self.error_count += 1
         error = error_class(code, message, details)
-        self.error_history.append({
-            'code': code,
-            'message': message,
-            'details': details,
-            'timestamp': __import__('time').time()
-        })
-        print(error)
+        self.log_error(code, message, details)
+        print(error, file=error_output())
     
     def log_error(self, code, message, details=None):
         """记录错误但不抛出"""
-        self.error_count += 1
-        self.error_history.append({
-            'code': code,
-            'message': message,
-            'details': details,
-            'timestamp': __import__('time').time()
-        })
+        record = ErrorRecord(code, message, details, _now(), getattr(self._local, 'command', None))
+        for sink in self._sinks:
+            sink.submit(record)
+        with self._lock:
+            self._records[self._next] = record
+            self._next = (self._next + 1) % self.capacity
+            self.error_count += 1
+            self.code_counts[code] = self.code_counts.get(code, 0) + 1
+        # 按线程计数，供执行器判断当前线程的命令是否报告了错误
+        self._local.count = getattr(self._local, 'count', 0) + 1
+        collector = getattr(self._local, 'collector', None)
+        if collector is not None:
+            collector.append(record)
+        return record
+    
+    @contextmanager
+    def collect_errors(self, isolated=False):
+        """
+        收集当前线程在 with 块内记录的错误
+        用法: with error_manager.collect_errors() as records: ...
+        :param isolated: 与当前命令无关的工作（如插件发现）：错误不计入外层收集器、
+                         当前线程的错误计数和当前命令
+        """
+        records = []
+        previous = getattr(self._local, 'collector', None)
+        count = getattr(self._local, 'count', 0)
+        command = getattr(self._local, 'command', None)
+        self._local.collector = records
+        if isolated:
+            self._local.command = None
+        try:
+            yield records
+        finally:
+            self._local.collector = previous
+            if isolated:
+                self._local.count = count
+                self._local.command = command
+            elif previous is not None:
+                # 嵌套收集时外层同样能看到这些错误
+                previous.extend(records)
+    
+    def capture_context(self):
+        """当前线程的错误收集器和当前命令，供工作线程通过 error_context() 沿用"""
+        return getattr(self._local, 'collector', None), getattr(self._local, 'command', None)
+    
+    @contextmanager
+    def error_context(self, context):
+        """
+        在工作线程内沿用 capture_context() 取得的收集器和当前命令
+        工作线程记录的错误会出现在发起线程的 collect_errors() 结果中
+        """
+        previous = self.capture_context()
+        self._local.collector, self._local.command = context
+        try:
+            yield
+        finally:
+            self._local.collector, self._local.command = previous
+    
+    def set_current_command(self, command):
+        """
+        设置当前线程正在执行的命令，记录错误时一并保存
+        :return: 之前的命令（命令结束后用它恢复，None 表示不在命令中）
+        """
+        previous = getattr(self._local, 'command', None)
+        self._local.command = command
+        return previous
+    
+    def add_sink(self, sink):
+        """添加错误日志输出端（需提供 submit(record) 和 close()）"""
+        with self._lock:
+            self._sinks = self._sinks + (sink,)
+    
+    def get_sinks(self):
+        return self._sinks
+    
+    def close_sinks(self):
+        """关闭所有日志输出端，写完尚未写入的记录"""
+        with self._lock:
+            sinks, self._sinks = self._sinks, ()
+        for sink in sinks:
+            sink.close()
     
     def get_error_count(self):
         """获取错误总数"""
         return self.error_count
     
+    def get_thread_error_count(self):
+        """获取当前线程记录的错误数"""
+        return getattr(self._local, 'count', 0)
+    
+    def get_code_counts(self):
+        """获取按错误码统计的错误数"""
+        with self._lock:
+            return dict(self.code_counts)
+    
+    def get_records(self, code=None, limit=None):
+        """
+        获取最近的错误记录（从旧到新）
+        :param code: 只返回该错误码的记录
+        :param limit: 最多返回的条数（取最近的）
+        """
+        with self._lock:
+            records = self._records[self._next:] + self._records[:self._next]
+        records = [r for r in records if r is not None and (code is None or r.code == code)]
+        if limit is not None:
+            records = records[-limit:] if limit else []
+        return records
+    
     def get_error_history(self):
-        """获取错误历史"""
-        return self.error_history.copy()
+        """获取错误历史（最近的记录）"""
+        return [record.to_dict() for record in self.get_records()]
     
     def clear_error_history(self):
-        """清空错误历史"""
-        self.error_history.clear()
+        """清空错误历史（计数保留）"""
+        with self._lock:
+            self._records = [None] * self.capacity
+            self._next = 0
+    
+    def get_error_name(self, code):
+        """根据错误码获取错误名称，如 FILE_NOT_FOUND"""
+        if self._code_names is None:
+            names = {}
+            for name, value in vars(ErrorCodes).items():
+                if name.isupper() and isinstance(value, int):
+                    names.setdefault(value, name)
+            self._code_names = names
+        return self._code_names.get(code, "UNKNOWN")
     
     def format_error_message(self, code, message, details=None):
         """格式化错误信息"""
@@ -277,68 +422,68 @@ def raise_system_error(code, message, details=None):
     """系统错误 - 直接输出错误信息"""
     error = SystemError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
 
 def raise_filesystem_error(code, message, details=None):
     """文件系统错误 - 直接输出错误信息"""
     error = FileSystemError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
 
 def raise_command_error(code, message, details=None):
     """命令错误 - 直接输出错误信息"""
     error = CommandError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
 
 def raise_argument_error(code, message, details=None):
     """参数错误 - 直接输出错误信息"""
     error = ArgumentError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
 
 def raise_config_error(code, message, details=None):
     """配置错误 - 直接输出错误信息"""
     error = ConfigError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
 
 def raise_permission_error(code, message, details=None):
     """权限错误 - 直接输出错误信息"""
     error = PermissionError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
 
 def raise_network_error(code, message, details=None):
     """网络错误 - 直接输出错误信息"""
     error = NetworkError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
 
 def raise_memory_error(code, message, details=None):
     """内存错误 - 直接输出错误信息"""
     error = MemoryError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
 
 def raise_plugin_error(code, message, details=None):
     """插件错误 - 直接输出错误信息"""
     error = PluginError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
 
 def raise_user_error(code, message, details=None):
     """用户错误 - 直接输出错误信息"""
     error = UserError(code, message, details)
     error_manager.log_error(code, message, details)
-    print(error_manager.format_error_message(code, message, details))
+    print(error_manager.format_error_message(code, message, details), file=error_output())
     return error
\ No newline at end of file
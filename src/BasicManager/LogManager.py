@@ -0,0 +1,163 @@
+"""
+日志管理器 - 异步写入结构化错误日志
+错误记录以 NDJSON 格式（每行一个JSON对象）写入日志文件。
+记录错误的线程只把记录放入有界队列，序列化和写文件都在后台线程中
+批量完成；队列已满时直接丢弃并计数，记录错误永远不会阻塞命令执行。
+日志文件超过容量上限时按 .1 .2 ... 轮转。
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+# 单个日志文件容量上限
+LOG_MAX_BYTES = 10 * 1024 * 1024
+# 保留的轮转文件数
+LOG_BACKUP_COUNT = 3
+# 队列容量，超出后丢弃新记录
+LOG_QUEUE_SIZE = 10000
+# 每批最多写入的记录数
+LOG_BATCH_SIZE = 256
+
+_STOP = object()
+
+
+class ErrorLogSink:
+    """NDJSON 错误日志：有界队列 + 后台批量写入 + 按大小轮转"""
+
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT,
+                 queue_size=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE, type_of=None):
+        """
+        :param type_of: 根据错误码返回错误类型的函数（由错误管理器提供）
+        """
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.written = 0
+        self._dropped_lock = threading.Lock()
+        self._reported_dropped = 0
+        self._type_of = type_of
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._size = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, name='error-log', daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        """放入一条错误记录（不阻塞，队列已满时丢弃）"""
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def close(self, timeout=2.0):
+        """写完队列中剩余的记录后关闭日志"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    # ------------------------------------------------------------ 后台线程
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            stop = item is _STOP
+            if not stop:
+                batch.append(item)
+                # 取出已排队的记录，凑成一批写入
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+            try:
+                self._write_batch(batch)
+            except OSError:
+                # 日志写入失败不影响命令执行，丢弃本批记录
+                with self._dropped_lock:
+                    self.dropped += len(batch)
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _serialize(self, record):
+        data = record.to_dict() if hasattr(record, 'to_dict') else dict(record)
+        if self._type_of is not None and 'type' not in data:
+            data['type'] = self._type_of(data.get('code'))
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+    def _write_batch(self, batch):
+        lines = [self._serialize(record) for record in batch]
+        dropped = self.dropped
+        if dropped != self._reported_dropped:
+            # 记录丢弃数量，便于事后判断日志是否完整
+            lines.append(json.dumps({'type': 'LOG_DROPPED', 'dropped': dropped,
+                                     'timestamp': time.time()}))
+            self._reported_dropped = dropped
+        if not lines:
+            return
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        if self._file is None:
+            self._open()
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self.written += len(batch)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'ab')
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        """path -> path.1 -> path.2 ...，超出保留数量的最旧文件被删除"""
+        self._file.close()
+        self._file = None
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.unlink(self.path)
+        self._open()
+
+
+def enable_error_log(path=None):
+    """
+    启用错误日志：path 未指定时读取环境变量 PCNEXT_ERROR_LOG
+    :return: ErrorLogSink，未配置时返回 None
+    """
+    from .ErrorManager import error_manager
+
+    path = path or os.environ.get('PCNEXT_ERROR_LOG')
+    if not path:
+        return None
+    sink = ErrorLogSink(path, type_of=error_manager.get_error_type)
+    error_manager.add_sink(sink)
+    return sink
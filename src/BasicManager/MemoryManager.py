@@ -0,0 +1,133 @@
+"""
+内存管理器 - 用 tracemalloc 跟踪命令的内存分配
+每条被跟踪的命令记录三项数据：
+    峰值     命令执行期间已跟踪内存相对于开始时的最大增量
+    残留     命令结束后仍未释放的内存增量（持续增长时提示可能存在泄漏）
+    分配位置 残留内存最多的源代码行（仅在需要时对比快照，开销较大）
+tracemalloc 是进程级的，峰值包含同一时刻其他线程的分配；同一时间只跟踪
+一条命令，嵌套或并发的命令直接执行而不跟踪。
+"""
+
+import os
+import re
+import threading
+import tracemalloc
+
+# 跟踪的调用栈深度（只需定位分配所在的行）
+TRACE_FRAMES = 1
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# 不计入分配位置的模块（跟踪工具自身和导入机制）
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+)
+
+
+def parse_size(text):
+    """
+    解析内存大小，如 512K、64M、1.5G，无单位时为字节
+    :raises ValueError: 格式无效
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGB]?)B?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"无效的内存大小: {text}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+class MemoryReport:
+    """一次跟踪的结果"""
+
+    __slots__ = ('peak', 'retained', 'sites', 'limit')
+
+    def __init__(self, peak, retained, sites, limit):
+        self.peak = peak
+        self.retained = retained
+        # tracemalloc.StatisticDiff 列表，按残留大小降序
+        self.sites = sites
+        self.limit = limit
+
+    @property
+    def exceeded(self):
+        """残留内存是否超过上限"""
+        return self.limit is not None and self.retained > self.limit
+
+
+class MemoryTracer:
+    """命令内存跟踪器"""
+
+    def __init__(self):
+        # 会话模式：每条命令都跟踪（--trace-memory）
+        self.enabled = False
+        # 残留内存上限（字节），超过时报告 MEMORY_LEAK_DETECTED
+        self.limit = None
+        limit = os.environ.get('PCNEXT_MEMORY_LIMIT')
+        if limit:
+            try:
+                self.limit = parse_size(limit)
+            except ValueError:
+                pass
+        self._lock = threading.Lock()
+
+    def enable(self, limit=None):
+        """启用会话模式，此后一直保持 tracemalloc 运行"""
+        if limit is not None:
+            self.limit = limit
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        self.enabled = True
+
+    def disable(self):
+        """
+        关闭会话模式
+        可能在被跟踪的命令内部调用（如脚本或函数中的 mem --off），此时不等待
+        跟踪结束，由正在进行的 trace() 在结束时停止 tracemalloc
+        """
+        self.enabled = False
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+        finally:
+            self._lock.release()
+
+    def trace(self, func, *args, sites=0, limit=None):
+        """
+        在内存跟踪下执行 func(*args)
+        :param sites: 报告的分配位置数量，为 0 时不对比快照
+        :param limit: 本次的残留内存上限，默认使用 self.limit
+        :return: (func 的返回值, MemoryReport)；已有命令在跟踪时报告为 None
+        """
+        if not self._lock.acquire(blocking=False):
+            return func(*args), None
+        started = not tracemalloc.is_tracing()
+        session = self.enabled
+        try:
+            if started:
+                tracemalloc.start(TRACE_FRAMES)
+            before = tracemalloc.take_snapshot().filter_traces(_FILTERS) if sites else None
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            value = func(*args)
+            current, peak = tracemalloc.get_traced_memory()
+            top = []
+            if sites:
+                after = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+                top = [stat for stat in after.compare_to(before, 'lineno') if stat.size_diff > 0][:sites]
+            report = MemoryReport(max(0, peak - base), current - base, top,
+                                  self.limit if limit is None else limit)
+            return value, report
+        finally:
+            # 本次启动的跟踪或跟踪期间关闭了会话模式时在这里停止；
+            # 跟踪期间启用了会话模式（mem --on）时保持运行
+            if (started or session) and not self.enabled and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._lock.release()
+
+
+# 全局内存跟踪器
+memory_tracer = MemoryTracer()
@@ -0,0 +1,196 @@
+"""
+指标管理器 - 每条命令的延迟和吞吐统计
+执行器每分派一条命令记录一次：墙钟时间、CPU时间、读写字节数和是否成功。
+延迟写入按命令区分的 HDR 风格直方图：数值按2的幂分段，每段再线性分为
+若干子桶，相对误差约为 3%，内存占用固定，与记录次数无关。
+"""
+
+import json
+import threading
+import time
+from array import array
+
+# 每个2的幂区间内的子桶数（2^5 = 32，分辨率约 1/16，即约 3% 的相对误差）
+_SUB_BITS = 5
+_SUB_COUNT = 1 << _SUB_BITS
+_HALF_COUNT = _SUB_COUNT >> 1
+# 可记录的最大值（纳秒），约 18 分钟；更大的值计入最后一个桶
+_MAX_SHIFT = 36
+_BUCKET_COUNT = _SUB_COUNT + _MAX_SHIFT * _HALF_COUNT
+
+# 最多分别统计的命令名数量，超出后合并到 OTHER_COMMANDS
+MAX_COMMANDS = 256
+OTHER_COMMANDS = '<other>'
+
+
+class IOCounters(threading.local):
+    """
+    按线程累计的读写字节数和子进程CPU时间
+    文件读取、标准输出写入和外部程序在各自的位置累加，执行器在命令前后取差值
+    """
+    read = 0
+    written = 0
+    child_cpu_ns = 0
+    child_user_ns = 0
+    child_sys_ns = 0
+    # 子进程的最大常驻内存（ru_maxrss，Linux上单位为KB）
+    child_maxrss = 0
+
+    def add_child(self, rusage):
+        """累加一个已结束子进程的资源使用情况（os.wait4 返回的 rusage）"""
+        user = int(rusage.ru_utime * 1e9)
+        system = int(rusage.ru_stime * 1e9)
+        self.child_user_ns += user
+        self.child_sys_ns += system
+        self.child_cpu_ns += user + system
+        if rusage.ru_maxrss > self.child_maxrss:
+            self.child_maxrss = rusage.ru_maxrss
+
+
+io_counters = IOCounters()
+
+
+def _bucket_index(value):
+    if value < _SUB_COUNT:
+        return value if value > 0 else 0
+    shift = value.bit_length() - _SUB_BITS
+    if shift > _MAX_SHIFT:
+        return _BUCKET_COUNT - 1
+    return _SUB_COUNT + (shift - 1) * _HALF_COUNT + (value >> shift) - _HALF_COUNT
+
+
+def _bucket_value(index):
+    """桶的代表值（区间中点）"""
+    if index < _SUB_COUNT:
+        return index
+    offset = index - _SUB_COUNT
+    shift = offset // _HALF_COUNT + 1
+    top = offset % _HALF_COUNT + _HALF_COUNT
+    return (top << shift) + (1 << (shift - 1))
+
+
+class Histogram:
+    """固定内存的对数-线性直方图（单位：纳秒）"""
+
+    __slots__ = ('counts', 'total', 'min', 'max', 'sum')
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * _BUCKET_COUNT))
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self.sum = 0
+
+    def record(self, value):
+        self.counts[_bucket_index(value)] += 1
+        if not self.total or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.total += 1
+        self.sum += value
+
+    def percentile(self, percent):
+        """返回第 percent 百分位的近似值"""
+        if not self.total:
+            return 0
+        target = max(1, int(self.total * percent / 100.0 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                seen += count
+                if seen >= target:
+                    return min(max(_bucket_value(index), self.min), self.max)
+        return self.max
+
+
+class CommandMetrics:
+    """单个命令的累计指标"""
+
+    __slots__ = ('name', 'count', 'failures', 'latency', 'cpu_ns', 'read', 'written', 'lock')
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.count = 0
+        self.failures = 0
+        self.latency = Histogram()
+        self.cpu_ns = 0
+        self.read = 0
+        self.written = 0
+
+    def to_dict(self):
+        latency = self.latency
+        return {
+            'command': self.name,
+            'count': self.count,
+            'failures': self.failures,
+            'wall_ns': {
+                'min': latency.min,
+                'p50': latency.percentile(50),
+                'p95': latency.percentile(95),
+                'p99': latency.percentile(99),
+                'max': latency.max,
+                'mean': latency.sum // latency.total if latency.total else 0,
+            },
+            'cpu_ns': self.cpu_ns,
+            'bytes_read': self.read,
+            'bytes_written': self.written,
+        }
+
+
+class MetricsRegistry:
+    """按命令名汇总的指标表"""
+
+    def __init__(self):
+        self.enabled = True
+        self.started = time.time()
+        self._commands = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        with self._lock:
+            metrics = self._commands.get(name)
+            if metrics is None:
+                if len(self._commands) >= MAX_COMMANDS:
+                    name = OTHER_COMMANDS
+                    metrics = self._commands.get(name)
+                if metrics is None:
+                    metrics = self._commands[name] = CommandMetrics(name)
+            return metrics
+
+    def record(self, name, wall_ns, cpu_ns, read, written, failed):
+        """记录一次命令执行（每次分派都会调用）"""
+        metrics = self._commands.get(name) or self._get(name)
+        with metrics.lock:
+            metrics.latency.record(wall_ns)
+            metrics.count += 1
+            if failed:
+                metrics.failures += 1
+            metrics.cpu_ns += cpu_ns
+            metrics.read += read
+            metrics.written += written
+
+    def commands(self):
+        """返回所有命令的指标（按执行次数降序）"""
+        with self._lock:
+            items = list(self._commands.values())
+        return sorted(items, key=lambda m: (-m.count, m.name))
+
+    def reset(self):
+        with self._lock:
+            self._commands.clear()
+            self.started = time.time()
+
+    def to_json(self, indent=None):
+        """导出为JSON（供监控面板采集）"""
+        data = {
+            'since': self.started,
+            'timestamp': time.time(),
+            'commands': [m.to_dict() for m in self.commands()],
+        }
+        return json.dumps(data, ensure_ascii=False, indent=indent)
+
+
+# 全局指标表
+metrics = MetricsRegistry()
@@ -0,0 +1,130 @@
+"""
+输出管理器 - 按线程重定向标准输出
+安装后 sys.stdout 被替换为一个代理对象，每个线程可以独立地把输出
+重定向到自己的输出端（例如后台任务的缓冲区），其他线程不受影响。
+与直接替换 sys.stdout 不同，这种方式是线程安全的。
+错误信息通常与标准输出写到同一输出端；命令替换捕获输出期间，错误信息
+仍写到捕获前的输出端，不会混入捕获的数据；也可以用 redirect_errors 为
+错误信息单独指定输出端。
+"""
+
+import sys
+import threading
+from contextlib import contextmanager
+
+from .MetricsManager import io_counters
+
+_local = threading.local()
+_install_lock = threading.Lock()
+
+
+class ThreadLocalOutput:
+    """sys.stdout 代理：写操作转发到当前线程的输出端"""
+
+    def __init__(self, original):
+        self._original = original
+
+    @property
+    def original(self):
+        """安装前的原始输出流"""
+        return self._original
+
+    def _target(self):
+        return getattr(_local, 'target', None) or self._original
+
+    def write(self, text):
+        # 按字符数计入当前线程的写计数（不为统计而重复编码）
+        io_counters.written += len(text)
+        return self._target().write(text)
+
+    def writelines(self, lines):
+        target = self._target()
+        for line in lines:
+            io_counters.written += len(line)
+            target.write(line)
+
+    def flush(self):
+        target = self._target()
+        if hasattr(target, 'flush'):
+            target.flush()
+
+    def __getattr__(self, name):
+        # encoding、fileno、isatty 等属性透传给当前输出端
+        return getattr(self._target(), name)
+
+
+def install():
+    """安装线程级输出代理（重复调用无副作用）"""
+    with _install_lock:
+        if not isinstance(sys.stdout, ThreadLocalOutput):
+            sys.stdout = ThreadLocalOutput(sys.stdout)
+    return sys.stdout
+
+
+def current_output():
+    """获取当前线程实际使用的输出端"""
+    target = getattr(_local, 'target', None)
+    if target is not None:
+        return target
+    stdout = sys.stdout
+    if isinstance(stdout, ThreadLocalOutput):
+        return stdout.original
+    return stdout
+
+
+def current_error_output():
+    """获取当前线程的错误输出端：已重定向时与标准输出合并，否则为 sys.stderr"""
+    target = getattr(_local, 'target', None)
+    return target if target is not None else sys.stderr
+
+
+def error_output():
+    """错误信息的输出端：命令替换捕获输出期间为捕获前的输出端，否则为标准输出"""
+    target = getattr(_local, 'error_target', None)
+    return target if target is not None else sys.stdout
+
+
+@contextmanager
+def capture_output(target):
+    """
+    在当前线程内把标准输出捕获到 target（命令替换）
+    错误信息继续写到捕获前的输出端；嵌套捕获时写到最外层捕获前的输出端
+    """
+    install()
+    previous_error = getattr(_local, 'error_target', None)
+    if previous_error is None:
+        _local.error_target = current_output()
+    try:
+        with redirect_output(target):
+            yield target
+    finally:
+        _local.error_target = previous_error
+
+
+@contextmanager
+def redirect_errors(target):
+    """
+    在当前线程内把错误信息写到 target（需提供 write/flush）
+    target 为 None 时错误信息与标准输出写到同一输出端；退出时恢复上一层设置
+    """
+    previous = getattr(_local, 'error_target', None)
+    _local.error_target = target
+    try:
+        yield target
+    finally:
+        _local.error_target = previous
+
+
+@contextmanager
+def redirect_output(target):
+    """
+    在当前线程内把标准输出重定向到 target（需提供 write/flush）
+    可以嵌套使用，退出时恢复上一层输出端
+    """
+    install()
+    previous = getattr(_local, 'target', None)
+    _local.target = target
+    try:
+        yield target
+    finally:
+        _local.target = previous
@@ -0,0 +1,267 @@
+"""
+插件管理器 - 按需加载的扩展命令
+插件通过清单文件 plugin.json 声明命令，格式与 Commands.json 中的条目相同：
+    {
+        "name": "demo", "version": "1.0", "api": 1, "module": "demo_commands",
+        "commands": [
+            {"cmd": "hello", "para": "*argv", "func": "hello(*argv)", "info": "..."}
+        ]
+    }
+命令函数的第一个参数为 Commands 实例（可访问 session、executor），其余为命令参数；
+para 为对象时（见 CommandManager.Options）选项以关键字参数传入；
+模块可以提供 setup(executor) 函数，在第一次加载时调用。
+
+插件来源：
+    目录插件    PCNEXT_PLUGIN_PATH 中的目录（默认 ~/.pcnext/plugins）下
+                包含 plugin.json 的子目录，加载时该子目录加入 sys.path
+    已安装插件  entry point 组 pcnext.plugins，值为插件模块名，清单文件位于
+                模块所在的顶层包目录中（只定位包，不导入）
+发现过程只读取清单，在第一次查找未知命令时才进行；插件模块在其命令第一次
+执行时才导入，启动开销与安装的插件数量无关。
+发现过程中的问题（清单无效、命令重名等）与触发发现的命令无关，单独收集在
+PluginManager.problems 中，由 plugins 命令显示。
+"""
+
+import importlib
+import importlib.util
+import json
+import os
+import re
+import sys
+import threading
+
+from .ErrorManager import ErrorCodes, error_manager, PythonCMDError, raise_plugin_error
+from ..CommandManager.Options import compile_parser
+
+# 插件清单格式版本
+PLUGIN_API_VERSION = 1
+MANIFEST_NAME = 'plugin.json'
+ENTRY_POINT_GROUP = 'pcnext.plugins'
+
+
+def default_plugin_dirs():
+    """插件目录：环境变量 PCNEXT_PLUGIN_PATH（以路径分隔符分隔），否则为 ~/.pcnext/plugins"""
+    path = os.environ.get('PCNEXT_PLUGIN_PATH')
+    if path:
+        return [d for d in path.split(os.pathsep) if d]
+    return [os.path.join(os.path.expanduser('~'), '.pcnext', 'plugins')]
+
+
+class Plugin:
+    """一个插件：清单信息和加载状态"""
+
+    def __init__(self, manifest, source, path=None):
+        """
+        :param source: 'dir' 或 'entry_point'
+        :param path: 目录插件的目录（加载时加入 sys.path）
+        """
+        self.name = manifest.get('name') or manifest.get('module')
+        self.version = manifest.get('version', '')
+        self.module_name = manifest.get('module')
+        self.commands = manifest.get('commands', [])
+        self.source = source
+        self.path = path
+        self.module = None
+        self.error = None
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.error is not None:
+            return 'failed'
+        return 'loaded' if self.module is not None else 'available'
+
+    def _fail(self, code, message, details=None):
+        self.error = PythonCMDError(code, message, details)
+        raise_plugin_error(code, message, details)
+
+    def load(self, executor):
+        """
+        导入插件模块（只在第一次调用时导入）
+        :return: 是否加载成功；失败时报告 PLUGIN_* 错误
+        """
+        with self._lock:
+            if self.module is not None:
+                return True
+            if self.error is not None:
+                # 加载失败后不再重试，直接报告之前的错误
+                raise_plugin_error(self.error.code, self.error.message, self.error.details)
+                return False
+            if self.path is not None and self.path not in sys.path:
+                sys.path.insert(0, self.path)
+            try:
+                module = importlib.import_module(self.module_name)
+            except ModuleNotFoundError as e:
+                if e.name and (self.module_name == e.name or self.module_name.startswith(e.name + '.')):
+                    self._fail(ErrorCodes.PLUGIN_NOT_FOUND, f"找不到插件模块: {self.module_name}", f"插件 {self.name}")
+                else:
+                    self._fail(ErrorCodes.PLUGIN_DEPENDENCY_MISSING, f"插件 {self.name} 缺少依赖: {e.name}", str(e))
+                return False
+            except Exception as e:
+                self._fail(ErrorCodes.PLUGIN_LOAD_FAILED, f"加载插件失败: {self.name}", f"{type(e).__name__}: {e}")
+                return False
+            setup = getattr(module, 'setup', None)
+            if callable(setup):
+                try:
+                    setup(executor)
+                except Exception as e:
+                    self._fail(ErrorCodes.PLUGIN_INIT_FAILED, f"插件初始化失败: {self.name}", f"{type(e).__name__}: {e}")
+                    return False
+            self.module = module
+            return True
+
+    def resolve(self, config, executor):
+        """
+        返回命令对应的可调用对象（已绑定 Commands 实例）
+        :return: 可调用对象，加载失败时返回 None（错误已报告）
+        """
+        func_name = config['_function']
+        function = self._functions.get(func_name)
+        if function is not None:
+            return function
+        if not self.load(executor):
+            return None
+        target = getattr(self.module, func_name, None)
+        if not callable(target):
+            raise_plugin_error(ErrorCodes.PLUGIN_LOAD_FAILED, f"插件 {self.name} 未提供函数 {func_name}",
+                               f"命令 '{config['cmd']}'")
+            return None
+        commands = executor.commands_instance
+        name = self.name
+
+        def call(*args, **options):
+            try:
+                return target(commands, *args, **options)
+            except PythonCMDError:
+                raise
+            except Exception as e:
+                raise PythonCMDError(ErrorCodes.PLUGIN_EXECUTION_FAILED, f"插件命令执行失败: {config['cmd']}",
+                                     f"插件 {name}: {type(e).__name__}: {e}")
+
+        self._functions[func_name] = call
+        return call
+
+
+class PluginManager:
+    """插件的发现、命令注册和按需加载"""
+
+    def __init__(self, executor, directories=None):
+        self.executor = executor
+        self.directories = directories
+        self.plugins = []
+        self.commands = {}
+        # 发现过程中记录的错误（ErrorRecord 列表）
+        self.problems = []
+        self.discovered = False
+        self._lock = threading.Lock()
+
+    def discover(self):
+        """读取所有插件清单并把命令注册到执行器（只执行一次）"""
+        if self.discovered:
+            return
+        with self._lock:
+            if self.discovered:
+                return
+            with error_manager.collect_errors(isolated=True) as problems:
+                for directory in self.directories or default_plugin_dirs():
+                    self._scan_directory(directory)
+                self._scan_entry_points()
+            self.problems = problems
+            self.discovered = True
+
+    def _scan_directory(self, directory):
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return
+        for name in names:
+            plugin_dir = os.path.join(directory, name)
+            manifest_path = os.path.join(plugin_dir, MANIFEST_NAME)
+            if os.path.isfile(manifest_path):
+                manifest = self._read_manifest(manifest_path)
+                if manifest is not None:
+                    self._register(Plugin(manifest, 'dir', plugin_dir))
+
+    def _scan_entry_points(self):
+        try:
+            from importlib.metadata import entry_points
+            points = entry_points(group=ENTRY_POINT_GROUP)
+        except Exception:
+            return
+        for point in points:
+            module_name = point.value.split(':', 1)[0].strip()
+            top = module_name.split('.', 1)[0]
+            try:
+                # 只定位顶层包，不执行其中的代码
+                spec = importlib.util.find_spec(top)
+            except (ImportError, ValueError):
+                spec = None
+            locations = list(spec.submodule_search_locations or []) if spec is not None else []
+            if not locations and spec is not None and spec.origin:
+                locations = [os.path.dirname(spec.origin)]
+            manifest = None
+            for location in locations:
+                manifest_path = os.path.join(location, MANIFEST_NAME)
+                if os.path.isfile(manifest_path):
+                    manifest = self._read_manifest(manifest_path)
+                    break
+            else:
+                error_manager.log_error(ErrorCodes.PLUGIN_NOT_FOUND, f"找不到插件清单: {point.name}",
+                                        f"{module_name} 所在的包中没有 {MANIFEST_NAME}")
+            if manifest is not None:
+                manifest.setdefault('name', point.name)
+                manifest.setdefault('module', module_name)
+                self._register(Plugin(manifest, 'entry_point'))
+
+    def _read_manifest(self, path):
+        """读取并校验清单，无效时记录错误并返回 None（发现阶段不输出）"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            error_manager.log_error(ErrorCodes.PLUGIN_LOAD_FAILED, f"无法读取插件清单: {path}", str(e))
+            return None
+        if not isinstance(manifest, dict) or not isinstance(manifest.get('commands'), list):
+            error_manager.log_error(ErrorCodes.PLUGIN_LOAD_FAILED, f"插件清单格式无效: {path}", "缺少 commands 列表")
+            return None
+        if manifest.get('api', PLUGIN_API_VERSION) != PLUGIN_API_VERSION:
+            error_manager.log_error(ErrorCodes.PLUGIN_VERSION_MISMATCH, f"插件清单版本不兼容: {path}",
+                                    f"需要 api {PLUGIN_API_VERSION}，清单为 {manifest.get('api')}")
+            return None
+        return manifest
+
+    def _register(self, plugin):
+        if not plugin.module_name:
+            error_manager.log_error(ErrorCodes.PLUGIN_LOAD_FAILED, f"插件清单未指定模块: {plugin.name}")
+            return
+        command_map = self.executor.command_map
+        registered = False
+        for entry in plugin.commands:
+            if not isinstance(entry, dict) or not entry.get('cmd'):
+                error_manager.log_error(ErrorCodes.PLUGIN_LOAD_FAILED, f"插件 {plugin.name} 的命令条目无效", str(entry))
+                continue
+            cmd = entry['cmd']
+            if cmd in command_map:
+                owner = command_map[cmd].get('plugin')
+                owner_name = f"插件 {owner.name}" if owner is not None else "内置命令"
+                error_manager.log_error(ErrorCodes.PLUGIN_CONFLICT, f"插件 {plugin.name} 的命令 '{cmd}' 与{owner_name}重名",
+                                        "已忽略该命令")
+                continue
+            match = re.match(r'(\w+)', entry.get('func') or cmd)
+            config = dict(entry)
+            config.setdefault('para', '*argv')
+            config.setdefault('info', f"插件 {plugin.name} 提供的命令")
+            config['plugin'] = plugin
+            config['_function'] = match.group(1) if match else cmd
+            try:
+                config['_parser'] = compile_parser(cmd, config['para'])
+            except (KeyError, TypeError, ValueError) as e:
+                error_manager.log_error(ErrorCodes.PLUGIN_LOAD_FAILED, f"插件 {plugin.name} 的命令 '{cmd}' 参数描述无效",
+                                        str(e))
+                continue
+            command_map[cmd] = config
+            self.commands[cmd] = config
+            registered = True
+        if registered:
+            self.plugins.append(plugin)
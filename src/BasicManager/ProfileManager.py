@@ -0,0 +1,177 @@
+"""
+性能分析管理器 - 在命令行内分析命令的性能
+确定性分析使用 cProfile，统计每个函数的调用次数和累计时间，结果可保存为
+.pstats 文件供 pstats / snakeviz 等工具查看。
+采样分析由后台线程定期读取被分析线程的调用栈，汇总为折叠栈格式
+（每行 "帧;帧;帧 次数"），可直接交给 flamegraph.pl、speedscope 等工具生成火焰图。
+两者都只分析执行命令的线程：外部程序、并行删除等线程池中的工作和其他
+后台线程的耗时不在结果中。
+已有确定性分析器在运行时（在 profile 下执行的脚本再次调用 profile，或整个
+程序运行在 cProfile 下），同一线程不能再启用 cProfile（Python 3.12 起会报错），
+此时只进行栈采样。
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+
+# 默认采样间隔（秒）
+SAMPLE_INTERVAL = 0.002
+
+# 结果中说明分析范围的提示
+THREAD_NOTE = "注意: 只分析执行命令的线程，外部程序和线程池（如 rm -r 的并行删除）中的耗时不在结果中"
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    采样分析器：后台线程按固定间隔读取目标线程的调用栈
+    只记录 stop_frame 之下的部分（由 _call 设置），分析器自身的调用不会出现在
+    结果中；嵌套分析时每个采样器按自己的截断帧取栈。
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.stop_frame = None
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._names = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        names = self._names
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            stop_frame = self.stop_frame
+            complete = False
+            while frame is not None:
+                if frame is stop_frame:
+                    complete = True
+                    break
+                code = frame.f_code
+                # 栈帧名称按代码对象缓存，避免每次采样都格式化字符串
+                name = names.get(code)
+                if name is None:
+                    name = names[code] = _frame_name(code)
+                stack.append(name)
+                frame = frame.f_back
+            del frame, stop_frame
+            # 目标帧尚未进入或已经返回时的样本不属于被分析的命令
+            if stack and complete:
+                stack.reverse()
+                self.stacks[';'.join(stack)] += 1
+                self.samples += 1
+
+    def top_functions(self, limit):
+        """按栈顶函数统计的样本数（自身耗时），返回 [(名称, 次数)]"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return leaves.most_common(limit)
+
+    def write_collapsed(self, path):
+        """写出折叠栈文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileResult:
+    """一次性能分析的结果"""
+
+    def __init__(self, profiler, sampler, value):
+        self.profiler = profiler
+        self.sampler = sampler
+        self.value = value
+
+    def report(self, limit=20, sort='cumulative'):
+        """
+        按 sort 排序的前 limit 个函数（pstats 文本格式）
+        只有采样结果时（已有分析器在运行）按栈顶函数的样本数排序
+        """
+        if self.profiler is None:
+            lines = ["已有确定性分析器在运行，本次只进行栈采样（按自身耗时排序）:"]
+            total = self.sampler.samples or 1
+            for name, count in self.sampler.top_functions(limit):
+                lines.append(f"  {count:>7} {count * 100 / total:6.1f}%  {name}")
+            lines.append(THREAD_NOTE)
+            return '\n'.join(lines) + '\n'
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue().rstrip('\n') + '\n' + THREAD_NOTE + '\n'
+
+    def dump(self, base):
+        """
+        写出分析结果文件
+        :return: 已写出的文件路径列表（base.pstats，启用采样时还有 base.collapsed）
+        """
+        paths = []
+        if self.profiler is not None:
+            paths.append(base + '.pstats')
+            self.profiler.dump_stats(paths[-1])
+        if self.sampler is not None:
+            paths.append(base + '.collapsed')
+            self.sampler.write_collapsed(paths[-1])
+        return paths
+
+
+def profiler_active():
+    """当前线程是否已有确定性分析器在运行（嵌套的 profile 命令或外部的 cProfile）"""
+    monitoring = getattr(sys, 'monitoring', None)
+    if monitoring is not None:
+        return monitoring.get_tool(monitoring.PROFILER_ID) is not None
+    return sys.getprofile() is not None
+
+
+def _call(func, args, sampler):
+    # 采样分析在此帧处截断调用栈
+    if sampler is not None:
+        sampler.stop_frame = sys._getframe()
+    return func(*args)
+
+
+def profile_call(func, *args, sample=False, interval=SAMPLE_INTERVAL):
+    """
+    在 cProfile 下执行 func(*args)，sample 为真时同时进行栈采样
+    已有确定性分析器在运行时只进行栈采样（结果的 profiler 为 None）
+    func 抛出异常时分析结果随异常丢弃
+    :return: ProfileResult，其 value 为 func 的返回值
+    """
+    profiler = None if profiler_active() else cProfile.Profile()
+    sampler = None
+    if sample or profiler is None:
+        sampler = StackSampler(threading.get_ident(), interval)
+        sampler.start()
+    try:
+        if profiler is None:
+            value = _call(func, args, sampler)
+        else:
+            profiler.enable()
+            try:
+                value = _call(func, args, sampler)
+            finally:
+                profiler.disable()
+    finally:
+        if sampler is not None:
+            sampler.stop()
+    return ProfileResult(profiler, sampler, value)
@@ -1,4 +1,7 @@
 import os
+import errno
+import fnmatch
+import io
 import json
 import re
 import shlex
@@ -7,27 +10,194 @@ import time
 import subprocess
 import platform
 import shutil
+import stat
 import getpass
 from collections import deque
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 from ..BasicManager.VersionManager import VersionManager
+from ..BasicManager.OutputManager import install as install_output, error_output, redirect_errors, redirect_output
+from ..BasicManager.MetricsManager import io_counters, metrics
+from ..BasicManager.ProfileManager import profile_call
+from ..BasicManager.MemoryManager import memory_tracer
+from ..BasicManager.PluginManager import PluginManager, default_plugin_dirs
+from .RemoveEngine import RemoveEngine
+from .Expansion import expand_arguments
+from .Parser import is_incomplete, parse
+from .ProcessRunner import process_runner
+from .JobManager import Job, JobManager, current_job, job_context
+from .Session import Session, current_session, session_context
+from .Result import CommandResult, CommandStream
+from .Options import compile_parser
+from .Definitions import ALIAS, FUNCTION, DefinitionTable
+from .Compiler import TOP_FRAME, CompileCache, Compiler, Frame, compile_definition
+from .Completion import command_index
+from ..TraceManager.Recorder import trace_recorder
 from ..BasicManager.ErrorManager import (
-    ErrorCodes, error_manager, PythonCMDError,
+    ErrorCodes, error_manager, PythonCMDError, ArgumentError,
     raise_filesystem_error, raise_command_error,
     raise_argument_error, raise_permission_error,
-    raise_config_error, raise_system_error
+    raise_config_error, raise_system_error, raise_memory_error
 )
 
+class _OutputBatch:
+    """内部工具：合并多行输出后一次写出，减少批量操作时的写调用次数"""
+    
+    def __init__(self, limit=1024):
+        self.lines = []
+        self.limit = limit
+    
+    def add(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.limit:
+            self.flush()
+    
+    def flush(self):
+        if self.lines:
+            sys.stdout.write('\n'.join(self.lines) + '\n')
+            self.lines.clear()
+
+# 结构化输出的编码器（紧凑格式，保留非ASCII字符）
+_encode_record = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+# 结构化输出选项：--ndjson 每行一个JSON对象，--json 为JSON数组
+_RECORD_FORMATS = ('--json', '--ndjson')
+
+class _RecordWriter:
+    """内部工具：流式写出结构化记录，每批合并为一次写调用"""
+    
+    def __init__(self, fmt='--ndjson', limit=1024):
+        self.array = fmt == '--json'
+        self.lines = []
+        self.limit = limit
+        self.count = 0
+        self.failed = False
+    
+    def add(self, record):
+        self.lines.append(_encode_record(record))
+        if len(self.lines) >= self.limit:
+            self.flush()
+    
+    def error(self, code, message, **fields):
+        """记录错误并以记录的形式输出，不在结构化输出中混入错误文本"""
+        error_manager.log_error(code, message, fields.get('path') or fields.get('file'))
+        self.failed = True
+        fields['error'] = code
+        fields['message'] = message
+        self.add(fields)
+    
+    def flush(self):
+        if not self.lines:
+            return
+        if self.array:
+            prefix = '[' if self.count == 0 else ',\n'
+            sys.stdout.write(prefix + ',\n'.join(self.lines))
+        else:
+            sys.stdout.write('\n'.join(self.lines) + '\n')
+        self.count += len(self.lines)
+        self.lines.clear()
+    
+    def close(self):
+        self.flush()
+        if self.array:
+            sys.stdout.write(']\n' if self.count else '[]\n')
+
+def _entry_type(mode):
+    """内部工具：文件类型名称"""
+    if stat.S_ISDIR(mode):
+        return 'dir'
+    if stat.S_ISREG(mode):
+        return 'file'
+    if stat.S_ISLNK(mode):
+        return 'symlink'
+    return 'other'
+
+def _format_ns(ns):
+    """内部工具：把纳秒格式化为便于阅读的时间"""
+    if ns < 1000:
+        return f"{ns}ns"
+    if ns < 1000000:
+        return f"{ns / 1e3:.1f}µs"
+    if ns < 1000000000:
+        return f"{ns / 1e6:.2f}ms"
+    return f"{ns / 1e9:.2f}s"
+
+def _format_bytes(size):
+    """内部工具：把字节数格式化为便于阅读的大小"""
+    for unit in ('B', 'K', 'M', 'G'):
+        if size < 1024 or unit == 'G':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+class _DiscardOutput:
+    """内部工具：丢弃写入内容的输出端"""
+    
+    def write(self, text):
+        return len(text)
+    
+    def flush(self):
+        pass
+
+def _self_usage():
+    """内部工具：当前线程（不支持时为整个进程）的 (用户CPU纳秒, 系统CPU纳秒, 峰值内存KB)"""
+    if resource is None:
+        times = os.times()
+        return int(times.user * 1e9), int(times.system * 1e9), 0
+    who = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+    usage = resource.getrusage(who)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        maxrss //= 1024  # macOS 上单位为字节
+    return int(usage.ru_utime * 1e9), int(usage.ru_stime * 1e9), maxrss
+
+# 逐行读取文本文件时每次读取的字节数
+_READ_CHUNK = 64 * 1024
+
 class Commands:
     """命令实现类"""
     
-    def _read_file(self, path, fallback_encoding='gbk'):
-        """内部工具：自动处理编码fallback的生成器"""
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                yield from f
-        except UnicodeDecodeError:
-            with open(path, 'r', encoding=fallback_encoding) as f:
-                yield from f
+    def _read_file(self, path, fallback_encoding='gbk', info=None):
+        """
+        内部工具：按文件编码逐行读取的生成器
+        先按 UTF-8 解码，遇到第一处非法的 UTF-8 时从所在行开始改用 fallback_encoding，
+        之后不再切换：已产出的行不会重复，也不需要预先扫描整个文件；
+        fallback_encoding 也无法解码时抛出 UnicodeDecodeError。
+        info 为字典时，info['encoding'] 记录当前使用的编码
+        """
+        if info is None:
+            info = {}
+        info['encoding'] = 'utf-8'
+        
+        def decode(data):
+            if info['encoding'] == 'utf-8':
+                try:
+                    return data.decode('utf-8')
+                except UnicodeDecodeError as e:
+                    start = data.rfind(b'\n', 0, e.start) + 1
+                    info['encoding'] = fallback_encoding
+                    return data[:start].decode('utf-8') + data[start:].decode(fallback_encoding)
+            return data.decode(info['encoding'])
+        
+        with self.session.open(path, 'rb') as f:
+            try:
+                pending = b''
+                while True:
+                    chunk = f.read(_READ_CHUNK)
+                    data = pending + chunk
+                    if chunk:
+                        # 只解码到最后一个换行符，UTF-8 和 GBK 的多字节字符中都不含换行符字节
+                        end = data.rfind(b'\n') + 1
+                        pending = data[end:]
+                        data = data[:end]
+                    if data:
+                        # 与文本模式相同，\r\n 和 \r 统一转换为 \n
+                        yield from io.StringIO(decode(data), newline=None)
+                    if not chunk:
+                        break
+            finally:
+                io_counters.read += f.tell()
     
     def __init__(self, executor=None):
         """
@@ -37,13 +207,27 @@ class Commands:
         self.executor = executor
         self.versionManager = VersionManager()
     
+    @property
+    def session(self):
+        """当前会话（工作目录和环境变量），所有路径都相对于它解析"""
+        session = current_session()
+        if session is None:
+            session = self.executor.session if self.executor else Session()
+        return session
+    
     def help(self):
         """显示所有可用命令"""
         if not self.executor:
             raise_command_error(ErrorCodes.COMMAND_EXECUTION_FAILED, "无法获取命令列表", "executor实例未初始化")
+            return 1
         
+        self.executor.plugins.discover()
         print("可用命令：")
-        for cmd in self.executor.commands_config:
+        for cmd in list(self.executor.commands_config) + list(self.executor.plugins.commands.values()):
+            parser = cmd.get('_parser')
+            if parser is not None:
+                print(f"  {parser.usage()} - {cmd['info']}")
+                continue
             params = cmd.get('para', '')
             if isinstance(params, list):
                 params_str = ' '.join([f'<{p}>' for p in params])
@@ -53,6 +237,7 @@ class Commands:
                 params_str = f'<{params}>' if params else ''
             
             print(f"  {cmd['cmd']} {params_str} - {cmd['info']}")
+        return 0
     
     def echo(self, *text):
         """回显所有参数（支持无限参数）"""
@@ -68,18 +253,20 @@ class Commands:
                 output_content = ' '.join(text_list[:redirect_index])
                 
                 try:
-                    with open(output_file, 'w', encoding='utf-8') as f:
+                    with self.session.open(output_file, 'w', encoding='utf-8') as f:
                         f.write(output_content)
                     print(f"内容已写入: {output_file}")
                 except Exception as e:
                     raise_filesystem_error(ErrorCodes.FILE_WRITE_ERROR, f"写入文件失败: {output_file}", str(e))
-                return
+                    return 1
+                return 0
             else:
                 # 没有指定目标文件，当作普通文本处理
                 print(' '.join(map(str, text)))
         else:
             # 普通回显
             print(' '.join(map(str, text)))
+        return 0
     
     def add(self, a, b):
         """计算两个数字的和"""
@@ -88,16 +275,20 @@ class Commands:
             print(f"{a} + {b} = {result}")
         except ValueError:
             raise_argument_error(ErrorCodes.INVALID_ARGUMENT_TYPE, "参数类型错误", f"无法将 '{a}' 或 '{b}' 转换为数字")
+            return 2
+        return 0
     
     def config(self, key, value=None):
         """查看或设置配置项"""
         if not key:
             raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "配置项键不能为空", "config命令需要指定配置项的键")
+            return 2
         
         if value is None:
             print(f"获取配置项: {key}")
         else:
             print(f"设置配置: {key} = {value}")
+        return 0
 
     def version(self):
         """显示当前版本信息"""
@@ -108,6 +299,8 @@ class Commands:
             print(f"名称: {name}")
         except Exception as e:
             raise_system_error(ErrorCodes.INITIALIZATION_FAILED, "无法获取版本信息", str(e))
+            return 1
+        return 0
     
     def clear(self):
         """清空控制台"""
@@ -115,88 +308,43 @@ class Commands:
             result = os.system('cls' if os.name == 'nt' else 'clear')
             if result != 0:
                 raise_system_error(ErrorCodes.COMMAND_EXECUTION_FAILED, "清空控制台失败", f"系统命令返回码: {result}")
+                return 1
         except Exception as e:
             raise_system_error(ErrorCodes.COMMAND_EXECUTION_FAILED, "清空控制台失败", str(e))
+            return 1
+        return 0
     
     def exit(self):
         """退出程序"""
         try:
+            if getattr(self.executor, 'embedded', False):
+                # 守护进程中 exit 只结束当前会话，不终止守护进程
+                raise SystemExit(0)
             print("正在退出程序...")
+            # os._exit 不会执行 atexit 回调，先写入尚未保存的命令历史和错误日志
+            if getattr(self.executor, 'history', None) is not None:
+                self.executor.history.flush()
+            error_manager.close_sinks()
+            trace_recorder.close()
             os._exit(0)
         except Exception as e:
             raise_system_error(ErrorCodes.SHUTDOWN_FAILED, "程序退出失败", str(e))
+            return 1
 
-    def ls(self, *args):
+    def ls(self, *paths, show_details=False, show_all=False, reverse_sort=False, sort_by_time=False,
+           sort_by_size=False, record_format=None):
         """列出目录内容（类似Linux ls命令）"""
         import time
         
-        # 解析参数
-        show_details = False
-        show_all = False
-        reverse_sort = False
-        sort_by_time = False
-        sort_by_size = False
-        paths = []
-        
-        i = 0
-        while i < len(args):
-            arg = args[i]
-            if arg.startswith('-'):
-                # 处理选项
-                if arg == '-l':
-                    show_details = True
-                elif arg == '-a':
-                    show_all = True
-                elif arg == '-r':
-                    reverse_sort = True
-                elif arg == '-t':
-                    sort_by_time = True
-                elif arg == '-S':
-                    sort_by_size = True
-                elif arg == '-la' or arg == '-al':
-                    show_details = True
-                    show_all = True
-                elif arg.startswith('--'):
-                    # 长选项
-                    if arg == '--help':
-                        print("用法: ls [选项]... [文件]...")
-                        print("列出目录内容")
-                        print()
-                        print("选项:")
-                        print("  -l            使用详细格式列表")
-                        print("  -a            显示所有文件（包括隐藏文件）")
-                        print("  -r            反向排序")
-                        print("  -t            按修改时间排序")
-                        print("  -S            按文件大小排序")
-                        print("  --help        显示此帮助信息")
-                        return
-                    else:
-                        raise_argument_error(ErrorCodes.UNKNOWN_OPTION, f"无法识别的选项 '{arg}'", "请使用 'ls --help' 获取帮助信息")
-                else:
-                    # 处理组合选项如 -la
-                    for char in arg[1:]:
-                        if char == 'l':
-                            show_details = True
-                        elif char == 'a':
-                            show_all = True
-                        elif char == 'r':
-                            reverse_sort = True
-                        elif char == 't':
-                            sort_by_time = True
-                        elif char == 'S':
-                            sort_by_size = True
-                        else:
-                            raise_argument_error(ErrorCodes.INVALID_OPTION_VALUE, f"无效选项 -- '{char}'")
-            else:
-                # 路径参数
-                paths.append(arg)
-            i += 1
-        
         # 如果没有指定路径，使用当前目录
         if not paths:
             paths = ['.']
         
-        # 处理每个路径
+        if record_format:
+            return self._ls_records(paths, record_format, show_all, reverse_sort, sort_by_time, sort_by_size)
+        
+        # 处理每个路径，任一路径失败时返回 1
+        status = 0
         for path_idx, path in enumerate(paths):
             if len(paths) > 1:
                 if path_idx > 0:
@@ -204,7 +352,8 @@ class Commands:
                 print(f"{path}:")
             
             try:
-                entries = os.listdir(path)
+                base = self.session.resolve(path)
+                entries = os.listdir(base)
                 
                 # 过滤隐藏文件
                 if not show_all:
@@ -213,7 +362,7 @@ class Commands:
                 # 获取文件信息
                 entries_info = []
                 for entry in entries:
-                    full_path = os.path.join(path, entry)
+                    full_path = os.path.join(base, entry)
                     try:
                         stat_info = os.stat(full_path)
                         entries_info.append({
@@ -256,6 +405,7 @@ class Commands:
                         if info['mode'] == 0:
                             # 无法获取详细信息
                             error_manager.log_error(ErrorCodes.FILE_READ_ERROR, f"无法读取文件信息: {name}", "权限不足或文件系统错误")
+                            status = 1
                             print(f"?{'?'*9} {'?':>8} {'?':>12} {name}")
                         else:
                             # 文件类型和权限
@@ -312,11 +462,80 @@ class Commands:
                     
             except FileNotFoundError:
                 raise_filesystem_error(ErrorCodes.DIRECTORY_NOT_FOUND, f"无法访问 '{path}'", "没有那个文件或目录")
+                status = 1
             except PermissionError:
                 raise_permission_error(ErrorCodes.DIRECTORY_ACCESS_DENIED, f"无法打开目录 '{path}'", "权限不够")
+                status = 1
             except Exception as e:
                 raise_filesystem_error(ErrorCodes.FILE_ACCESS_DENIED, f"无法访问 '{path}'", str(e))
+                status = 1
+        return status
 
+    def _ls_records(self, paths, fmt, show_all, reverse_sort, sort_by_time, sort_by_size):
+        """
+        内部工具：ls 的结构化输出
+        每个条目一条记录：path、name、type、size（字节）、mtime（纪元秒）、mode；
+        未指定 -t/-S/-r 时按目录中的顺序输出，不排序
+        """
+        writer = _RecordWriter(fmt)
+        for path in paths:
+            base = self.session.resolve(path)
+            try:
+                it = os.scandir(base)
+            except NotADirectoryError:
+                # 参数是文件时输出文件本身
+                try:
+                    st = os.stat(base)
+                except OSError as e:
+                    writer.error(ErrorCodes.FILE_READ_ERROR, str(e), path=path)
+                    continue
+                writer.add({'path': path, 'name': os.path.basename(base), 'type': _entry_type(st.st_mode),
+                            'size': st.st_size, 'mtime': st.st_mtime, 'mode': st.st_mode})
+                continue
+            except FileNotFoundError:
+                writer.error(ErrorCodes.DIRECTORY_NOT_FOUND, f"无法访问 '{path}': 没有那个文件或目录", path=path)
+                continue
+            except PermissionError:
+                writer.error(ErrorCodes.DIRECTORY_ACCESS_DENIED, f"无法打开目录 '{path}': 权限不够", path=path)
+                continue
+            except OSError as e:
+                writer.error(ErrorCodes.FILE_ACCESS_DENIED, f"无法访问 '{path}': {e}", path=path)
+                continue
+            
+            sort = sort_by_time or sort_by_size or reverse_sort
+            records = [] if sort else None
+            with it:
+                for entry in it:
+                    name = entry.name
+                    if not show_all and name.startswith('.'):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        # 悬空的符号链接等：使用链接本身的信息
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            writer.error(ErrorCodes.FILE_READ_ERROR, f"无法读取文件信息: {name}", path=path, name=name)
+                            continue
+                    record = {'path': path, 'name': name, 'type': _entry_type(st.st_mode),
+                              'size': st.st_size, 'mtime': st.st_mtime, 'mode': st.st_mode}
+                    if records is None:
+                        writer.add(record)
+                    else:
+                        records.append(record)
+            if records:
+                if sort_by_time:
+                    records.sort(key=lambda r: r['mtime'], reverse=not reverse_sort)
+                elif sort_by_size:
+                    records.sort(key=lambda r: r['size'], reverse=not reverse_sort)
+                else:
+                    records.sort(key=lambda r: (r['type'] != 'dir', r['name'].lower()), reverse=reverse_sort)
+                for record in records:
+                    writer.add(record)
+        writer.close()
+        return 1 if writer.failed else 0
+    
     def test_func(self, required1, optional1=None, required2=None):
         """测试命令：混合必需和可选参数"""
         print(f"必需参数1: {required1}")
@@ -324,31 +543,48 @@ class Commands:
             print(f"可选参数1: {optional1}")
         if required2 is not None:
             print(f"必需参数2: {required2}")
+        return 0
 
     def copy_func(self, source=None, destination=None):
         """复制文件：所有参数都是可选的"""
         if source is None and destination is None:
             raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请提供源文件和目标文件", "copy命令需要指定源文件和目标文件")
-            return
+            return 2
         if source is None:
             raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请提供源文件", "必须指定要复制的源文件")
-            return
+            return 2
         if destination is None:
             raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请提供目标文件", "必须指定目标文件路径")
-            return
+            return 2
         print(f"复制文件: {source} -> {destination}")
+        return 0
 
     def run(self, *args):
         """运行可执行文件（支持PATH路径和当前目录）"""
-        import subprocess
         import platform
         
+        # 解析 run 自身的选项（位于可执行文件名之前）
+        timeout = None
+        args = list(args)
+        while args and args[0] in ('-t', '--timeout'):
+            if len(args) < 2:
+                raise_argument_error(ErrorCodes.MISSING_ARGUMENT, f"选项 '{args[0]}' 需要一个参数", "例如: run --timeout 30 <程序>")
+                return 2
+            try:
+                timeout = float(args[1])
+                if timeout <= 0:
+                    raise ValueError(args[1])
+            except ValueError:
+                raise_argument_error(ErrorCodes.INVALID_OPTION_VALUE, f"无效的超时时间: {args[1]}", "超时时间必须是正数（秒）")
+                return 2
+            args = args[2:]
+        
         if not args:
             raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定要运行的可执行文件", "run命令需要指定可执行文件路径")
-            return
+            return 2
         
         executable = args[0]
-        run_args = list(args[1:]) if len(args) > 1 else []
+        run_args = args[1:]
         
         # 定义支持的可执行文件扩展名
         executable_extensions = ['.exe', '.com', '.bat', '.cmd']
@@ -359,8 +595,11 @@ class Commands:
         # 特殊处理Python脚本
         python_extensions = ['.py', '.pyw']
         
+        session = self.session
+        
         def find_executable(file_path):
-            """查找可执行文件的完整路径"""
+            """查找可执行文件的完整路径（相对路径基于会话工作目录）"""
+            file_path = session.resolve(file_path)
             # 如果文件已经存在（绝对路径或相对路径）
             if os.path.exists(file_path):
                 # 检查是否是文件
@@ -392,7 +631,7 @@ class Commands:
         
         def find_in_path(file_name):
             """在PATH环境变量中查找可执行文件"""
-            path_dirs = os.environ.get('PATH', '').split(os.pathsep)
+            path_dirs = session.getenv('PATH', '').split(os.pathsep)
             
             for directory in path_dirs:
                 directory = directory.strip('"')  # 移除可能的引号
@@ -441,20 +680,42 @@ class Commands:
                     raise PythonCMDError(ErrorCodes.FILE_NOT_FOUND, f"找不到可执行文件: {executable}",
                                          "文件不存在于PATH路径或当前目录中")
         
-        # 执行可执行文件
+        # 执行可执行文件（统一通过进程运行器启动，输出实时转发）
         try:
             # 检查是否是Python脚本
             if any(found_path.lower().endswith(ext) for ext in python_extensions):
                 # 使用Python解释器运行Python脚本
                 python_exe = sys.executable  # 获取当前Python解释器路径
-                result = subprocess.run([python_exe, found_path] + run_args, capture_output=False, text=True)
+                argv = [python_exe, found_path] + run_args
+            else:
+                argv = [found_path] + run_args
+            
+            job = current_job()
+            if job is not None:
+                # 后台任务：不占用终端输入，也不接收终端的 Ctrl+C
+                handle = process_runner.start(argv, timeout=timeout, stdin=subprocess.DEVNULL,
+                                              cwd=session.cwd, env=session.env, new_session=True)
+                job.attach_process(handle)
             else:
-                # 使用subprocess运行程序
-                result = subprocess.run([found_path] + run_args, capture_output=False, text=True)
+                handle = process_runner.start(argv, timeout=timeout, cwd=session.cwd, env=session.env)
+            result = process_runner.wait(handle)
+            
+            # 外部程序的输出字节数和CPU时间计入当前命令的指标
+            io_counters.written += result.output_bytes
+            if result.rusage is not None:
+                io_counters.add_child(result.rusage)
             
-            # 如果程序返回非零退出码，显示警告
-            if result.returncode != 0:
+            if result.timed_out:
+                raise_command_error(ErrorCodes.COMMAND_TIMEOUT, f"程序执行超时: {executable}", f"超过 {timeout:g} 秒，已终止")
+                return 124
+            elif result.interrupted:
+                reason = "任务已被 kill 终止" if job is not None else "用户按下了 Ctrl+C"
+                raise_command_error(ErrorCodes.COMMAND_INTERRUPTED, f"程序已被中断: {executable}", reason)
+                return 130
+            elif result.returncode != 0:
+                # 如果程序返回非零退出码，显示警告
                 print(f"[INFO] 程序返回码: {result.returncode}")
+            return result.returncode
                 
         except PermissionError:
             # 抛出异常，让调用者处理
@@ -470,50 +731,51 @@ class Commands:
     
     def cd(self, directory=None):
         """切换工作目录"""
+        session = self.session
         if directory is None:
             # 如果没有指定目录，显示当前目录
-            current_dir = os.getcwd()
-            print(f"当前目录: {current_dir}")
-            return
+            print(f"当前目录: {session.cwd}")
+            return 0
         
         try:
-            # 处理特殊路径
-            if directory == '..':
-                # 返回上级目录
-                parent_dir = os.path.dirname(os.getcwd())
-                os.chdir(parent_dir)
-            elif directory == '.' or directory == '':
-                # 当前目录，不做操作
-                pass
-            else:
-                # 尝试切换目录
-                os.chdir(directory)
-            
-            new_dir = os.getcwd()
-            print(f"已切换到目录: {new_dir}")
+            # 只切换当前会话的工作目录，不改变进程全局的当前目录
+            if directory not in ('.', ''):
+                session.chdir(directory)
+            print(f"已切换到目录: {session.cwd}")
         except FileNotFoundError:
             raise_filesystem_error(ErrorCodes.DIRECTORY_NOT_FOUND, f"目录不存在: {directory}", "请检查路径是否正确")
+            return 1
+        except NotADirectoryError:
+            raise_filesystem_error(ErrorCodes.FILE_NOT_DIRECTORY, f"不是目录: {directory}", "cd命令只能切换到目录")
+            return 1
         except PermissionError:
             raise_permission_error(ErrorCodes.DIRECTORY_ACCESS_DENIED, f"无法访问目录: {directory}", "权限不足")
+            return 1
         except Exception as e:
             raise_filesystem_error(ErrorCodes.FILE_ACCESS_DENIED, f"无法切换到目录: {directory}", str(e))
+            return 1
+        return 0
     
     def cat(self, *files):
         """显示文件内容（类似Linux cat命令）"""
         if not files:
             raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定要显示的文件", "cat命令需要至少一个文件名")
-            return
+            return 2
         
+        # 任一文件失败时返回 1，其余文件照常输出
+        status = 0
         for file_path in files:
             try:
                 # 检查文件是否存在
-                if not os.path.exists(file_path):
+                if not self.session.exists(file_path):
                     raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, f"文件不存在: {file_path}", "请检查文件路径")
+                    status = 1
                     continue
                 
                 # 检查是否是文件
-                if not os.path.isfile(file_path):
+                if not self.session.isfile(file_path):
                     raise_filesystem_error(ErrorCodes.FILE_NOT_DIRECTORY, f"不是普通文件: {file_path}", "cat命令只能显示普通文件内容")
+                    status = 1
                     continue
                 
                 # 使用流式读取，避免大文件内存问题
@@ -523,130 +785,260 @@ class Commands:
                 except Exception:
                     # 如果还是失败，尝试以二进制模式读取并显示部分信息
                     raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"无法读取文件: {file_path}", "文件可能不是文本文件或编码不支持")
+                    status = 1
                     continue
                     
             except PythonCMDError as e:
                 # 捕获并显示错误，但继续处理下一个文件
                 error_manager.log_error(e.code, e.message, e.details)
                 formatted_msg = error_manager.format_error_message(e.code, e.message, e.details)
-                print(formatted_msg)
+                print(formatted_msg, file=error_output())
+                status = 1
                 continue
             except Exception as e:
                 error_manager.log_error(ErrorCodes.FILE_READ_ERROR, f"处理文件失败: {file_path}", str(e))
                 formatted_msg = error_manager.format_error_message(ErrorCodes.FILE_READ_ERROR, f"处理文件失败: {file_path}", str(e))
-                print(formatted_msg)
+                print(formatted_msg, file=error_output())
+                status = 1
                 continue
+        return status
     
     def mkdir(self, *dirs):
         """创建目录（类似Linux mkdir命令）"""
         if not dirs:
             raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定要创建的目录", "mkdir命令需要至少一个目录名")
-            return
+            return 2
         
+        # 大量目录（如 mkdir d{1..10000}）时合并输出，减少写操作次数
+        output = _OutputBatch()
+        status = 0
         for dir_path in dirs:
             try:
-                if os.path.exists(dir_path):
-                    raise_filesystem_error(ErrorCodes.DIRECTORY_EXISTS, f"目录已存在: {dir_path}", "无法创建已存在的目录")
-                    continue
-                
-                os.makedirs(dir_path)
-                print(f"已创建目录: {dir_path}")
+                self.session.makedirs(dir_path)
+                output.add(f"已创建目录: {dir_path}")
+            except FileExistsError:
+                output.flush()
+                raise_filesystem_error(ErrorCodes.DIRECTORY_EXISTS, f"目录已存在: {dir_path}", "无法创建已存在的目录")
+                status = 1
+                continue
             except Exception as e:
+                output.flush()
                 raise_filesystem_error(ErrorCodes.DIRECTORY_CREATE_ERROR, f"创建目录失败: {dir_path}", str(e))
+                status = 1
                 continue
+        output.flush()
+        return status
     
-    def rm(self, *paths):
+    def rm(self, *paths, force=False, recursive=False, progress=False, cross_mounts=False, jobs=None):
         """删除文件或目录（类似Linux rm命令）"""
-        if not paths:
-            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定要删除的文件或目录", "rm命令需要至少一个路径")
-            return
-        
-        # 处理选项参数
-        force = False
-        recursive = False
-        actual_paths = []
-        
+        session = self.session
+        engine = None
+        status = 0
+        output = _OutputBatch()
         for path in paths:
-            if path == '-f':
-                force = True
-            elif path == '-r' or path == '-rf' or path == '-fr':
-                recursive = True
-                if path == '-rf' or path == '-fr':
-                    force = True
-            else:
-                actual_paths.append(path)
-        
-        if not actual_paths:
-            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定要删除的文件或目录", "rm命令需要至少一个路径")
-            return
-        
-        for path in actual_paths:
             try:
-                if not os.path.exists(path):
+                if not session.lexists(path):
                     if not force:
+                        output.flush()
                         raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, f"文件或目录不存在: {path}", "无法删除不存在的项目")
+                        status = 1
                     continue
                 
-                if os.path.isfile(path):
-                    os.remove(path)
-                    print(f"已删除文件: {path}")
-                elif os.path.isdir(path):
-                    if recursive:
-                        import shutil
-                        shutil.rmtree(path)
-                        print(f"已删除目录: {path}")
-                    else:
+                if session.isdir(path) and not session.islink(path):
+                    output.flush()
+                    if not recursive:
                         raise_filesystem_error(ErrorCodes.DIRECTORY_NOT_EMPTY, f"无法删除目录: {path}", "请使用 -r 选项递归删除目录")
+                        status = 1
+                        continue
+                    
+                    if engine is None:
+                        engine = RemoveEngine(max_workers=jobs, cross_mounts=cross_mounts, progress=progress)
+                    stats = engine.remove_tree(session.resolve(path))
+                    # 删除线程中记录的错误不计入当前线程，按统计结果设置状态
+                    if stats.failed:
+                        status = 1
+                    
+                    # 非强制模式下显示部分失败详情，强制模式只给出计数
+                    if not force:
+                        for failed_path, reason in stats.errors[:10]:
+                            print(error_manager.format_error_message(ErrorCodes.FILE_DELETE_ERROR, f"删除失败: {failed_path}", reason), file=error_output())
+                        if stats.failed > 10:
+                            print(f"... 另有 {stats.failed - 10} 个条目删除失败")
+                    
+                    if stats.failed == 0:
+                        print(f"已删除目录: {path}")
+                    print(f"删除统计: 移除 {stats.removed} 个, 失败 {stats.failed} 个, "
+                          f"用时 {stats.elapsed:.2f}秒 ({stats.rate:.0f} 个/秒)")
+                else:
+                    session.unlink(path)
+                    output.add(f"已删除文件: {path}")
             except Exception as e:
-                if not force:
+                output.flush()
+                if force:
+                    error_manager.log_error(ErrorCodes.FILE_DELETE_ERROR, f"删除失败: {path}", str(e))
+                else:
                     raise_filesystem_error(ErrorCodes.FILE_DELETE_ERROR, f"删除失败: {path}", str(e))
+                status = 1
                 continue
+        output.flush()
+        return status
     
+    def _copy_file_streamed(self, src, dst, chunk_size=1024 * 1024):
+        """内部工具：分块流式复制文件内容及元数据，避免大文件一次性读入内存"""
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            shutil.copyfileobj(fsrc, fdst, chunk_size)
+        shutil.copystat(src, dst)
+        return dst
+
+    def _move_path(self, src, dst):
+        """内部工具：移动单个路径，同设备直接rename（O(1)），跨设备时复制后删除源"""
+        is_dir = os.path.isdir(src) and not os.path.islink(src)
+        try:
+            if is_dir:
+                os.rename(src, dst)
+            else:
+                os.replace(src, dst)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+        # 跨设备：流式复制，成功后再删除源，失败时清理不完整的目标
+        if os.path.islink(src):
+            os.symlink(os.readlink(src), dst)
+            os.unlink(src)
+        elif is_dir:
+            try:
+                shutil.copytree(src, dst, symlinks=True, copy_function=self._copy_file_streamed)
+            except Exception:
+                shutil.rmtree(dst, ignore_errors=True)
+                raise
+            shutil.rmtree(src)
+        else:
+            try:
+                self._copy_file_streamed(src, dst)
+            except Exception:
+                if os.path.exists(dst):
+                    os.remove(dst)
+                raise
+            os.unlink(src)
+
+    def mv(self, *paths, no_clobber=False):
+        """移动或重命名文件/目录（类似Linux mv命令）"""
+        session = self.session
+        sources = paths[:-1]
+        target = paths[-1]
+        target_is_dir = session.isdir(target)
+
+        # 多个源时目标必须是已存在的目录
+        if len(sources) > 1 and not target_is_dir:
+            raise_filesystem_error(ErrorCodes.FILE_NOT_DIRECTORY, f"目标不是目录: {target}", "移动多个文件时目标必须是已存在的目录")
+            return 1
+
+        status = 0
+        for src in sources:
+            if target_is_dir:
+                dst = os.path.join(target, os.path.basename(os.path.normpath(src)))
+            else:
+                dst = target
+
+            # 文件操作使用基于会话工作目录的绝对路径，提示信息保留用户输入的路径
+            src_path = session.resolve(src)
+            dst_path = session.resolve(dst)
+            try:
+                if not os.path.lexists(src_path):
+                    raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, f"文件或目录不存在: {src}", "无法移动不存在的项目")
+                    status = 1
+                    continue
+
+                if os.path.lexists(dst_path):
+                    if os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+                        raise_filesystem_error(ErrorCodes.FILE_MOVE_ERROR, f"源和目标相同: {src}", "无需移动")
+                        status = 1
+                        continue
+                    if no_clobber:
+                        continue
+                    if os.path.isdir(dst_path) and not os.path.islink(dst_path):
+                        raise_filesystem_error(ErrorCodes.DIRECTORY_EXISTS, f"目标目录已存在: {dst}", "无法覆盖已存在的目录")
+                        status = 1
+                        continue
+
+                # 不允许把目录移动到自身内部
+                if os.path.isdir(src_path):
+                    if dst_path.startswith(src_path + os.sep):
+                        raise_filesystem_error(ErrorCodes.INVALID_PATH, f"无法将目录移动到自身的子目录中: {src}", f"目标: {dst}")
+                        status = 1
+                        continue
+
+                self._move_path(src_path, dst_path)
+                print(f"已移动: {src} -> {dst}")
+            except PermissionError as e:
+                raise_permission_error(ErrorCodes.FILE_ACCESS_DENIED, f"没有权限移动: {src}", str(e))
+                status = 1
+                continue
+            except Exception as e:
+                raise_filesystem_error(ErrorCodes.FILE_MOVE_ERROR, f"移动失败: {src} -> {dst}", str(e))
+                status = 1
+                continue
+        return status
+
     def touch(self, *files):
         """创建空文件或更新时间戳（类似Linux touch命令）"""
         if not files:
             raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定要创建的文件", "touch命令需要至少一个文件名")
-            return
+            return 2
         
+        output = _OutputBatch()
+        status = 0
         for file_path in files:
             try:
-                if os.path.exists(file_path):
+                try:
                     # 文件存在，更新修改时间
-                    os.utime(file_path, None)
-                    print(f"已更新时间戳: {file_path}")
-                else:
+                    self.session.utime(file_path, None)
+                    output.add(f"已更新时间戳: {file_path}")
+                except FileNotFoundError:
                     # 文件不存在，创建空文件
-                    with open(file_path, 'w') as f:
-                        pass
-                    print(f"已创建文件: {file_path}")
+                    os.close(self.session.os_open(file_path, os.O_WRONLY | os.O_CREAT, 0o666))
+                    output.add(f"已创建文件: {file_path}")
             except Exception as e:
+                output.flush()
                 raise_filesystem_error(ErrorCodes.FILE_CREATE_ERROR, f"操作失败: {file_path}", str(e))
+                status = 1
                 continue
+        output.flush()
+        return status
     
     def pwd(self):
         """显示当前工作目录（类似Linux pwd命令）"""
-        current_dir = os.getcwd()
-        print(current_dir)
+        print(self.session.cwd)
+        return 0
     
     def whoami(self):
         """显示当前用户（类似Linux whoami命令）"""
         import getpass
         username = getpass.getuser()
         print(username)
+        return 0
     
     def which(self, command):
         """显示命令位置（类似Linux which命令）"""
         if not command:
             raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定要查找的命令", "which命令需要指定命令名")
-            return
+            return 2
+        
+        definition = self.executor.definitions.get(command) if self.executor else None
+        if definition is not None:
+            kind = '别名' if definition.kind == ALIAS else '函数'
+            print(f"{command}: {kind} {definition.text}")
+            return 0
         
         # 首先检查内置命令
         if hasattr(self, 'command_map') and command in self.command_map:
             print(f"{command}: 内置命令")
-            return
+            return 0
         
         # 在PATH中查找
-        path_dirs = os.environ.get('PATH', '').split(os.pathsep)
+        path_dirs = self.session.getenv('PATH', '').split(os.pathsep)
         found = False
         
         for directory in path_dirs:
@@ -670,146 +1062,363 @@ class Commands:
         
         if not found:
             raise_command_error(ErrorCodes.COMMAND_NOT_FOUND, f"未找到命令: {command}", "命令不存在于PATH中")
+            return 1
+        return 0
     
-    def _get_path_executables(self):
-        """获取PATH中的可执行文件（带缓存机制）"""
-        current_path = os.environ.get('PATH', '')
-        current_time = time.time()
-        current_path_hash = hash(current_path)
-        
-        # 检查是否需要更新缓存（PATH变化或超过5分钟）
-        should_update = (
-            not hasattr(self, '_path_cache') or not self._path_cache or  # 缓存为空
-            current_path_hash != getattr(self, '_path_env_hash', None) or  # PATH环境变化
-            (current_time - getattr(self, '_path_cache_time', 0)) > 300  # 超过5分钟
-        )
-        
-        if should_update:
-            # 更新缓存
-            self._path_cache = {}
-            self._path_env_hash = current_path_hash
-            self._path_cache_time = current_time
-            
-            path_dirs = current_path.split(os.pathsep)
-            common_exe_extensions = ['.exe', '.com', '.bat', '.cmd', '.vbs', '.js', '.ps1']
-            
-            for directory in path_dirs:
-                directory = directory.strip('"')
-                if directory and os.path.exists(directory):
-                    try:
-                        for item in os.listdir(directory):
-                            # 更严格的可执行文件判断
-                            if (not item.startswith('.') and
-                                len(item) > 2 and  # 排除单字符和双字符文件
-                                os.path.isfile(os.path.join(directory, item))):  # 确保是普通文件
-                                
-                                # 检查扩展名或没有扩展名（可能是可执行文件）
-                                has_exe_extension = any(item.lower().endswith(ext) for ext in common_exe_extensions)
-                                has_no_extension = '.' not in item
-                                
-                                if has_exe_extension or has_no_extension:
-                                    # 移除扩展名，只保留基本名称用于匹配
-                                    base_name = item
-                                    if has_exe_extension:
-                                        for ext in common_exe_extensions:
-                                            if item.lower().endswith(ext):
-                                                base_name = item[:-len(ext)]
-                                                break
-                                    self._path_cache[base_name] = os.path.join(directory, item)
-                    except (OSError, PermissionError):
-                        continue
-        
-        return list(self._path_cache.keys())
+    def _find_job(self, spec=None):
+        """内部工具：按编号查找后台任务，不存在时输出错误并返回 None"""
+        jobs = self.executor.jobs
+        try:
+            job = jobs.get(spec)
+        except ValueError as e:
+            raise_argument_error(ErrorCodes.INVALID_ARGUMENT_FORMAT, str(e), "任务编号格式为 N 或 %N")
+            return None
+        if job is None:
+            if spec is None:
+                raise_system_error(ErrorCodes.RESOURCE_NOT_FOUND, "当前没有后台任务", "在命令末尾加上 & 可以在后台运行")
+            else:
+                raise_system_error(ErrorCodes.RESOURCE_NOT_FOUND, f"任务不存在: {spec}", "请使用 'jobs' 查看任务列表")
+        return job
     
-    def grep(self, pattern, file):
-        """搜索文本模式（类似Linux grep命令）"""
-        if not pattern or not file:
-            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请提供搜索模式和文件名", "grep命令需要模式和文件名")
-            return
+    def jobs(self):
+        """列出后台任务"""
+        for job in self.executor.jobs.list():
+            print(self.executor.jobs.format_status(job))
+        return 0
+    
+    def wait(self, job_spec=None):
+        """等待后台任务结束并输出其结果（未指定时等待全部任务）"""
+        if job_spec is None:
+            targets = self.executor.jobs.list()
+        else:
+            job = self._find_job(job_spec)
+            if job is None:
+                return 1
+            targets = [job]
+        
+        returncode = 0
+        for job in targets:
+            job.wait()
+            self.executor.jobs.report(job)
+            returncode = job.returncode
+        return returncode
+    
+    def fg(self, job_spec=None):
+        """把后台任务切换到前台：实时显示输出并等待结束"""
+        job = self._find_job(job_spec)
+        if job is None:
+            return 1
+        
+        print(job.command)
+        job.output.attach(sys.stdout)
+        try:
+            try:
+                job.wait()
+            except KeyboardInterrupt:
+                job.kill()
+                job.wait()
+        finally:
+            job.output.detach()
+        self.executor.jobs.report(job)
+        return job.returncode
+    
+    def kill(self, *job_specs):
+        """终止后台任务中正在运行的外部程序"""
+        if not job_specs:
+            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定要终止的任务", "例如: kill %1")
+            return 2
+        
+        status = 0
+        for spec in job_specs:
+            job = self._find_job(spec)
+            if job is None:
+                status = 1
+                continue
+            if job.finished.is_set():
+                print(f"[{job.id}] 任务已结束")
+                continue
+            if not job.running_processes():
+                raise_command_error(ErrorCodes.COMMAND_EXECUTION_FAILED, f"无法终止任务: {spec}",
+                                    "任务当前没有运行外部程序，内置命令只能等待其结束")
+                status = 1
+                continue
+            job.kill()
+            print(f"[{job.id}] 已发送终止信号: {job.command}")
+        return status
+    
+    def _xargs_inputs(self, sources):
+        """内部工具：按顺序惰性读取 xargs 的输入参数（文件/标准输入每行一个，通配符展开结果）"""
+        for kind, value in sources:
+            if kind == 'glob':
+                yield from expand_arguments(value, self.session.cwd)
+            elif value == '-':
+                for line in sys.stdin:
+                    line = line.rstrip('\r\n')
+                    if line:
+                        yield line
+            else:
+                for line in self._read_file(value):
+                    line = line.rstrip('\r\n')
+                    if line:
+                        yield line
+    
+    def _xargs_batches(self, inputs, base_size, max_args, max_chars):
+        """内部工具：把输入参数按数量（-n）和命令行长度（-s）分批"""
+        batch = []
+        size = base_size
+        for arg in inputs:
+            arg_size = len(arg) + 1
+            if batch and ((max_args and len(batch) >= max_args) or size + arg_size > max_chars):
+                yield batch
+                batch = []
+                size = base_size
+            batch.append(arg)
+            size += arg_size
+        if batch:
+            yield batch
+    
+    def xargs(self, cmd_name, *initial_args, sources=None, max_args=0, max_chars=128 * 1024, parallel=1,
+              keep_order=False):
+        """
+        对大量输入参数分批执行命令，支持并发（类似Linux xargs / GNU parallel）
+        :param sources: -a/-g 指定的输入，按出现顺序的 ('file'|'glob', 值) 列表，为空时读取标准输入
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait as wait_futures, FIRST_COMPLETED
+        import io
+        
+        sources = list(sources or ())
+        if not sources:
+            # 没有指定输入时从标准输入读取（管道）
+            sources.append(('file', '-'))
+        parallel = parallel or (os.cpu_count() or 1)
+        
+        initial_args = list(initial_args)
+        base_size = sum(len(part) + 1 for part in [cmd_name] + initial_args)
+        batches = self._xargs_batches(self._xargs_inputs(sources), base_size, max_args, max_chars)
+        
+        # 外部程序会登记到任务组上，Ctrl+C 时统一终止
+        group = current_job() or Job(0, f"xargs {cmd_name}")
+        session = self.session
+        
+        def invoke(batch):
+            output = io.StringIO()
+            # 工作线程没有绑定会话，每次执行使用当前会话的副本
+            with job_context(group), session_context(session.fork()), redirect_output(output):
+                status = self.executor.dispatch(cmd_name, initial_args + batch)
+            return status, output.getvalue()
+        
+        failed = 0
+        results = {}
+        next_index = 0
+        pending = set()
+        window = parallel * 4  # 限制同时排队的批次数，输入再多也不会一次性提交
+        
+        def emit(done):
+            nonlocal failed, next_index
+            for future in done:
+                status, text = future.result()
+                if status != 0:
+                    failed += 1
+                if keep_order:
+                    results[future.index] = text
+                else:
+                    sys.stdout.write(text)
+            if keep_order:
+                while next_index in results:
+                    sys.stdout.write(results.pop(next_index))
+                    next_index += 1
+            sys.stdout.flush()
+        
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='xargs') as pool:
+            try:
+                for index, batch in enumerate(batches):
+                    future = pool.submit(invoke, batch)
+                    future.index = index
+                    pending.add(future)
+                    while len(pending) >= window:
+                        done, pending = wait_futures(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                        emit(done)
+                while pending:
+                    done, pending = wait_futures(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                    emit(done)
+            except KeyboardInterrupt:
+                for future in pending:
+                    future.cancel()
+                group.kill()
+                raise_command_error(ErrorCodes.COMMAND_INTERRUPTED, "xargs 已被中断", "已终止正在运行的命令")
+                return 130
+            except FileNotFoundError as e:
+                raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, "无法读取输入", str(e))
+                return 1
+        
+        # 与xargs一致：任一次执行失败时返回123
+        return 123 if failed else 0
+    
+    def grep(self, pattern, file, record_format=None):
+        """搜索文本模式（类似Linux grep命令，--ndjson/--json 输出结构化记录）"""
+        if not pattern:
+            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "搜索模式不能为空", "用法: grep [--ndjson|--json] 模式 文件")
+            return 2
+        if record_format:
+            return self._grep_records(pattern, file, record_format)
         
         try:
-            if not os.path.exists(file):
+            if not self.session.exists(file):
                 raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, f"文件不存在: {file}", "请检查文件路径")
-                return
+                return 2
             
-            if not os.path.isfile(file):
+            if not self.session.isfile(file):
                 raise_filesystem_error(ErrorCodes.FILE_NOT_DIRECTORY, f"不是普通文件: {file}", "grep命令只能搜索普通文件")
-                return
+                return 2
             
-            with open(file, 'r', encoding='utf-8') as f:
-                line_num = 0
-                for line in f:
-                    line_num += 1
-                    if pattern in line:
-                        print(f"{line_num}:{line.rstrip()}")
-        except UnicodeDecodeError:
-            try:
-                with open(file, 'r', encoding='gbk') as f:
-                    line_num = 0
-                    for line in f:
-                        line_num += 1
-                        if pattern in line:
-                            print(f"{line_num}:{line.rstrip()}")
-            except Exception as e:
-                raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"无法读取文件: {file}", str(e))
+            matches = 0
+            line_num = 0
+            for line in self._read_file(file):
+                line_num += 1
+                if pattern in line:
+                    matches += 1
+                    print(f"{line_num}:{line.rstrip()}")
+        except UnicodeDecodeError as e:
+            raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"文件编码不支持: {file}", str(e))
+            return 2
         except Exception as e:
             raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"搜索失败: {file}", str(e))
-    
-    def head(self, *args):
-        """显示文件开头几行（类似Linux head命令）"""
-        if not args:
-            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定文件名", "head命令需要文件名")
-            return
-        
-        # 解析参数
-        file = None
-        lines = 10
-        i = 0
+            return 2
         
-        while i < len(args):
-            arg = args[i]
-            if arg == '-n' and i + 1 < len(args):
-                # -n 选项指定行数
-                try:
-                    lines = int(args[i + 1])
-                    i += 2
-                except (ValueError, IndexError):
-                    lines = 10
-                    i += 1
-            elif arg.startswith('-n') and len(arg) > 2:
-                # -n10 格式
-                try:
-                    lines = int(arg[2:])
-                    i += 1
-                except ValueError:
-                    lines = 10
-                    i += 1
-            elif not arg.startswith('-'):
-                # 文件名
-                if file is None:
-                    file = arg
-                    i += 1
+        # 与grep一致：有匹配返回0，无匹配返回1
+        return 0 if matches else 1
+    
+    def _grep_records(self, pattern, file, fmt):
+        """
+        内部工具：grep 的结构化输出（file、line 行号、offset 行首字节偏移、text）
+        以二进制方式读取，先在字节上查找编码后的模式，只解码命中的行
+        """
+        writer = _RecordWriter(fmt)
+        matches = 0
+        try:
+            f = self.session.open(file, 'rb')
+        except FileNotFoundError:
+            writer.error(ErrorCodes.FILE_NOT_FOUND, f"文件不存在: {file}", file=file)
+            writer.close()
+            return 2
+        except IsADirectoryError:
+            writer.error(ErrorCodes.FILE_NOT_DIRECTORY, f"不是普通文件: {file}", file=file)
+            writer.close()
+            return 2
+        except OSError as e:
+            writer.error(ErrorCodes.FILE_READ_ERROR, f"无法读取文件: {file}: {e}", file=file)
+            writer.close()
+            return 2
+        
+        # 与文本模式一致：优先按UTF-8解码，遇到无法解码的行后改用GBK
+        encoding = 'utf-8'
+        needle = pattern.encode(encoding)
+        offset = 0
+        with f:
+            for line_num, raw in enumerate(f, 1):
+                start = offset
+                offset += len(raw)
+                if needle not in raw:
+                    if encoding == 'gbk' or raw.isascii():
+                        continue
+                    try:
+                        raw.decode('utf-8')
+                        continue
+                    except UnicodeDecodeError:
+                        encoding = 'gbk'
+                        try:
+                            needle = pattern.encode(encoding)
+                        except UnicodeEncodeError:
+                            break
+                        if needle not in raw:
+                            continue
+                text = raw.decode(encoding, errors='replace').rstrip('\r\n')
+                # GBK 的双字节字符可能在字节层面产生误匹配，解码后再确认
+                if pattern not in text:
+                    continue
+                matches += 1
+                writer.add({'file': file, 'line': line_num, 'offset': start, 'text': text})
+        io_counters.read += offset
+        writer.close()
+        return 0 if matches else 1
+    
+    def find(self, *roots, name=None, file_type=None, maxdepth=None, record_format=None):
+        """查找文件（find [路径...] [-name 模式] [-type f|d|l] [-maxdepth N] [--ndjson|--json]）"""
+        name_match = re.compile(fnmatch.translate(name)).match if name is not None else None
+        type_filter = {'f': 'file', 'd': 'dir', 'l': 'symlink'}.get(file_type)
+        max_depth = maxdepth
+        if not roots:
+            roots = ['.']
+        
+        writer = _RecordWriter(record_format) if record_format else None
+        output = _OutputBatch() if writer is None else None
+        status = 0
+        for root in roots:
+            base = self.session.resolve(root)
+            try:
+                st = os.lstat(base)
+            except OSError as e:
+                status = 1
+                if writer is not None:
+                    writer.error(ErrorCodes.FILE_NOT_FOUND, f"无法访问 '{root}': {e.strerror}", path=root)
                 else:
-                    i += 1
-            else:
-                i += 1
-        
-        if file is None:
-            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定文件名", "head命令需要文件名")
-            return
-        
+                    output.flush()
+                    raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, f"无法访问 '{root}'", e.strerror)
+                continue
+            
+            # 深度优先遍历，不跟随符号链接；栈中保存 (显示路径, 实际路径, 深度)
+            entries = [(root, base, 0, st)]
+            while entries:
+                shown, path, depth, st = entries.pop()
+                kind = _entry_type(st.st_mode)
+                if (type_filter is None or kind == type_filter) and \
+                        (name_match is None or name_match(os.path.basename(shown) or shown)):
+                    if writer is not None:
+                        writer.add({'path': shown, 'type': kind, 'size': st.st_size,
+                                    'mtime': st.st_mtime, 'mode': st.st_mode, 'depth': depth})
+                    else:
+                        output.add(shown)
+                if kind != 'dir' or (max_depth is not None and depth >= max_depth):
+                    continue
+                try:
+                    with os.scandir(path) as it:
+                        children = []
+                        for entry in it:
+                            try:
+                                child_st = entry.stat(follow_symlinks=False)
+                            except OSError:
+                                continue
+                            children.append((os.path.join(shown, entry.name), entry.path, depth + 1, child_st))
+                except OSError as e:
+                    status = 1
+                    if writer is not None:
+                        writer.error(ErrorCodes.DIRECTORY_ACCESS_DENIED, f"无法读取目录 '{shown}': {e.strerror}", path=shown)
+                    else:
+                        output.flush()
+                        raise_permission_error(ErrorCodes.DIRECTORY_ACCESS_DENIED, f"无法读取目录 '{shown}'", e.strerror)
+                    continue
+                # 逆序压栈，使同一目录中的条目按目录顺序输出
+                children.reverse()
+                entries.extend(children)
+        if writer is not None:
+            writer.close()
+        else:
+            output.flush()
+        return status
+    
+    def head(self, file, lines=10):
+        """显示文件开头几行（类似Linux head命令）"""
         try:
-            if not os.path.exists(file):
+            if not self.session.exists(file):
                 raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, f"文件不存在: {file}", "请检查文件路径")
-                return
+                return 1
             
-            if not os.path.isfile(file):
+            if not self.session.isfile(file):
                 raise_filesystem_error(ErrorCodes.FILE_NOT_DIRECTORY, f"不是普通文件: {file}", "head命令只能显示普通文件")
-                return
+                return 1
             
-            # 确保行数是正整数
-            if lines <= 0:
-                lines = 10
+            if lines == 0:
+                return 0
             
             # 使用流式读取，避免大文件内存问题
             line_num = 0
@@ -819,94 +1428,38 @@ class Commands:
                     if line_num > lines:
                         break
                     sys.stdout.write(line)  # 比print少一次strip/add，保持原始格式
-            except UnicodeDecodeError:
-                # 如果UTF-8解码失败，尝试使用GBK
-                try:
-                    with open(file, 'r', encoding='gbk') as f:
-                        line_num = 0
-                        for line in f:
-                            line_num += 1
-                            if line_num > lines:
-                                break
-                            sys.stdout.write(line)
-                except Exception as e:
-                    raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"文件编码不支持: {file}", str(e))
-                    return
+            except UnicodeDecodeError as e:
+                raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"文件编码不支持: {file}", str(e))
+                return 1
         except PythonCMDError:
             raise  # 重新抛出PythonCMDError
         except Exception as e:
             raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"读取失败: {file}", str(e))
+            return 1
+        return 0
     
-    def tail(self, *args):
+    def tail(self, file, lines=10):
         """显示文件末尾几行（类似Linux tail命令）"""
-        if not args:
-            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定文件名", "tail命令需要文件名")
-            return
-        
-        # 解析参数
-        file = None
-        lines = 10
-        i = 0
-        
-        while i < len(args):
-            arg = args[i]
-            if arg == '-n' and i + 1 < len(args):
-                # -n 选项指定行数
-                try:
-                    lines = int(args[i + 1])
-                    i += 2
-                except (ValueError, IndexError):
-                    lines = 10
-                    i += 1
-            elif arg.startswith('-n') and len(arg) > 2:
-                # -n10 格式
-                try:
-                    lines = int(arg[2:])
-                    i += 1
-                except ValueError:
-                    lines = 10
-                    i += 1
-            elif not arg.startswith('-'):
-                # 文件名
-                if file is None:
-                    file = arg
-                    i += 1
-                else:
-                    i += 1
-            else:
-                i += 1
-        
-        if file is None:
-            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定文件名", "tail命令需要文件名")
-            return
-        
         try:
-            if not os.path.exists(file):
+            if not self.session.exists(file):
                 raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, f"文件不存在: {file}", "请检查文件路径")
-                return
+                return 1
             
-            if not os.path.isfile(file):
+            if not self.session.isfile(file):
                 raise_filesystem_error(ErrorCodes.FILE_NOT_DIRECTORY, f"不是普通文件: {file}", "tail命令只能显示普通文件")
-                return
+                return 1
             
-            # 确保行数是正整数
-            if lines <= 0:
-                lines = 10
+            if lines == 0:
+                return 0
             
             # 使用deque维护最后N行，避免大文件内存问题
             last_lines = deque(maxlen=lines)
             try:
                 for line in self._read_file(file):
                     last_lines.append(line)
-            except UnicodeDecodeError:
-                # 如果UTF-8解码失败，尝试使用GBK
-                try:
-                    with open(file, 'r', encoding='gbk') as f:
-                        for line in f:
-                            last_lines.append(line)
-                except Exception as e:
-                    raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"文件编码不支持: {file}", str(e))
-                    return
+            except UnicodeDecodeError as e:
+                raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"文件编码不支持: {file}", str(e))
+                return 1
             
             # 输出最后几行
             for line in last_lines:
@@ -916,23 +1469,28 @@ class Commands:
             raise  # 重新抛出PythonCMDError
         except Exception as e:
             raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"读取失败: {file}", str(e))
+            return 1
+        return 0
     
-    def wc(self, *files):
-        """统计文件信息（类似Linux wc命令）"""
-        if not files:
-            raise_argument_error(ErrorCodes.MISSING_ARGUMENT, "请指定要统计的文件", "wc命令需要至少一个文件名")
-            return
-        
+    def wc(self, *files, record_format=None):
+        """统计文件信息（类似Linux wc命令，--ndjson/--json 输出结构化记录）"""
         total_lines = total_words = total_chars = 0
+        writer = _RecordWriter(record_format) if record_format else None
+        status = 0
         
         for file_path in files:
+            if writer is not None:
+                self._wc_record(writer, file_path)
+                continue
             try:
-                if not os.path.exists(file_path):
+                if not self.session.exists(file_path):
                     raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, f"文件不存在: {file_path}", "请检查文件路径")
+                    status = 1
                     continue
                 
-                if not os.path.isfile(file_path):
+                if not self.session.isfile(file_path):
                     raise_filesystem_error(ErrorCodes.FILE_NOT_DIRECTORY, f"不是普通文件: {file_path}", "wc命令只能统计普通文件")
+                    status = 1
                     continue
                 
                 # 使用流式处理，避免大文件内存问题
@@ -942,17 +1500,10 @@ class Commands:
                         lines += 1
                         words += len(line.split())
                         chars += len(line)
-                except UnicodeDecodeError:
-                    # 如果UTF-8解码失败，尝试使用GBK
-                    try:
-                        with open(file_path, 'r', encoding='gbk') as f:
-                            for line in f:
-                                lines += 1
-                                words += len(line.split())
-                                chars += len(line)
-                    except Exception as e:
-                        raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"文件编码不支持: {file_path}", str(e))
-                        continue
+                except UnicodeDecodeError as e:
+                    raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"文件编码不支持: {file_path}", str(e))
+                    status = 1
+                    continue
                 
                 print(f"{lines:8}{words:8}{chars:8} {file_path}")
                 
@@ -964,16 +1515,441 @@ class Commands:
                 raise  # 重新抛出PythonCMDError
             except Exception as e:
                 error_manager.log_error(ErrorCodes.FILE_READ_ERROR, f"统计失败: {file_path}", str(e))
+                status = 1
                 continue
         
+        if writer is not None:
+            writer.close()
+            return 1 if writer.failed else 0
+        
         # 如果是多个文件，显示总计
         if len(files) > 1:
             print(f"{total_lines:8}{total_words:8}{total_chars:8} 总计")
+        return status
+    
+    def _wc_record(self, writer, file_path):
+        """内部工具：wc 的结构化输出（file、lines、words、chars、bytes、encoding）"""
+        try:
+            st = self.session.stat(file_path)
+        except FileNotFoundError:
+            writer.error(ErrorCodes.FILE_NOT_FOUND, f"文件不存在: {file_path}", file=file_path)
+            return
+        except OSError as e:
+            writer.error(ErrorCodes.FILE_READ_ERROR, f"无法访问: {file_path}: {e}", file=file_path)
+            return
+        if not stat.S_ISREG(st.st_mode):
+            writer.error(ErrorCodes.FILE_NOT_DIRECTORY, f"不是普通文件: {file_path}", file=file_path)
+            return
+        lines = words = chars = 0
+        info = {}
+        try:
+            for line in self._read_file(file_path, info=info):
+                lines += 1
+                words += len(line.split())
+                chars += len(line)
+        except UnicodeDecodeError:
+            writer.error(ErrorCodes.FILE_READ_ERROR, f"文件编码不支持: {file_path}", file=file_path)
+            return
+        except OSError as e:
+            writer.error(ErrorCodes.FILE_READ_ERROR, f"读取失败: {file_path}: {e}", file=file_path)
+            return
+        writer.add({'file': file_path, 'lines': lines, 'words': words, 'chars': chars,
+                    'bytes': st.st_size, 'encoding': info['encoding']})
+    
+    def history(self, count=None, query=None, limit=None):
+        """显示或检索命令历史（history [N] / history -s 文本 [-n N]）"""
+        history = getattr(self.executor, 'history', None)
+        if history is None:
+            raise_command_error(ErrorCodes.COMMAND_EXECUTION_FAILED, "命令历史未启用", "只有交互式会话会记录命令历史")
+            return 1
+        
+        if count is not None:
+            if not count.isdigit():
+                raise ArgumentError(ErrorCodes.INVALID_ARGUMENT_TYPE, f"无效的条数: {count}", "条数必须是非负整数")
+            limit = int(count)
+        
+        output = _OutputBatch()
+        if query is not None:
+            # 检索结果从新到旧排列
+            matches = history.search(query, limit or 50)
+            for number, line in matches:
+                output.add(f"{number:6}  {line}")
+            output.flush()
+            return 0 if matches else 1
+        
+        entries = history.entries()
+        limit = limit or 20
+        start = max(0, len(entries) - limit)
+        for number in range(start, len(entries)):
+            output.add(f"{number + 1:6}  {entries[number]}")
+        output.flush()
+        return 0
+    
+    def errors(self, code=None, limit=10, clear=False):
+        """查看错误统计和最近的错误记录（errors [--code N] [-n N] [--clear]）"""
+        if clear:
+            error_manager.clear_error_history()
+            print("错误历史已清空")
+            return 0
+        
+        output = _OutputBatch()
+        counts = error_manager.get_code_counts()
+        if code is None:
+            output.add(f"错误总数: {error_manager.get_error_count()}")
+            for error_code, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+                output.add(f"{count:10}  [{error_code}] {error_manager.get_error_name(error_code)}")
+        else:
+            output.add(f"[{code}] {error_manager.get_error_name(code)}: {counts.get(code, 0)} 次")
+        
+        records = error_manager.get_records(code, limit)
+        if records:
+            output.add(f"最近 {len(records)} 条记录:")
+            for record in records:
+                stamp = time.strftime('%H:%M:%S', time.localtime(record.timestamp))
+                output.add(f"  {stamp} {error_manager.format_error_message(record.code, record.message, record.details)}")
+        for sink in error_manager.get_sinks():
+            if hasattr(sink, 'path'):
+                output.add(f"错误日志: {sink.path}（已写入 {sink.written} 条，丢弃 {sink.dropped} 条）")
+        output.flush()
+        # 本命令只用于查看，不因历史中的错误返回失败
+        return 0
+
+    def stats(self, as_json=False, output_file=None, reset=False, toggle=None):
+        """显示每条命令的延迟和吞吐统计（stats [--json [-o 文件]] [--reset] [--on|--off]）"""
+        if reset:
+            metrics.reset()
+            print("统计数据已清空")
+            return 0
+        if toggle is not None:
+            metrics.enabled = toggle == 'on'
+            print("命令统计已" + ("启用" if metrics.enabled else "停用"))
+            return 0
+        
+        if as_json or output_file is not None:
+            data = metrics.to_json(indent=2)
+            if output_file is None:
+                print(data)
+                return 0
+            try:
+                with self.session.open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(data + '\n')
+                print(f"统计数据已写入: {output_file}")
+            except Exception as e:
+                raise_filesystem_error(ErrorCodes.FILE_WRITE_ERROR, f"写入文件失败: {output_file}", str(e))
+                return 1
+            return 0
+        
+        commands = metrics.commands()
+        if not commands:
+            print("暂无统计数据" + ("" if metrics.enabled else "（统计已停用，使用 stats --on 启用）"))
+            return 0
+        output = _OutputBatch()
+        # 中文标题按显示宽度（每字占两列）对齐
+        output.add(f"{'命令':<14}{'次数':>6}{'失败':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'最大':>8}{'CPU合计':>9}{'读取':>9}{'写出':>9}")
+        for m in commands:
+            latency = m.latency
+            output.add(f"{m.name[:14]:<16}{m.count:>8}{m.failures:>8}"
+                       f"{_format_ns(latency.percentile(50)):>10}{_format_ns(latency.percentile(95)):>10}"
+                       f"{_format_ns(latency.percentile(99)):>10}{_format_ns(latency.max):>10}"
+                       f"{_format_ns(m.cpu_ns):>11}{_format_bytes(m.read):>11}{_format_bytes(m.written):>11}")
+        output.flush()
+        return 0
+
+    def _measure(self, line, output=None):
+        """内部工具：执行一行命令并返回 (退出码, 测量结果字典)"""
+        counters = io_counters
+        before = (counters.read, counters.written, counters.child_user_ns,
+                  counters.child_sys_ns)
+        counters.child_maxrss = 0
+        user, system, maxrss = _self_usage()
+        start = time.perf_counter_ns()
+        if output is not None:
+            with redirect_output(output):
+                status = self.executor.execute(line)
+        else:
+            status = self.executor.execute(line)
+        wall = time.perf_counter_ns() - start
+        user_after, system_after, maxrss_after = _self_usage()
+        return status, {
+            'wall': wall,
+            'user': user_after - user,
+            'sys': system_after - system,
+            'child_user': counters.child_user_ns - before[2],
+            'child_sys': counters.child_sys_ns - before[3],
+            'child_maxrss': counters.child_maxrss,
+            'maxrss': maxrss_after,
+            'maxrss_delta': maxrss_after - maxrss,
+            'read': counters.read - before[0],
+            'written': counters.written - before[1],
+        }
+    
+    def time(self, *command, repeat=1, line=None):
+        """统计命令的耗时、CPU、内存和读写量（time [-r N] 命令 [参数...] / time -c "命令行"）"""
+        if line is None:
+            if not command:
+                raise ArgumentError(ErrorCodes.MISSING_ARGUMENT, "请指定要计时的命令", "例如: time grep error log.txt")
+            # 参数已经展开过，重新组成命令行时加引号避免二次展开
+            line = shlex.join(command)
+        
+        if repeat == 1:
+            status, m = self._measure(line)
+            output = _OutputBatch()
+            output.add("")
+            output.add(f"实际时间  {_format_ns(m['wall'])}")
+            output.add(f"用户CPU   {_format_ns(m['user'])}")
+            output.add(f"系统CPU   {_format_ns(m['sys'])}")
+            if m['child_user'] or m['child_sys'] or m['child_maxrss']:
+                output.add(f"子进程    用户 {_format_ns(m['child_user'])}  系统 {_format_ns(m['child_sys'])}  "
+                           f"峰值内存 {_format_bytes(m['child_maxrss'] * 1024)}")
+            if m['maxrss']:
+                output.add(f"峰值内存  +{_format_bytes(m['maxrss_delta'] * 1024)}（当前 {_format_bytes(m['maxrss'] * 1024)}）")
+            output.add(f"读取      {_format_bytes(m['read'])}")
+            output.add(f"写出      {_format_bytes(m['written'])}")
+            output.flush()
+            return status
+        
+        # 重复模式：丢弃命令输出，只汇总测量结果
+        samples = []
+        status = 0
+        try:
+            for _ in range(repeat):
+                status, m = self._measure(line, _DiscardOutput())
+                samples.append(m)
+        except KeyboardInterrupt:
+            print(f"^C 已完成 {len(samples)} 次")
+            if not samples:
+                return 130
+        
+        def summary(key, fmt):
+            values = sorted(sample[key] for sample in samples)
+            median = values[len(values) // 2] if len(values) % 2 else (values[len(values) // 2 - 1] + values[len(values) // 2]) // 2
+            return f"{fmt(values[0]):>12}{fmt(median):>12}{fmt(values[-1]):>12}"
+        
+        output = _OutputBatch()
+        output.add(f"执行 {len(samples)} 次: {line}（最后一次退出码 {status}）")
+        output.add(f"{'':<10}{'最小':>10}{'中位数':>9}{'最大':>10}")
+        output.add(f"{'实际时间':<6}" + summary('wall', _format_ns))
+        output.add(f"{'用户CPU':<7}" + summary('user', _format_ns))
+        output.add(f"{'系统CPU':<7}" + summary('sys', _format_ns))
+        if any(sample['child_user'] or sample['child_sys'] for sample in samples):
+            output.add(f"{'子进程CPU':<5}" + summary('child_user', _format_ns))
+        output.add(f"{'读取':<8}" + summary('read', _format_bytes))
+        output.add(f"{'写出':<8}" + summary('written', _format_bytes))
+        output.flush()
+        return status
+
+    def profile(self, *command, base=None, limit=20, sort='cumulative', sample=False, line=None):
+        """分析命令的性能（profile [-o 文件前缀] [-n N] [-s 排序] [--sample] 命令 [参数...] / profile -c "命令行"）"""
+        if line is None:
+            if not command:
+                raise ArgumentError(ErrorCodes.MISSING_ARGUMENT, "请指定要分析的命令", "例如: profile grep error log.txt")
+            line = shlex.join(command)
+        
+        # 保存结果时同时采样，生成火焰图所需的折叠栈
+        result = profile_call(self.executor.execute, line, sample=sample or base is not None)
+        print(result.report(limit, sort).rstrip('\n'))
+        if result.sampler is not None:
+            print(f"\n采样 {result.sampler.samples} 次（间隔 {result.sampler.interval * 1000:g}ms）")
+        if base is not None:
+            try:
+                paths = result.dump(self.session.resolve(base))
+            except Exception as e:
+                raise_filesystem_error(ErrorCodes.FILE_WRITE_ERROR, f"写入分析结果失败: {base}", str(e))
+                return 1
+            for path in paths:
+                print(f"已写入: {path}")
+        return result.value
+    
+    def _memory_summary(self, name, report):
+        """内部工具：内存跟踪结果的单行摘要"""
+        sign = '+' if report.retained >= 0 else '-'
+        return f"{name}: 峰值 {_format_bytes(report.peak)}，残留 {sign}{_format_bytes(abs(report.retained))}"
+    
+    def _check_memory_limit(self, name, report):
+        """内部工具：残留内存超过上限时报告可能的内存泄漏"""
+        if report.exceeded:
+            raise_memory_error(ErrorCodes.MEMORY_LEAK_DETECTED, f"命令 '{name}' 结束后仍有 {_format_bytes(report.retained)} 内存未释放",
+                               f"上限 {_format_bytes(report.limit)}")
+    
+    def mem(self, *command, sites=10, limit=None, line=None, toggle=None):
+        """跟踪命令的内存分配（mem [-n N] [--limit 大小] 命令 [参数...] / mem -c "命令行" / mem --on|--off）"""
+        if toggle == 'on':
+            memory_tracer.enable(limit)
+            limit_text = _format_bytes(memory_tracer.limit) if memory_tracer.limit is not None else "无"
+            print(f"内存跟踪已启用（残留上限: {limit_text}）")
+            return 0
+        if toggle == 'off':
+            memory_tracer.disable()
+            print("内存跟踪已停用")
+            return 0
+        if line is None:
+            if not command:
+                raise ArgumentError(ErrorCodes.MISSING_ARGUMENT, "请指定要跟踪的命令", "例如: mem grep error big.log")
+            line = shlex.join(command)
+        
+        status, report = memory_tracer.trace(self.executor.execute, line, sites=sites, limit=limit)
+        if report is None:
+            print("已有命令正在进行内存跟踪，本次未跟踪")
+            return status
+        output = _OutputBatch()
+        output.add("")
+        output.add(self._memory_summary(line, report))
+        if report.sites:
+            output.add("残留内存最多的分配位置:")
+            for site in report.sites:
+                frame = site.traceback[0]
+                output.add(f"  {_format_bytes(site.size_diff):>8}  {site.count_diff:>7} 块  "
+                           f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        output.flush()
+        self._check_memory_limit(line, report)
+        return status
+    
+    def plugins(self):
+        """列出已发现的插件及其加载状态"""
+        manager = self.executor.plugins
+        manager.discover()
+        output = _OutputBatch()
+        if manager.problems:
+            output.add("发现插件时的问题:")
+            for record in manager.problems:
+                output.add(f"  {error_manager.format_error_message(record.code, record.message, record.details)}")
+        if not manager.plugins:
+            output.add("没有发现插件（插件目录: " + os.pathsep.join(manager.directories or default_plugin_dirs()) + "）")
+            output.flush()
+            return 0
+        states = {'available': '未加载', 'loaded': '已加载', 'failed': '加载失败'}
+        for plugin in manager.plugins:
+            source = plugin.path if plugin.source == 'dir' else f"entry point {plugin.module_name}"
+            output.add(f"{plugin.name} {plugin.version}  [{states[plugin.state]}]  {source}")
+            commands = [cmd for cmd, config in manager.commands.items() if config['plugin'] is plugin]
+            output.add(f"  命令: {', '.join(commands)}")
+            if plugin.error is not None:
+                output.add(f"  错误: {error_manager.format_error_message(plugin.error.code, plugin.error.message, plugin.error.details)}")
+        output.flush()
+        return 0
+    
+    def alias(self, *definitions, delete=False):
+        """定义、显示或删除别名（alias 名称='命令'），定义保存在 rc 文件中"""
+        table = self.executor.definitions
+        if not definitions:
+            output = _OutputBatch()
+            for definition in table.items(ALIAS):
+                output.add(definition.source())
+            output.flush()
+            return 0
+        status = 0
+        for item in definitions:
+            name, sep, text = item.partition('=')
+            if delete:
+                if not table.remove(ALIAS, item):
+                    raise_command_error(ErrorCodes.COMMAND_NOT_FOUND, f"别名不存在: {item}")
+                    status = 1
+            elif sep:
+                if not text.strip():
+                    raise_argument_error(ErrorCodes.MISSING_ARGUMENT, f"别名 {name} 的定义为空", "例如: alias ll='ls -l'")
+                    return self.executor.STATUS_USAGE_ERROR
+                try:
+                    table.define(ALIAS, name, text)
+                except PythonCMDError as e:
+                    error_manager.log_error(e.code, e.message, e.details)
+                    print(error_manager.format_error_message(e.code, e.message, e.details), file=error_output())
+                    status = 1
+            else:
+                definition = table.get(item)
+                if definition is None or definition.kind != ALIAS:
+                    raise_command_error(ErrorCodes.COMMAND_NOT_FOUND, f"别名不存在: {item}")
+                    status = 1
+                else:
+                    print(definition.source())
+        return status
+    
+    def function(self, name=None, *body, delete=False):
+        """定义、显示或删除函数（function 名称 '命令; 命令 $1'），定义保存在 rc 文件中"""
+        table = self.executor.definitions
+        if name is None:
+            output = _OutputBatch()
+            for definition in table.items(FUNCTION):
+                output.add(definition.source())
+            output.flush()
+            return 0
+        if delete:
+            status = 0
+            for item in (name,) + body:
+                if not table.remove(FUNCTION, item):
+                    raise_command_error(ErrorCodes.COMMAND_NOT_FOUND, f"函数不存在: {item}")
+                    status = 1
+            return status
+        if not body:
+            definition = table.get(name)
+            if definition is None or definition.kind != FUNCTION:
+                raise_command_error(ErrorCodes.COMMAND_NOT_FOUND, f"函数不存在: {name}")
+                return 1
+            print(definition.source())
+            return 0
+        try:
+            table.define(FUNCTION, name, ' '.join(body))
+        except PythonCMDError as e:
+            error_manager.log_error(e.code, e.message, e.details)
+            print(error_manager.format_error_message(e.code, e.message, e.details), file=error_output())
+            return 1
+        return 0
+    
+    def true(self):
+        """什么也不做，退出码为 0（用于 while true 等条件）"""
+        return 0
+    
+    def false(self):
+        """什么也不做，退出码为 1"""
+        return 1
+    
+    def unset(self, *names):
+        """删除会话变量"""
+        variables = self.session.variables
+        for name in names:
+            variables.pop(name, None)
+        return 0
+    
+    def source(self, file):
+        """
+        逐行执行脚本文件中的命令（空行和 # 开头的注释行被忽略）
+        未结束的 for/if/while 和命令替换与后续行合并后再执行
+        """
+        try:
+            with self.session.open(file, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            raise_filesystem_error(ErrorCodes.FILE_NOT_FOUND, f"找不到脚本文件: {file}")
+            return 1
+        except IsADirectoryError:
+            raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"不能执行目录: {file}")
+            return 1
+        except (OSError, UnicodeDecodeError) as e:
+            raise_filesystem_error(ErrorCodes.FILE_READ_ERROR, f"读取脚本失败: {file}", str(e))
+            return 1
+        
+        status = 0
+        pending = []
+        for line in lines:
+            if not pending and (not line.strip() or line.lstrip().startswith('#')):
+                continue
+            pending.append(line)
+            text = '\n'.join(pending)
+            if is_incomplete(text):
+                continue
+            pending = []
+            status = self.executor.execute(text)
+        if pending:
+            # 文件结束时仍未完整，执行后报告语法错误
+            status = self.executor.execute('\n'.join(pending))
+        return status
 
 class CommandExecutor:
     """命令执行器"""
     
-    def __init__(self, json_filename='Commands.json'):
+    def __init__(self, json_filename='Commands.json', session=None):
+        """
+        :param session: 默认会话，未指定时以进程当前目录和环境变量创建
+        """
         # 获取当前脚本所在的目录
         current_dir = os.path.dirname(os.path.abspath(__file__))
         
@@ -992,11 +1968,47 @@ class CommandExecutor:
             error_msg = f"配置文件格式错误: {json_path}"
             raise_config_error(ErrorCodes.CONFIG_FILE_INVALID, error_msg, str(e))
         
+        # 为使用类型化参数描述的命令预编译选项解析器
+        for cmd in self.commands_config:
+            try:
+                cmd['_parser'] = compile_parser(cmd['cmd'], cmd.get('para'))
+            except (KeyError, TypeError, ValueError) as e:
+                raise_config_error(ErrorCodes.CONFIG_FILE_INVALID, f"命令 '{cmd['cmd']}' 的参数描述无效", str(e))
+                cmd['_parser'] = None
+        
         # 创建命令映射
         self.command_map = {cmd['cmd']: cmd for cmd in self.commands_config}
         
         # 命令实例（传递self引用）
         self.commands_instance = Commands(self)
+        
+        # 后台任务表
+        self.jobs = JobManager(self)
+        
+        # 插件命令：第一次查找未知命令时读取清单，第一次执行时导入模块
+        self.plugins = PluginManager(self)
+        
+        # 别名和函数：rc 文件在第一次查找命令时读取，定义在第一次调用时编译
+        self.definitions = DefinitionTable(compile=lambda definition: compile_definition(self, definition))
+        
+        # 编译后的命令行（LRU）和内置命令的调用函数
+        self._compiled = CompileCache()
+        self._invokers = {}
+        
+        # 默认会话：线程未绑定会话时（交互式主循环）使用
+        self.session = session or Session()
+        
+        # 命令历史（仅交互式会话启用，见 PythonCMD）
+        self.history = None
+        
+        # 通过输出代理统计每条命令写出的字节数
+        install_output()
+        
+        # 最近一条命令的退出码
+        self.last_status = 0
+
+        # 是否运行在守护进程中（影响 exit 等命令的行为）
+        self.embedded = False
     
     def find_similar_commands(self, input_cmd):
         """查找相似的命令"""
@@ -1006,41 +2018,12 @@ class CommandExecutor:
         # 获取所有可用命令
         available_commands = list(self.command_map.keys())
         
-        # 添加PATH中的可执行文件
-        path_dirs = os.environ.get('PATH', '').split(os.pathsep)
-        path_executables = []
-        common_exe_extensions = ['.exe', '.com', '.bat', '.cmd', '.vbs', '.js', '.ps1']
+        # 添加PATH中的可执行文件（来自补全索引，只重新扫描内容有变化的目录）
+        command_index.refresh(self.commands_instance.session.getenv('PATH', ''))
+        path_executables = [name for name in command_index.executables() if len(name) > 2]  # 排除单字符和双字符文件
         
-        for directory in path_dirs:
-            directory = directory.strip('"')
-            if directory and os.path.exists(directory):
-                try:
-                    for item in os.listdir(directory):
-                        # 更严格的可执行文件判断
-                        if (not item.startswith('.') and
-                            len(item) > 2 and  # 排除单字符和双字符文件
-                            os.path.isfile(os.path.join(directory, item))):  # 确保是普通文件
-                            
-                            # 检查扩展名或没有扩展名（可能是可执行文件）
-                            has_exe_extension = any(item.lower().endswith(ext) for ext in common_exe_extensions)
-                            has_no_extension = '.' not in item
-                            
-                            if has_exe_extension or has_no_extension:
-                                # 移除扩展名，只保留基本名称用于匹配
-                                base_name = item
-                                if has_exe_extension:
-                                    for ext in common_exe_extensions:
-                                        if item.lower().endswith(ext):
-                                            base_name = item[:-len(ext)]
-                                            break
-                                path_executables.append(base_name)
-                except (OSError, PermissionError):
-                    continue
-        
-        # 去重
-        path_executables = list(set(path_executables))
-        
-        all_commands = available_commands + path_executables
+        # 去重（内置命令可能与PATH中的程序同名）
+        all_commands = sorted(set(available_commands).union(path_executables))
         
         # 计算编辑距离（Levenshtein距离）
         def levenshtein_distance(s1, s2):
@@ -1065,6 +2048,9 @@ class CommandExecutor:
         # 计算相似度并排序
         similar_commands = []
         for cmd in all_commands:
+            # 长度相差超过2时编辑距离必然大于2，跳过计算
+            if abs(len(cmd) - len(input_cmd)) > 2:
+                continue
             distance = levenshtein_distance(input_cmd.lower(), cmd.lower())
             if distance <= 2:  # 编辑距离小于等于2
                 similar_commands.append((cmd, distance))
@@ -1076,17 +2062,21 @@ class CommandExecutor:
         return [cmd for cmd, distance in similar_commands[:3]]
     
     def parse_arguments(self, param_config, input_params):
-        """智能参数解析器"""
+        """
+        智能参数解析器
+        :param input_params: 参数字符串，或已展开的参数序列/迭代器
+        """
         if not param_config:
             return []
         
-        if input_params.strip():
-            params = shlex.split(input_params)
-        else:
-            params = []
+        if isinstance(input_params, str):
+            input_params = expand_arguments(input_params, self.commands_instance.session.cwd)
         
         if param_config == '*argv':
-            return params
+            # 惰性展开参数流，避免为超大展开结果构建中间列表
+            return input_params
+        
+        params = list(input_params)
         
         if isinstance(param_config, list):
             # 处理可选参数（中括号格式）
@@ -1114,172 +2104,350 @@ class CommandExecutor:
             raise ValueError("需要参数")
         return params[:1]
     
+    # 退出码约定（与常见shell一致）
+    STATUS_USAGE_ERROR = 2
+    STATUS_NOT_FOUND = 127
+    
     def execute(self, input_str):
-        """执行命令"""
+        """
+        执行一行命令，支持 ; && || 、末尾的 &、变量和 for/if/while
+        命令行编译后缓存，重复执行同一行时不再解析
+        :return: 最后一条执行的命令的退出码
+        """
         if not input_str.strip():
-            return
-        
-        # 处理命令链（&&语法）
-        if '&&' in input_str:
-            commands = input_str.split('&&')
-            for cmd in commands:
-                cmd = cmd.strip()
-                if cmd:
-                    self.execute(cmd)
-            return
+            return 0
         
-        parts = input_str.split(maxsplit=1)
-        cmd_name = parts[0]
-        params_str = parts[1] if len(parts) > 1 else ""
-        
-        if cmd_name not in self.command_map:
-            # 如果命令不在配置中，尝试作为可执行文件运行
-            # 首先检查是否使用了相对路径前缀
-            is_relative_path = cmd_name.startswith('./') or cmd_name.startswith('.\\')
-            
-            # 检查当前目录是否存在该文件（用于提供友好提示）
-            import os
-            import platform
-            
-            # 定义支持的可执行文件扩展名
-            executable_extensions = ['.exe', '.com', '.bat', '.cmd']
-            python_extensions = ['.py', '.pyw']
-            if platform.system() != 'Windows':
-                executable_extensions.append('')
-            
-            def check_current_directory(file_name):
-                """检查当前目录是否存在该文件"""
-                # 尝试直接查找
-                if os.path.exists(file_name) and os.path.isfile(file_name):
-                    return True
-                
-                # 如果没有扩展名，尝试添加可能的扩展名
-                if platform.system() == 'Windows':
-                    all_extensions = executable_extensions + python_extensions
-                    if not any(file_name.lower().endswith(ext) for ext in all_extensions):
-                        for ext in all_extensions:
-                            test_path = file_name + ext
-                            if os.path.exists(test_path) and os.path.isfile(test_path):
-                                return True
-                return False
-            
-            file_exists_in_current_dir = check_current_directory(cmd_name)
-            
+        runner = self._compiled.get(input_str)
+        if runner is None:
             try:
-                # 使用shlex分割参数字符串，支持引号内的空格
-                run_args = shlex.split(params_str) if params_str else []
-                self.commands_instance.run(cmd_name, *run_args)
-                return
+                runner = Compiler(self).compile(parse(input_str))
+            except ValueError as e:
+                # 引号未闭合等分词错误
+                error_manager.log_error(ErrorCodes.COMMAND_SYNTAX_ERROR, "语法错误", str(e))
+                print(error_manager.format_error_message(ErrorCodes.COMMAND_SYNTAX_ERROR, "语法错误", str(e)), file=error_output())
+                return self.STATUS_USAGE_ERROR
             except PythonCMDError as e:
-                # 根据是否使用相对路径前缀来决定错误信息
-                if is_relative_path:
-                    # 使用了相对路径前缀，显示文件相关的错误信息
-                    # 这里保持run方法中已经显示的错误信息，不再重复显示
-                    pass
-                else:
-                    # 没有使用相对路径前缀，显示命令不存在的错误
-                    error_manager.log_error(ErrorCodes.COMMAND_NOT_FOUND, f"未知命令: {cmd_name}")
-                    error_msg = error_manager.format_error_message(
-                        ErrorCodes.COMMAND_NOT_FOUND,
-                        f"未知命令: {cmd_name}",
-                        f"请使用 'help' 命令查看可用命令列表"
-                    )
-                    print(error_msg)
-                    
-                    # 查找相似的命令
-                    similar_commands = self.find_similar_commands(cmd_name)
-                    if similar_commands:
-                        if len(similar_commands) == 1:
-                            print(f"是不是指: {similar_commands[0]}")
-                        else:
-                            suggestions = " | ".join(similar_commands)
-                            print(f"是不是指: {suggestions}")
-                    
-                    # 如果文件存在于当前目录，提供额外的提示
-                    if file_exists_in_current_dir:
-                        print(f"提示: 当前目录存在文件 '{cmd_name}'，请使用 './{cmd_name}' 或 '.\\{cmd_name}' 来执行")
-                return
-            except Exception as e:
-                # 其他错误，根据是否使用相对路径前缀来决定错误信息
-                if is_relative_path:
-                    # 使用了相对路径前缀，显示系统错误
-                    error_manager.log_error(ErrorCodes.COMMAND_EXECUTION_FAILED, f"执行失败: {cmd_name}", str(e))
-                    formatted_msg = error_manager.format_error_message(
-                        ErrorCodes.COMMAND_EXECUTION_FAILED,
-                        f"执行失败: {cmd_name}",
-                        str(e)
-                    )
-                    print(formatted_msg)
-                else:
-                    # 没有使用相对路径前缀，显示命令不存在的错误
-                    error_manager.log_error(ErrorCodes.COMMAND_NOT_FOUND, f"未知命令: {cmd_name}")
-                    error_msg = error_manager.format_error_message(
-                        ErrorCodes.COMMAND_NOT_FOUND,
-                        f"未知命令: {cmd_name}",
-                        f"请使用 'help' 命令查看可用命令列表"
-                    )
-                    print(error_msg)
-                    
-                    # 如果文件存在于当前目录，提供额外的提示
-                    if file_exists_in_current_dir:
-                        print(f"提示: 当前目录存在文件 '{cmd_name}'，请使用 './{cmd_name}' 或 '.\\{cmd_name}' 来执行")
-                return
-        
-        config = self.command_map[cmd_name]
-        
-        # 提取方法名
-        func_str = config.get('func', '')
-        method_name = re.match(r'(\w+)', func_str).group(1)
+                error_manager.log_error(e.code, e.message, e.details)
+                print(error_manager.format_error_message(e.code, e.message, e.details), file=error_output())
+                return self.STATUS_USAGE_ERROR
+            self._compiled.put(input_str, runner)
         
-        # 获取方法
-        method = getattr(self.commands_instance, method_name, None)
-        if not method or not callable(method):
-            error_msg = f"方法 {method_name} 未实现"
-            details = f"命令 '{cmd_name}' 对应的执行方法不存在"
-            raise_command_error(ErrorCodes.COMMAND_NOT_IMPLEMENTED, error_msg, details)
+        status = runner(TOP_FRAME)
+        self.last_status = status
+        return status
+    
+    def run_line(self, line, output=None, session=None, capture_errors=False):
+        """
+        执行一行命令并返回结构化结果（供在其他程序中嵌入使用）
+        :param output: 输出端（需提供 write），为 None 时捕获输出到 result.output
+        :param session: 执行使用的会话，默认为当前线程的会话
+        :param capture_errors: 错误信息单独捕获到 result.error_output，不写入输出端
+                               （捕获输出时总是单独捕获）
+        :return: CommandResult
+        """
+        buffer = io.StringIO() if output is None else None
+        error_buffer = io.StringIO() if output is None or capture_errors else None
+        session = session or self.commands_instance.session
+        start = time.perf_counter()
+        with error_manager.collect_errors() as errors, session_context(session), \
+                redirect_output(buffer if buffer is not None else output), redirect_errors(error_buffer):
+            try:
+                status = self.execute(line)
+            except SystemExit as e:
+                # 嵌入模式下 exit 命令只结束本次执行
+                status = e.code if isinstance(e.code, int) else 0
+        return CommandResult(line, status if isinstance(status, int) else 0,
+                             buffer.getvalue() if buffer is not None else None,
+                             errors, time.perf_counter() - start,
+                             error_buffer.getvalue() if error_buffer is not None else None)
+    
+    def stream_line(self, line, session=None):
+        """
+        在后台线程中执行一行命令，迭代返回值可逐块得到输出（错误信息在 stream.result.error_output 中）
+        用法: stream = executor.stream_line("cat big.log"); for chunk in stream: ...; stream.result
+        """
+        session = session or self.commands_instance.session
+        return CommandStream(lambda output: self.run_line(line, output, session, capture_errors=True))
+    
+    def run_tree(self, tree):
+        """编译并执行语法树，返回最后一条命令的退出码"""
+        status = Compiler(self).compile(tree)(TOP_FRAME)
+        self.last_status = status
+        return status
+    
+    def run_command(self, cmd_name, args=()):
+        """执行一条已展开的命令：别名和函数优先，其次为内置命令和外部程序"""
+        definition = self.definitions.lookup(cmd_name)
+        if definition is not None:
+            return self.call_definition(definition, args)
+        return self.run_resolved(cmd_name, self.resolve(cmd_name), args)
+    
+    def run_resolved(self, cmd_name, invoke, args):
+        """通过已查找到的调用函数执行命令（编译后的命令缓存调用函数，不再按名称查找）"""
+        if memory_tracer.enabled and cmd_name != 'mem':
+            # 会话级内存跟踪（--trace-memory）：只记录数值，不对比快照
+            status, report = memory_tracer.trace(self._measured, cmd_name, invoke, args)
+            if report is not None:
+                print(f"[内存] {self.commands_instance._memory_summary(cmd_name, report)}")
+                self.commands_instance._check_memory_limit(cmd_name, report)
+            return status
+        return self._measured(cmd_name, invoke, args)
+    
+    def call_definition(self, definition, args):
+        """调用别名或函数：以参数建立调用帧，执行预编译的闭包"""
+        table = self.definitions
+        try:
+            runner = table.runner(definition)
+            table.enter(definition)
+        except PythonCMDError as e:
+            error_manager.log_error(e.code, e.message, e.details)
+            print(error_manager.format_error_message(e.code, e.message, e.details), file=error_output())
+            return 1
+        try:
+            return runner(Frame(definition.name, tuple(args)))
+        finally:
+            table.leave()
+    
+    def dispatch(self, cmd_name, args=()):
+        """
+        分派单条命令：内置命令直接调用，其余作为外部程序运行
+        同时记录墙钟时间、CPU时间、读写字节数和执行结果（见 stats 命令）
+        :param args: 已展开的参数（可以是惰性迭代器）
+        :return: 退出码
+        """
+        return self._measured(cmd_name, self.resolve(cmd_name), args)
+    
+    def _measured(self, cmd_name, invoke, args):
+        """执行命令并记录指标"""
+        if not metrics.enabled:
+            return invoke(args)
+        
+        counters = io_counters
+        read, written, child_cpu = counters.read, counters.written, counters.child_cpu_ns
+        cpu_start = time.thread_time_ns()
+        start = time.perf_counter_ns()
+        status = 1
+        try:
+            status = invoke(args)
+            return status
+        finally:
+            wall = time.perf_counter_ns() - start
+            cpu = time.thread_time_ns() - cpu_start + counters.child_cpu_ns - child_cpu
+            metrics.record(cmd_name, wall, cpu, counters.read - read,
+                           counters.written - written, status != 0)
+    
+    def resolve(self, cmd_name):
+        """
+        查找命令的调用函数 invoke(args) -> 退出码
+        内置命令和插件命令的调用函数在第一次查找时创建并缓存，未知命令作为外部程序运行
+        """
+        invoke = self._invokers.get(cmd_name)
+        if invoke is not None:
+            return invoke
+        if cmd_name not in self.command_map:
+            self.plugins.discover()
+        if cmd_name not in self.command_map:
+            return lambda args: self._run_external(cmd_name, args)
+        invoke = self._make_invoker(self.command_map[cmd_name])
+        self._invokers[cmd_name] = invoke
+        return invoke
+    
+    def _run_external(self, cmd_name, args):
+        """把不是内置命令的名称作为可执行文件运行"""
+        # 如果命令不在配置中，尝试作为可执行文件运行
+        # 首先检查是否使用了相对路径前缀
+        is_relative_path = cmd_name.startswith('./') or cmd_name.startswith('.\\')
+
+        # 检查当前目录是否存在该文件（用于提供友好提示）
+        import os
+        import platform
+
+        # 定义支持的可执行文件扩展名
+        executable_extensions = ['.exe', '.com', '.bat', '.cmd']
+        python_extensions = ['.py', '.pyw']
+        if platform.system() != 'Windows':
+            executable_extensions.append('')
+
+        session = self.commands_instance.session
+
+        def check_current_directory(file_name):
+            """检查当前目录是否存在该文件"""
+            file_name = session.resolve(file_name)
+            # 尝试直接查找
+            if os.path.exists(file_name) and os.path.isfile(file_name):
+                return True
+
+            # 如果没有扩展名，尝试添加可能的扩展名
+            if platform.system() == 'Windows':
+                all_extensions = executable_extensions + python_extensions
+                if not any(file_name.lower().endswith(ext) for ext in all_extensions):
+                    for ext in all_extensions:
+                        test_path = file_name + ext
+                        if os.path.exists(test_path) and os.path.isfile(test_path):
+                            return True
+            return False
+
+        file_exists_in_current_dir = check_current_directory(cmd_name)
+
+        try:
+            status = self.commands_instance.run(cmd_name, *args)
+            return status if isinstance(status, int) else 1
+        except PythonCMDError as e:
+            # 根据是否使用相对路径前缀来决定错误信息
+            if is_relative_path:
+                # 使用了相对路径前缀，显示文件相关的错误信息
+                # 这里保持run方法中已经显示的错误信息，不再重复显示
+                pass
+            else:
+                # 没有使用相对路径前缀，显示命令不存在的错误
+                error_manager.log_error(ErrorCodes.COMMAND_NOT_FOUND, f"未知命令: {cmd_name}")
+                error_msg = error_manager.format_error_message(
+                    ErrorCodes.COMMAND_NOT_FOUND,
+                    f"未知命令: {cmd_name}",
+                    f"请使用 'help' 命令查看可用命令列表"
+                )
+                print(error_msg, file=error_output())
+
+                # 查找相似的命令
+                similar_commands = self.find_similar_commands(cmd_name)
+                if similar_commands:
+                    if len(similar_commands) == 1:
+                        print(f"是不是指: {similar_commands[0]}", file=error_output())
+                    else:
+                        suggestions = " | ".join(similar_commands)
+                        print(f"是不是指: {suggestions}", file=error_output())
+
+                # 如果文件存在于当前目录，提供额外的提示
+                if file_exists_in_current_dir:
+                    print(f"提示: 当前目录存在文件 '{cmd_name}'，请使用 './{cmd_name}' 或 '.\\{cmd_name}' 来执行", file=error_output())
+            return self.STATUS_NOT_FOUND
+        except Exception as e:
+            # 其他错误，根据是否使用相对路径前缀来决定错误信息
+            if is_relative_path:
+                # 使用了相对路径前缀，显示系统错误
+                error_manager.log_error(ErrorCodes.COMMAND_EXECUTION_FAILED, f"执行失败: {cmd_name}", str(e))
+                formatted_msg = error_manager.format_error_message(
+                    ErrorCodes.COMMAND_EXECUTION_FAILED,
+                    f"执行失败: {cmd_name}",
+                    str(e)
+                )
+                print(formatted_msg, file=error_output())
+            else:
+                # 没有使用相对路径前缀，显示命令不存在的错误
+                error_manager.log_error(ErrorCodes.COMMAND_NOT_FOUND, f"未知命令: {cmd_name}")
+                error_msg = error_manager.format_error_message(
+                    ErrorCodes.COMMAND_NOT_FOUND,
+                    f"未知命令: {cmd_name}",
+                    f"请使用 'help' 命令查看可用命令列表"
+                )
+                print(error_msg, file=error_output())
+
+                # 如果文件存在于当前目录，提供额外的提示
+                if file_exists_in_current_dir:
+                    print(f"提示: 当前目录存在文件 '{cmd_name}'，请使用 './{cmd_name}' 或 '.\\{cmd_name}' 来执行", file=error_output())
+            return self.STATUS_NOT_FOUND
+    
+    def _make_invoker(self, config):
+        """为内置命令或插件命令创建调用函数：方法和参数解析器只查找一次"""
+        cmd_name = config['cmd']
+        plugin = config.get('plugin')
+        method = None
+        if plugin is None:
+            # 提取方法名
+            func_str = config.get('func', '')
+            method_name = re.match(r'(\w+)', func_str).group(1)
+            
+            # 获取方法
+            method = getattr(self.commands_instance, method_name, None)
+            if not method or not callable(method):
+                def not_implemented(args):
+                    error_msg = f"方法 {method_name} 未实现"
+                    details = f"命令 '{cmd_name}' 对应的执行方法不存在"
+                    raise_command_error(ErrorCodes.COMMAND_NOT_IMPLEMENTED, error_msg, details)
+                    return self.STATUS_NOT_FOUND
+                return not_implemented
         
         # 解析参数配置
         param_config = config.get('para', '')
-        
-        try:
-            # 解析参数
-            args = self.parse_arguments(param_config, params_str)
+        parser = config.get('_parser')
+        
+        def invoke(args):
+            target = method
+            if target is None:
+                # 插件命令：第一次执行时导入插件模块，失败时已报告 PLUGIN_* 错误
+                target = plugin.resolve(config, self)
+                if target is None:
+                    return 1
+            errors_before = error_manager.get_thread_error_count()
             
-            # 动态调用方法
-            method(*args)
+            try:
+                if parser is not None:
+                    # 预编译的解析器：选项转换为带类型的关键字参数
+                    positional, options = parser.parse(args)
+                    if positional is None:
+                        self._show_help(config)
+                        return 0
+                    result = target(*positional, **options)
+                else:
+                    # 解析参数
+                    args = self.parse_arguments(param_config, args)
+                
+                    # 动态调用方法
+                    result = target(*args)
             
-        except ValueError as e:
-            error_msg = "参数解析错误"
-            details = str(e)
-            error_manager.log_error(ErrorCodes.INVALID_ARGUMENT_FORMAT, error_msg, details)
-            formatted_msg = error_manager.format_error_message(
-                ErrorCodes.INVALID_ARGUMENT_FORMAT,
-                error_msg,
-                details
-            )
-            print(formatted_msg)
-            self._show_usage(config)
-        except PythonCMDError as e:
-            # 捕获并显示错误，不抛出
-            error_manager.log_error(e.code, e.message, e.details)
-            formatted_msg = error_manager.format_error_message(e.code, e.message, e.details)
-            print(formatted_msg)
-        except Exception as e:
-            error_msg = "命令执行失败"
-            details = f"执行命令 '{cmd_name}' 时发生未知错误"
-            error_manager.log_error(ErrorCodes.COMMAND_EXECUTION_FAILED, error_msg, details)
-            formatted_msg = error_manager.format_error_message(
-                ErrorCodes.COMMAND_EXECUTION_FAILED,
-                error_msg,
-                details
-            )
-            print(formatted_msg)
+            except ArgumentError as e:
+                error_manager.log_error(e.code, e.message, e.details)
+                print(error_manager.format_error_message(e.code, e.message, e.details), file=error_output())
+                self._show_usage(config)
+                return self.STATUS_USAGE_ERROR
+            except ValueError as e:
+                error_msg = "参数解析错误"
+                details = str(e)
+                error_manager.log_error(ErrorCodes.INVALID_ARGUMENT_FORMAT, error_msg, details)
+                formatted_msg = error_manager.format_error_message(
+                    ErrorCodes.INVALID_ARGUMENT_FORMAT,
+                    error_msg,
+                    details
+                )
+                print(formatted_msg, file=error_output())
+                self._show_usage(config)
+                return self.STATUS_USAGE_ERROR
+            except PythonCMDError as e:
+                # 捕获并显示错误，不抛出
+                error_manager.log_error(e.code, e.message, e.details)
+                formatted_msg = error_manager.format_error_message(e.code, e.message, e.details)
+                print(formatted_msg, file=error_output())
+                return 1
+            except Exception as e:
+                error_msg = "命令执行失败"
+                details = f"执行命令 '{cmd_name}' 时发生未知错误"
+                error_manager.log_error(ErrorCodes.COMMAND_EXECUTION_FAILED, error_msg, details)
+                formatted_msg = error_manager.format_error_message(
+                    ErrorCodes.COMMAND_EXECUTION_FAILED,
+                    error_msg,
+                    details
+                )
+                print(formatted_msg, file=error_output())
+                return 1
+        
+            # 内置命令显式返回的退出码优先，否则根据执行期间是否报告了错误判断
+            if isinstance(result, int) and not isinstance(result, bool):
+                return result
+            return 1 if error_manager.get_thread_error_count() > errors_before else 0
+        
+        return invoke
     
     def _show_usage(self, config):
         """显示命令用法"""
         cmd = config['cmd']
         params = config.get('para', '')
         
+        parser = config.get('_parser')
+        if parser is not None:
+            print(f"INFO: 用法: {parser.usage()}", file=error_output())
+            print(f"INFO: 使用 '{cmd} --help' 查看选项说明", file=error_output())
+            return
+        
         if isinstance(params, list):
             params_list = []
             for p in params:
@@ -1302,4 +2470,14 @@ class CommandExecutor:
         else:
             params_str = ''
         
-        print(f"INFO: 用法: {cmd} {params_str}")
\ No newline at end of file
+        print(f"INFO: 用法: {cmd} {params_str}", file=error_output())
+    
+    def _show_help(self, config):
+        """显示命令的用法和选项说明（--help）"""
+        parser = config['_parser']
+        print(f"用法: {parser.usage()}")
+        print(config.get('info', ''))
+        print()
+        print("选项:")
+        for line in parser.help_lines():
+            print(line)
@@ -0,0 +1,502 @@
+"""
+编译器 - 把语法树编译为可直接执行的闭包
+每个节点在编译时确定执行方式，执行时不再分词、解析或遍历语法树：
+    简单命令    单词预先拆分为字面量和引用；命令名是字面量时，第一次执行
+                后缓存解析到的内置命令调用函数（或别名、函数），之后只在
+                别名和函数表变化时重新查找
+    NAME=value  全部单词都是赋值时设置会话的 shell 变量
+    for/while/if  循环体和条件只编译一次，每次迭代直接调用
+引用（不在单引号内，且未被反斜杠转义）：
+    $NAME ${NAME}   shell 变量，不存在时取环境变量，都不存在时为空
+    $?              最近一条命令的退出码
+    $(命令)         命令替换：捕获内置命令和外部程序的输出，去掉末尾换行；
+                    单独构成一个单词时按行拆分为多个单词（每行一个）
+    $0 $1..$9 ${N} $@ $* $#   别名和函数的参数（见 Definitions 模块）
+替换进来的值按字面量处理，不会再次进行花括号和通配符展开，也不按空白拆分。
+"""
+
+import io
+import threading
+from collections import OrderedDict
+
+from .Parser import (LITERAL, PARSE_CACHE_SIZE, ForCommand, IfCommand, SimpleCommand, WhileCommand,
+                     literal, parse, substitution_end, valid_name)
+from .Expansion import expand_words, has_magic, unescape
+from ..BasicManager.ErrorManager import error_manager
+from ..BasicManager.OutputManager import capture_output
+
+# 引用的种类
+_VAR = 'var'
+_ARG = 'arg'
+_ALL = 'all'
+_COUNT = 'count'
+_STATUS = 'status'
+_SUBST = 'subst'
+
+_NAME_START = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+_NAME_CHARS = _NAME_START | frozenset('0123456789')
+_DIGITS = frozenset('0123456789')
+
+
+class Frame:
+    """调用帧：别名或函数的名称和参数（$0、$1...）"""
+
+    __slots__ = ('name', 'args')
+
+    def __init__(self, name, args=()):
+        self.name = name
+        self.args = args
+
+
+# 顶层命令行的调用帧（没有参数）
+TOP_FRAME = Frame('pcnext')
+
+
+def _plain(word):
+    """去除 _Word 字面量片段中的标记（替换结果不再展开时）"""
+    return _Word(tuple(unescape(part) if part.__class__ is str else part for part in word.parts), word.split)
+
+
+def _is_assignment(word):
+    name, sep, _ = word.partition('=')
+    return bool(sep) and valid_name(name)
+
+
+class _Word:
+    """包含引用的单词：字面量片段和引用组成的模板"""
+
+    __slots__ = ('parts', 'split')
+
+    def __init__(self, parts, split):
+        self.parts = parts
+        # 单词只由 $@ 或 $(...) 构成时展开为多个单词
+        self.split = split
+
+
+class Compiler:
+    """把语法树编译为闭包，闭包的参数为 Frame，返回退出码"""
+
+    def __init__(self, executor, append_args=False):
+        """
+        :param append_args: 把调用参数追加到最后一条命令之后（不含参数引用的别名）
+        """
+        self.executor = executor
+        self.append_args = append_args
+        # 编译过程中是否遇到参数引用（$1、$@ 等）
+        self.positional = False
+
+    def compile(self, tree):
+        """编译 Sequence，返回 run(frame) -> 退出码"""
+        return self._sequence(tree, self.append_args)
+
+    # ------------------------------------------------------------ 命令列表
+
+    def _sequence(self, tree, append=False):
+        executor = self.executor
+        commands = executor.commands_instance
+        last = len(tree.items) - 1
+        items = tuple((item.background, self._and_or(item.command, append and index == last), item.command.text)
+                      for index, item in enumerate(tree.items))
+
+        if len(items) == 1 and not items[0][0]:
+            runner = items[0][1]
+
+            def run_single(frame):
+                status = runner(frame)
+                commands.session.status = status
+                return status
+            return run_single
+
+        def run(frame):
+            status = 0
+            for background, runner, text in items:
+                if background:
+                    # 后台任务使用会话副本，任务内的 cd 不影响前台
+                    session = commands.session.fork()
+                    job = executor.jobs.start(text, session, run=lambda runner=runner: runner(frame))
+                    print(f"[{job.id}] {text}")
+                    status = 0
+                else:
+                    status = runner(frame)
+                commands.session.status = status
+            return status
+        return run
+
+    def _and_or(self, node, append=False):
+        last = len(node.commands) - 1
+        runners = [self._command(command, append and index == last) for index, command in enumerate(node.commands)]
+        first = runners[0]
+        if len(runners) == 1:
+            return first
+        pairs = tuple(zip(node.operators, runners[1:]))
+        commands = self.executor.commands_instance
+
+        def run(frame):
+            status = first(frame)
+            for operator, runner in pairs:
+                # && 在成功时继续，|| 在失败时继续
+                if (operator == '&&') == (status == 0):
+                    commands.session.status = status
+                    status = runner(frame)
+            return status
+        return run
+
+    def _command(self, node, append=False):
+        if isinstance(node, SimpleCommand):
+            return self._simple(node, append)
+        if isinstance(node, ForCommand):
+            return self._for(node)
+        if isinstance(node, IfCommand):
+            return self._if(node)
+        if isinstance(node, WhileCommand):
+            return self._while(node)
+        raise TypeError(f"无法编译的节点: {type(node).__name__}")
+
+    # ------------------------------------------------------------ 复合命令
+
+    def _for(self, node):
+        build = self._arguments(node.words)
+        body = self._sequence(node.body)
+        name = node.name
+        commands = self.executor.commands_instance
+
+        def run(frame):
+            session = commands.session
+            variables = session.variables
+            status = 0
+            for value in build(frame, session):
+                variables[name] = value
+                status = body(frame)
+            return status
+        return run
+
+    def _if(self, node):
+        clauses = tuple((self._sequence(condition), self._sequence(body)) for condition, body in node.clauses)
+        else_body = self._sequence(node.else_body) if node.else_body is not None else None
+
+        def run(frame):
+            for condition, body in clauses:
+                if condition(frame) == 0:
+                    return body(frame)
+            if else_body is not None:
+                return else_body(frame)
+            return 0
+        return run
+
+    def _while(self, node):
+        condition = self._sequence(node.condition)
+        body = self._sequence(node.body)
+
+        def run(frame):
+            status = 0
+            while condition(frame) == 0:
+                status = body(frame)
+            return status
+        return run
+
+    # ------------------------------------------------------------ 简单命令
+
+    def _simple(self, node, append=False):
+        words = node.words
+        if not append and all(_is_assignment(word) for word in words):
+            return self._assignment(words)
+
+        executor = self.executor
+        commands = executor.commands_instance
+        table = executor.definitions
+        text = ' '.join(unescape(word) for word in words)
+        set_current_command = error_manager.set_current_command
+        compiled = [self._word(word) for word in words]
+        build = self._arguments(words, compiled, append)
+
+        first = words[0]
+        if compiled[0] is not None or has_magic(first):
+            # 命令名在执行时才确定：每次按名称查找
+            def run_dynamic(frame):
+                args = build(frame, commands.session)
+                cmd_name = next(args, None)
+                if cmd_name is None:
+                    # 展开后为空的命令
+                    return 0
+                previous = set_current_command(text)
+                try:
+                    return executor.run_command(cmd_name, args)
+                finally:
+                    set_current_command(previous)
+            return run_dynamic
+
+        cmd_name = unescape(first)
+        # 缓存：(别名和函数表版本, 定义, 内置命令调用函数)
+        cache = [None, None, None]
+
+        def run(frame):
+            args = build(frame, commands.session)
+            next(args)
+            previous = set_current_command(text)
+            try:
+                if cache[0] != table.version:
+                    definition = table.get(cmd_name)
+                    cache[1] = definition
+                    cache[2] = None if definition is not None else executor.resolve(cmd_name)
+                    cache[0] = table.version
+                definition = cache[1]
+                if definition is not None:
+                    if not table.is_active(definition):
+                        return executor.call_definition(definition, args)
+                    # 正在展开的别名：同名命令指向被它遮蔽的命令
+                    return executor.run_resolved(cmd_name, executor.resolve(cmd_name), args)
+                return executor.run_resolved(cmd_name, cache[2], args)
+            finally:
+                # 命令结束后恢复，之后记录的错误不再归到这条命令
+                set_current_command(previous)
+        return run
+
+    def _assignment(self, words):
+        assignments = []
+        substituted = False
+        for word in words:
+            name, _, value = word.partition('=')
+            compiled = self._word(value)
+            if compiled is not None and any(part[0] == _SUBST for part in compiled.parts if part.__class__ is tuple):
+                substituted = True
+            assignments.append((name, unescape(value) if compiled is None else _plain(compiled)))
+        assignments = tuple(assignments)
+        commands = self.executor.commands_instance
+        evaluate = self._evaluate
+
+        def run(frame):
+            session = commands.session
+            for name, value in assignments:
+                session.variables[name] = value if value.__class__ is str else evaluate(value.parts, frame, session, False)
+            # 含命令替换的赋值以最后一个命令替换的退出码为退出码
+            return session.status if substituted else 0
+        return run
+
+    # ------------------------------------------------------------ 单词
+
+    def _arguments(self, words, compiled=None, append=False):
+        """
+        编译单词列表
+        :param compiled: 已编译的单词（_word 的结果），未提供时在此编译
+        :return: build(frame, session) -> 展开后的参数迭代器
+        """
+        if compiled is None:
+            compiled = [self._word(word) for word in words]
+        extra = ()
+        if append:
+            self.positional = True
+            extra = (_Word(((_ALL, '@'),), True),)
+        # 字面量部分含有花括号或通配符时，需要在替换后进行展开
+        expand = any(has_magic(word) if word_compiled is None
+                     else any(part.__class__ is str and has_magic(part) for part in word_compiled.parts)
+                     for word, word_compiled in zip(words, compiled))
+
+        if not extra and all(word_compiled is None for word_compiled in compiled):
+            if expand:
+                return lambda frame, session: expand_words(words, session.cwd)
+            static = tuple(unescape(word) for word in words)
+            return lambda frame, session: iter(static)
+
+        if expand:
+            parts = tuple(word if word_compiled is None else word_compiled
+                          for word, word_compiled in zip(words, compiled))
+        else:
+            # 不需要展开：字面量预先去除标记，替换的值直接作为参数
+            parts = tuple(unescape(word) if word_compiled is None else _plain(word_compiled)
+                          for word, word_compiled in zip(words, compiled))
+        parts += extra
+        evaluate = self._evaluate
+        split = self._split
+
+        def build(frame, session):
+            out = []
+            for part in parts:
+                if part.__class__ is str:
+                    out.append(part)
+                elif part.split:
+                    out.extend(split(part.parts[0], frame, session, expand))
+                else:
+                    value = evaluate(part.parts, frame, session, expand)
+                    if value:
+                        out.append(value)
+            if expand:
+                return expand_words(out, session.cwd)
+            return iter(out)
+        return build
+
+    def _word(self, word):
+        """
+        把单词拆分为字面量片段（保留 LITERAL 标记）和引用
+        :return: 不含引用时返回 None，否则返回 _Word
+        """
+        if '$' not in word:
+            return None
+        parts = []
+        buffer = []
+        i = 0
+        n = len(word)
+        while i < n:
+            c = word[i]
+            if c == LITERAL:
+                buffer.append(word[i:i + 2])
+                i += 2
+                continue
+            if c != '$' or i + 1 >= n:
+                buffer.append(c)
+                i += 1
+                continue
+            following = word[i + 1]
+            if following == LITERAL and word[i + 2:i + 3] == '{':
+                # 双引号中的 ${NAME}：花括号带有字面量标记（防止花括号展开）
+                close = word.find(LITERAL + '}', i + 3)
+                body = word[i + 3:close] if close > 0 else ''
+                if valid_name(body):
+                    reference = (_VAR, body)
+                elif body and all(d in _DIGITS for d in body):
+                    reference = (_ARG, int(body))
+                else:
+                    buffer.append(c)
+                    i += 1
+                    continue
+                i = close + 2
+            elif following == LITERAL and word[i + 2:i + 3] in ('?', '*', '@', '#'):
+                # 双引号中的 $? $* $@ $#：特殊字符带有字面量标记（防止通配符展开）
+                special = word[i + 2]
+                if special == '?':
+                    reference = (_STATUS, None)
+                elif special == '#':
+                    reference = (_COUNT, None)
+                else:
+                    reference = (_ALL, special)
+                i += 3
+            elif following == '(':
+                end = substitution_end(word, i)
+                inner = Compiler(self.executor)
+                reference = (_SUBST, inner.compile(parse(word[i + 2:end])))
+                # 命令替换中的参数引用（alias e='echo $(echo $1)'）同样属于外层定义
+                if inner.positional:
+                    self.positional = True
+                i = end + 1
+            elif following == '{':
+                close = word.find('}', i + 2)
+                body = word[i + 2:close] if close > 0 else ''
+                if valid_name(body):
+                    reference = (_VAR, body)
+                elif body and all(d in _DIGITS for d in body):
+                    reference = (_ARG, int(body))
+                else:
+                    buffer.append(c)
+                    i += 1
+                    continue
+                i = close + 1
+            elif following in _DIGITS:
+                reference = (_ARG, int(following))
+                i += 2
+            elif following in '@*':
+                reference = (_ALL, following)
+                i += 2
+            elif following == '#':
+                reference = (_COUNT, None)
+                i += 2
+            elif following == '?':
+                reference = (_STATUS, None)
+                i += 2
+            elif following in _NAME_START:
+                j = i + 1
+                while j < n and word[j] in _NAME_CHARS:
+                    j += 1
+                reference = (_VAR, word[i + 1:j])
+                i = j
+            else:
+                buffer.append(c)
+                i += 1
+                continue
+            if reference[0] in (_ARG, _ALL, _COUNT):
+                self.positional = True
+            if buffer:
+                parts.append(''.join(buffer))
+                buffer = []
+            parts.append(reference)
+        if buffer:
+            parts.append(''.join(buffer))
+        if all(part.__class__ is str for part in parts):
+            return None
+        split = len(parts) == 1 and (parts[0][0] == _SUBST or parts[0] == (_ALL, '@'))
+        return _Word(tuple(parts), split)
+
+    def _value(self, reference, frame, session):
+        kind, value = reference
+        if kind == _VAR:
+            return session.getvar(value)
+        if kind == _ARG:
+            if value == 0:
+                return frame.name
+            return frame.args[value - 1] if value <= len(frame.args) else ''
+        if kind == _ALL:
+            return ' '.join(frame.args)
+        if kind == _COUNT:
+            return str(len(frame.args))
+        if kind == _STATUS:
+            return str(session.status)
+        return self._capture(value, frame, session).rstrip('\n')
+
+    def _evaluate(self, parts, frame, session, mark):
+        """按模板拼接单词，mark 为 True 时替换的值加上字面量标记"""
+        out = []
+        for part in parts:
+            if part.__class__ is str:
+                out.append(part)
+            else:
+                value = self._value(part, frame, session)
+                out.append(literal(value) if mark else value)
+        return ''.join(out)
+
+    def _split(self, reference, frame, session, mark):
+        """$@ 展开为每个参数一个单词，$(...) 展开为每行一个单词"""
+        if reference[0] == _ALL:
+            values = frame.args
+        else:
+            values = [line for line in self._capture(reference[1], frame, session).splitlines() if line]
+        if mark:
+            return [literal(value) for value in values]
+        return values
+
+    def _capture(self, runner, frame, session):
+        """执行命令替换，返回捕获的输出（错误信息不捕获，仍显示在原输出端）"""
+        buffer = io.StringIO()
+        with capture_output(buffer):
+            status = runner(frame)
+        session.status = status
+        return buffer.getvalue()
+
+
+def compile_definition(executor, definition):
+    """编译别名或函数；不含参数引用的别名把调用参数追加到最后一条命令"""
+    tree = definition.compile()
+    compiler = Compiler(executor)
+    runner = compiler.compile(tree)
+    if definition.kind == 'alias' and not compiler.positional:
+        runner = Compiler(executor, append_args=True).compile(tree)
+    return runner
+
+
+class CompileCache:
+    """命令行到编译结果的 LRU 缓存（每个执行器一个，闭包绑定执行器）"""
+
+    def __init__(self, capacity=PARSE_CACHE_SIZE):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, line):
+        with self._lock:
+            runner = self._items.get(line)
+            if runner is not None:
+                self._items.move_to_end(line)
+            return runner
+
+    def put(self, line, runner):
+        with self._lock:
+            self._items[line] = runner
+            if len(self._items) > self.capacity:
+                self._items.popitem(last=False)
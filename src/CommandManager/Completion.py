@@ -0,0 +1,361 @@
+"""
+命令补全 - 为交互式输入提供 Tab 补全
+命令名（内置命令和PATH中的可执行文件）保存在前缀树中，按PATH目录的
+修改时间增量刷新：只有内容发生变化的目录才会重新扫描并更新前缀树。
+文件路径补全使用按修改时间校验的目录列表缓存，列表预先排序，
+前缀查找为二分查找，即使目录中有十万个条目也只需几毫秒。
+"""
+
+import bisect
+import os
+import threading
+import time
+
+# 补全候选的最大数量，避免在巨大目录中一次返回过多结果
+MAX_CANDIDATES = 1000
+
+# 命令名分隔符：这些字符之后开始新的命令
+_COMMAND_SEPARATORS = (';', '&', '|')
+
+_WINDOWS_EXTENSIONS = ('.exe', '.com', '.bat', '.cmd', '.ps1')
+
+
+class _TrieNode:
+    __slots__ = ('children', 'count')
+
+    def __init__(self):
+        self.children = {}
+        # 以该节点结尾的单词的引用计数（同名程序可能出现在多个目录中）
+        self.count = 0
+
+
+class PrefixTrie:
+    """前缀树：支持引用计数的插入、删除和按前缀有序枚举"""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.size = 0
+
+    def add(self, word):
+        node = self.root
+        for c in word:
+            child = node.children.get(c)
+            if child is None:
+                child = node.children[c] = _TrieNode()
+            node = child
+        if node.count == 0:
+            self.size += 1
+        node.count += 1
+
+    def discard(self, word):
+        """减少单词的引用计数，计数归零时删除并剪除空分支"""
+        path = []
+        node = self.root
+        for c in word:
+            child = node.children.get(c)
+            if child is None:
+                return
+            path.append((node, c))
+            node = child
+        if node.count == 0:
+            return
+        node.count -= 1
+        if node.count:
+            return
+        self.size -= 1
+        for parent, c in reversed(path):
+            child = parent.children[c]
+            if child.count or child.children:
+                break
+            del parent.children[c]
+
+    def __contains__(self, word):
+        node = self._find(word)
+        return node is not None and node.count > 0
+
+    def _find(self, prefix):
+        node = self.root
+        for c in prefix:
+            node = node.children.get(c)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix, limit=MAX_CANDIDATES):
+        """按字典序返回以 prefix 开头的单词（最多 limit 个）"""
+        node = self._find(prefix)
+        if node is None:
+            return []
+        results = []
+        stack = [(node, prefix)]
+        while stack and len(results) < limit:
+            node, word = stack.pop()
+            if node.count:
+                results.append(word)
+            # 逆序压栈，保证按字典序弹出
+            for c in sorted(node.children, reverse=True):
+                stack.append((node.children[c], word + c))
+        return results
+
+    def __iter__(self):
+        return iter(self.complete(''))
+
+
+class CommandIndex:
+    """
+    命令名索引：内置命令和PATH中的可执行文件
+    每个PATH目录记录扫描时的修改时间，刷新时只重新扫描发生变化的目录，
+    并把新增/删除的名称增量应用到前缀树上。
+    """
+
+    # 两次检查PATH目录修改时间的最小间隔（秒）
+    REFRESH_INTERVAL = 2.0
+
+    def __init__(self):
+        self.trie = PrefixTrie()
+        self._builtins = frozenset()
+        self._dirs = {}          # 目录 -> (修改时间, 名称集合)
+        self._path = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def set_builtins(self, names):
+        with self._lock:
+            names = frozenset(names)
+            for name in self._builtins - names:
+                self.trie.discard(name)
+            for name in names - self._builtins:
+                self.trie.add(name)
+            self._builtins = names
+
+    def refresh(self, path, force=False):
+        """按PATH刷新索引（短时间内重复调用时直接返回）"""
+        now = time.monotonic()
+        if not force and path == self._path and now - self._checked < self.REFRESH_INTERVAL:
+            return
+        with self._lock:
+            directories = []
+            for directory in path.split(os.pathsep):
+                directory = directory.strip('"')
+                if directory and directory not in directories:
+                    directories.append(directory)
+
+            # PATH中移除的目录
+            for directory in [d for d in self._dirs if d not in directories]:
+                for name in self._dirs.pop(directory)[1]:
+                    self.trie.discard(name)
+
+            for directory in directories:
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    mtime = None
+                cached = self._dirs.get(directory)
+                if cached is not None and cached[0] == mtime:
+                    continue
+                old_names = cached[1] if cached is not None else frozenset()
+                new_names = _scan_executables(directory) if mtime is not None else frozenset()
+                for name in old_names - new_names:
+                    self.trie.discard(name)
+                for name in new_names - old_names:
+                    self.trie.add(name)
+                self._dirs[directory] = (mtime, new_names)
+
+            self._path = path
+            self._checked = time.monotonic()
+
+    def complete(self, prefix, limit=MAX_CANDIDATES):
+        with self._lock:
+            return self.trie.complete(prefix, limit)
+
+    def names(self):
+        """所有已索引的命令名"""
+        with self._lock:
+            return self.trie.complete('', limit=float('inf'))
+
+    def executables(self):
+        """PATH中的可执行文件名（不含内置命令）"""
+        with self._lock:
+            names = set()
+            for _, dir_names in self._dirs.values():
+                names.update(dir_names)
+            return names
+
+
+def _scan_executables(directory):
+    """扫描目录中的可执行文件，Windows上去除可执行扩展名"""
+    names = set()
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith('.'):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if os.name == 'nt':
+                    lower = name.lower()
+                    for ext in _WINDOWS_EXTENSIONS:
+                        if lower.endswith(ext):
+                            names.add(name[:-len(ext)])
+                            break
+                elif os.access(entry.path, os.X_OK):
+                    names.add(name)
+    except OSError:
+        pass
+    return frozenset(names)
+
+
+class DirectoryListingCache:
+    """目录列表缓存：排序后的 (名称, 是否目录) 列表，按目录修改时间校验"""
+
+    # 最多缓存的目录数
+    MAX_DIRECTORIES = 64
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """返回 (名称列表, 目录名集合)，目录无法读取时返回空结果"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return [], frozenset()
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1], cached[2]
+
+        names = []
+        dirs = set()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    names.append(entry.name)
+                    try:
+                        if entry.is_dir():
+                            dirs.add(entry.name)
+                    except OSError:
+                        pass
+        except OSError:
+            return [], frozenset()
+        names.sort()
+        dirs = frozenset(dirs)
+
+        with self._lock:
+            if len(self._entries) >= self.MAX_DIRECTORIES and path not in self._entries:
+                # 淘汰最早加入的目录
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[path] = (mtime, names, dirs)
+        return names, dirs
+
+
+def _prefix_range(names, prefix, limit):
+    """在已排序的名称列表中二分查找前缀匹配的区间"""
+    start = bisect.bisect_left(names, prefix)
+    results = []
+    for i in range(start, min(len(names), start + limit)):
+        if not names[i].startswith(prefix):
+            break
+        results.append(names[i])
+    return results
+
+
+# 全局索引，供补全和相似命令提示共用
+command_index = CommandIndex()
+directory_cache = DirectoryListingCache()
+
+
+class Completer:
+    """readline 补全器：命令位置补全命令名，其余位置补全文件路径"""
+
+    def __init__(self, executor):
+        self.executor = executor
+        self._matches = []
+        self._definitions_version = None
+        command_index.set_builtins(executor.command_map)
+
+    def candidates(self, line, begidx, text):
+        """
+        计算补全候选
+        :param line: 整行输入
+        :param begidx: 待补全单词在行中的起始位置
+        :param text: 待补全的单词
+        """
+        session = self.executor.commands_instance.session
+        before = line[:begidx].rstrip()
+        at_command = not before or before.endswith(_COMMAND_SEPARATORS)
+        if at_command and '/' not in text and os.sep not in text:
+            definitions = self.executor.definitions
+            if not self.executor.plugins.discovered or definitions.version != self._definitions_version:
+                # 第一次补全命令名时读取插件清单和 rc 文件，之后在别名和函数变化时刷新
+                self.executor.plugins.discover()
+                names = definitions.names()
+                self._definitions_version = definitions.version
+                command_index.set_builtins(list(self.executor.command_map) + names)
+            command_index.refresh(session.getenv('PATH', ''))
+            return command_index.complete(text)
+        return self.complete_path(text, session)
+
+    def complete_path(self, text, session):
+        """补全文件路径，目录名后追加 '/'"""
+        head, prefix = os.path.split(text)
+        directory = session.resolve(head) if head else session.cwd
+        names, dirs = directory_cache.get(directory)
+        show_hidden = prefix.startswith('.')
+        matches = []
+        for name in _prefix_range(names, prefix, MAX_CANDIDATES * 2):
+            if name.startswith('.') and not show_hidden:
+                continue
+            candidate = os.path.join(head, name) if head else name
+            matches.append(candidate + '/' if name in dirs else candidate)
+            if len(matches) >= MAX_CANDIDATES:
+                break
+        return matches
+
+    def complete(self, text, state):
+        """readline 回调：state 为 0 时计算候选，之后依次返回"""
+        if state == 0:
+            try:
+                import readline
+                line = readline.get_line_buffer()
+                begidx = readline.get_begidx()
+            except (ImportError, AttributeError):
+                line, begidx = text, 0
+            try:
+                self._matches = self.candidates(line, begidx, text)
+            except Exception:
+                self._matches = []
+            # 唯一的命令名或文件补全后追加空格，目录不追加
+            if len(self._matches) == 1 and not self._matches[0].endswith('/'):
+                self._matches = [self._matches[0] + ' ']
+        return self._matches[state] if state < len(self._matches) else None
+
+
+def install(executor):
+    """
+    为交互式输入启用 Tab 补全（readline 不可用时静默跳过）
+    :return: 是否成功启用
+    """
+    try:
+        import readline
+    except ImportError:
+        return False
+
+    completer = Completer(executor)
+    readline.set_completer(completer.complete)
+    readline.set_completer_delims(' \t\n;&|')
+    if 'libedit' in (getattr(readline, '__doc__', '') or ''):
+        readline.parse_and_bind('bind ^I rl_complete')
+    else:
+        readline.parse_and_bind('tab: complete')
+
+    # 后台预热PATH索引，第一次按 Tab 时无需等待扫描
+    path = executor.session.getenv('PATH', '')
+    threading.Thread(target=command_index.refresh, args=(path, True),
+                     name='completion-index', daemon=True).start()
+    return True
@@ -0,0 +1,280 @@
+"""
+别名和函数 - 用户定义的命令
+定义在创建时解析为语法树并编译为闭包（见 Compiler 模块），调用时只需
+建立带参数的调用帧，不再分词或解析。定义体中可以引用调用参数：
+    $1 ... $9, ${N}   第 N 个参数（不存在时为空，空单词会被省略）
+    $@                作为独立单词时展开为全部参数（每个参数一个单词），
+                      出现在单词中间时与 $* 相同
+    $*                全部参数，以空格连接
+    $#                参数个数
+    $0                别名或函数名
+替换进来的参数按字面量处理，不会再次进行通配符展开。
+不含参数引用的别名把调用时的参数追加到定义的最后一条命令之后（与常见
+shell 的别名一致）；函数则忽略未引用的参数。
+
+别名和函数共用一个名称空间，优先于内置命令。别名定义体中的同名命令指向
+被它遮蔽的内置命令或函数（alias ls='ls -a' 不会递归）；别名经由其他别名
+或函数再次调用自身（alias a1=a2; alias a2=a1）时报告
+COMMAND_CYCLIC_DEPENDENCY。函数可以递归调用，嵌套层数超过 MAX_CALL_DEPTH
+时同样报告 COMMAND_CYCLIC_DEPENDENCY。
+
+定义保存在 rc 文件中（每行一条 alias/function 命令）。rc 文件在第一次
+查找命令时才读取，读取时只按行拆出名称，定义体在第一次调用时才解析，
+rc 文件再大也不影响启动时间。
+"""
+
+import os
+import re
+import shlex
+import threading
+
+from .Parser import parse, split_words
+from .Expansion import unescape
+from ..BasicManager.ErrorManager import ErrorCodes, PythonCMDError, error_manager
+
+# 别名和函数的最大嵌套层数
+MAX_CALL_DEPTH = 64
+
+ALIAS = 'alias'
+FUNCTION = 'function'
+
+_RC_HEADER = "# PythonCMD NEXT 别名和函数定义（由 alias/function 命令维护）\n"
+
+_NAME = re.compile(r'[A-Za-z_][\w.-]*\Z')
+
+
+def default_rc_path():
+    """默认 rc 文件路径：环境变量 PCNEXT_RC，否则为用户主目录下的 .pcnextrc"""
+    path = os.environ.get('PCNEXT_RC')
+    if path:
+        return path
+    return os.path.join(os.path.expanduser('~'), '.pcnextrc')
+
+
+def valid_name(name):
+    return bool(_NAME.match(name))
+
+
+class Definition:
+    """一个别名或函数：定义文本、语法树和编译后的闭包"""
+
+    __slots__ = ('kind', 'name', '_text', '_raw', '_tree', 'runner')
+
+    def __init__(self, kind, name, text=None, raw=None):
+        """
+        :param text: 定义体
+        :param raw: rc 文件中带引号的定义体（第一次使用时才解码）
+        """
+        self.kind = kind
+        self.name = name
+        self._text = text
+        self._raw = raw
+        self._tree = None
+        # 编译后的闭包（见 Compiler 模块），第一次调用时创建
+        self.runner = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = ''.join(unescape(word) for word in split_words(self._raw))
+        return self._text
+
+    def source(self):
+        """定义在 rc 文件中的写法"""
+        if self.kind == ALIAS:
+            return f"alias {self.name}={shlex.quote(self.text)}"
+        return f"function {self.name} {shlex.quote(self.text)}"
+
+    def compile(self):
+        """
+        解析定义体（只执行一次）
+        :return: 语法树
+        :raises PythonCMDError: 语法错误
+        """
+        if self._tree is not None:
+            return self._tree
+        try:
+            tree = parse(self.text)
+        except ValueError as e:
+            raise PythonCMDError(ErrorCodes.COMMAND_SYNTAX_ERROR, f"{self.name} 的定义有语法错误", str(e))
+        if not tree.items:
+            raise PythonCMDError(ErrorCodes.COMMAND_SYNTAX_ERROR, f"{self.name} 的定义为空")
+        self._tree = tree
+        return tree
+
+
+class _CallStack(threading.local):
+    def __init__(self):
+        self.frames = []
+
+
+class DefinitionTable:
+    """别名和函数表：rc 文件的延迟加载、持久化和调用栈"""
+
+    def __init__(self, path=None, compile=None):
+        """
+        :param path: rc 文件路径，为 None 时使用 default_rc_path()；为 False 时不持久化
+        :param compile: 把定义编译为闭包的函数（由执行器提供）
+        """
+        self.path = default_rc_path() if path is None else path
+        self._compile = compile
+        self._items = None
+        self._lock = threading.RLock()
+        self._stack = _CallStack()
+        # 定义变化时递增（补全索引据此刷新）
+        self.version = 0
+
+    # ------------------------------------------------------------ 加载和保存
+
+    def _load(self):
+        """第一次查找时读取 rc 文件：只拆出类型和名称，定义体延迟解码"""
+        items = self._items
+        if items is not None:
+            return items
+        with self._lock:
+            if self._items is not None:
+                return self._items
+            items = {}
+            if self.path:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        lines = f.readlines()
+                except OSError:
+                    lines = []
+                for number, line in enumerate(lines, 1):
+                    definition = self._parse_line(line)
+                    if definition is None:
+                        if line.strip() and not line.lstrip().startswith('#'):
+                            error_manager.log_error(ErrorCodes.CONFIG_PARSE_ERROR, f"rc 文件第 {number} 行格式无效",
+                                                    f"{self.path}: {line.strip()}")
+                        continue
+                    items[definition.name] = definition
+            self._items = items
+            self.version += 1
+            return items
+
+    @staticmethod
+    def _parse_line(line):
+        kind, _, rest = line.strip().partition(' ')
+        if kind == ALIAS:
+            name, sep, raw = rest.partition('=')
+        elif kind == FUNCTION:
+            name, sep, raw = rest.partition(' ')
+        else:
+            return None
+        if not sep or not raw.strip() or not valid_name(name):
+            return None
+        return Definition(kind, name, raw=raw.strip())
+
+    def _save(self):
+        """把全部定义写回 rc 文件（先写临时文件再替换）"""
+        if not self.path:
+            return
+        lines = [_RC_HEADER]
+        lines.extend(definition.source() + '\n' for definition in self._items.values())
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(temp, self.path)
+        except OSError as e:
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            raise PythonCMDError(ErrorCodes.FILE_WRITE_ERROR, f"无法写入 rc 文件: {self.path}", str(e))
+
+    # ------------------------------------------------------------ 定义
+
+    def define(self, kind, name, text):
+        """
+        创建或替换定义：立即解析，语法错误时不保存
+        :raises PythonCMDError: 名称无效、语法错误或 rc 文件写入失败
+        """
+        if not valid_name(name):
+            raise PythonCMDError(ErrorCodes.INVALID_ARGUMENT_FORMAT, f"无效的名称: {name}",
+                                 "名称只能包含字母、数字、下划线、点和连字符，且不能以数字开头")
+        if name in (ALIAS, FUNCTION):
+            raise PythonCMDError(ErrorCodes.COMMAND_CONFLICT, f"不能重新定义 {name}")
+        definition = Definition(kind, name, text=text)
+        definition.compile()
+        if self._compile is not None:
+            definition.runner = self._compile(definition)
+        with self._lock:
+            items = self._load()
+            items[name] = definition
+            self.version += 1
+            self._save()
+        return definition
+
+    def remove(self, kind, name):
+        """删除定义，不存在时返回 False"""
+        with self._lock:
+            items = self._load()
+            definition = items.get(name)
+            if definition is None or definition.kind != kind:
+                return False
+            del items[name]
+            self.version += 1
+            self._save()
+            return True
+
+    def get(self, name):
+        return self._load().get(name)
+
+    def items(self, kind):
+        """指定类型的全部定义（按名称排序）"""
+        return sorted((d for d in self._load().values() if d.kind == kind), key=lambda d: d.name)
+
+    def names(self):
+        return list(self._load())
+
+    # ------------------------------------------------------------ 调用
+
+    def lookup(self, name):
+        """
+        查找命令名对应的定义
+        别名定义体中的同名命令不再匹配该别名，而是指向被遮蔽的内置命令
+        """
+        items = self._items if self._items is not None else self._load()
+        if not items:
+            return None
+        definition = items.get(name)
+        if definition is not None and self.is_active(definition):
+            return None
+        return definition
+
+    def is_active(self, definition):
+        """
+        是否为别名定义体中对自身的直接引用（此时同名命令指向被它遮蔽的命令）
+        经由其他别名或函数间接回到该别名时返回 False，由 enter() 报告循环
+        """
+        frames = self._stack.frames
+        return definition.kind == ALIAS and bool(frames) and frames[-1] is definition
+
+    def runner(self, definition):
+        """定义编译后的闭包（rc 文件中的定义在第一次调用时编译）"""
+        if definition.runner is None:
+            definition.runner = self._compile(definition)
+        return definition.runner
+
+    def enter(self, definition):
+        """
+        进入一层调用
+        :raises PythonCMDError: 别名循环引用，或嵌套层数超过 MAX_CALL_DEPTH
+        """
+        frames = self._stack.frames
+        if definition.kind == ALIAS and definition in frames:
+            start = frames.index(definition)
+            chain = ' -> '.join(frame.name for frame in frames[start:])
+            raise PythonCMDError(ErrorCodes.COMMAND_CYCLIC_DEPENDENCY, f"别名 {definition.name} 循环引用",
+                                 f"{chain} -> {definition.name}")
+        if len(frames) >= MAX_CALL_DEPTH:
+            chain = ' -> '.join(frame.name for frame in frames[-4:])
+            raise PythonCMDError(ErrorCodes.COMMAND_CYCLIC_DEPENDENCY,
+                                 f"{definition.name} 的嵌套调用超过 {MAX_CALL_DEPTH} 层",
+                                 f"可能存在循环调用: ... -> {chain} -> {definition.name}")
+        frames.append(definition)
+
+    def leave(self):
+        self._stack.frames.pop()
@@ -0,0 +1,330 @@
+"""
+参数展开 - 分词、花括号展开和通配符展开
+展开顺序与常见shell一致：分词 -> 花括号展开 -> 通配符展开。
+引号内或反斜杠转义的特殊字符在分词时（见 Parser 模块）加上 LITERAL 标记，
+后续展开阶段将其视为普通字符，最终输出前统一去除标记。
+"""
+
+import os
+import re
+from functools import lru_cache
+
+from .Parser import LITERAL, split_words
+
+_GLOB_CHARS = frozenset('*?[')
+
+
+def unescape(word):
+    """去除字面量标记，得到最终参数"""
+    return word.replace(LITERAL, '') if LITERAL in word else word
+
+
+def has_magic(word):
+    """检查单词是否包含未转义的花括号或通配符"""
+    prev = ''
+    for c in word:
+        if prev != LITERAL and (c in _GLOB_CHARS or c == '{'):
+            return True
+        prev = c
+    return False
+
+
+# ---------------------------------------------------------------- 花括号展开
+
+def _find_brace_group(word, start):
+    """
+    查找与 start 处 '{' 匹配的 '}'，并按顶层逗号拆分
+    :return: (结束位置, 拆分后的部分列表)，无匹配时返回 (None, None)
+    """
+    depth = 0
+    parts = []
+    part_start = start + 1
+    i = start
+    n = len(word)
+    while i < n:
+        c = word[i]
+        if c == LITERAL:
+            i += 2
+            continue
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                parts.append(word[part_start:i])
+                return i, parts
+        elif c == ',' and depth == 1:
+            parts.append(word[part_start:i])
+            part_start = i + 1
+        i += 1
+    return None, None
+
+
+def _brace_range(body):
+    """
+    解析序列表达式 {a..b[..step]}，支持整数（含补零）和单个字母
+    :return: 惰性生成器，无法解析时返回 None
+    """
+    if LITERAL in body:
+        return None
+    pieces = body.split('..')
+    if len(pieces) not in (2, 3):
+        return None
+
+    step = 1
+    if len(pieces) == 3:
+        try:
+            step = abs(int(pieces[2])) or 1
+        except ValueError:
+            return None
+
+    first, last = pieces[0], pieces[1]
+    try:
+        lo, hi = int(first), int(last)
+    except ValueError:
+        if len(first) == 1 and len(last) == 1 and first.isalpha() and last.isalpha():
+            lo, hi = ord(first), ord(last)
+            direction = step if hi >= lo else -step
+            return (chr(c) for c in range(lo, hi + (1 if direction > 0 else -1), direction))
+        return None
+
+    # 任一端带前导零时按最大宽度补零
+    width = 0
+    for s in (first, last):
+        digits = s.lstrip('-+')
+        if len(digits) > 1 and digits.startswith('0'):
+            width = max(width, len(s))
+    direction = step if hi >= lo else -step
+    numbers = range(lo, hi + (1 if direction > 0 else -1), direction)
+    if width:
+        return (f"{value:0{width}d}" for value in numbers)
+    return (str(value) for value in numbers)
+
+
+def _expand_braces_from(word, pos):
+    """从 pos 开始查找并展开花括号，结果惰性生成"""
+    i = pos
+    n = len(word)
+    while i < n:
+        c = word[i]
+        if c == LITERAL:
+            i += 2
+            continue
+        if c == '{':
+            end, parts = _find_brace_group(word, i)
+            if end is not None:
+                if len(parts) > 1:
+                    alternatives = parts
+                else:
+                    alternatives = _brace_range(parts[0])
+                if alternatives is not None:
+                    prefix = word[:i]
+                    suffix = word[end + 1:]
+                    for alt in alternatives:
+                        yield from _expand_braces_from(prefix + alt + suffix, len(prefix))
+                    return
+        i += 1
+    yield word
+
+
+def expand_braces(word):
+    """
+    花括号展开：a{b,c}d -> abd acd，f{1..3} -> f1 f2 f3
+    :return: 惰性生成器
+    """
+    if '{' not in word:
+        return iter((word,))
+    return _expand_braces_from(word, 0)
+
+
+# ---------------------------------------------------------------- 通配符展开
+
+class DirectoryCache:
+    """
+    目录列表缓存：一次展开过程中每个目录只 scandir 一次
+    多个模式（例如花括号展开出的 *.log *.txt）共享同一份列表
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def list(self, path):
+        """返回目录中的 (名称, 是否目录) 列表，无法读取时返回空列表"""
+        entries = self._entries.get(path)
+        if entries is None:
+            entries = []
+            try:
+                with os.scandir(path or '.') as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        entries.append((entry.name, is_dir))
+            except OSError:
+                pass
+            entries.sort()
+            self._entries[path] = entries
+        return entries
+
+
+@lru_cache(maxsize=256)
+def _compile_component(pattern):
+    """将单个路径组件的通配模式编译为正则表达式"""
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == LITERAL:
+            if i + 1 < n:
+                out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        if c == '*':
+            out.append('.*')
+        elif c == '?':
+            out.append('.')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j].replace(LITERAL, '').replace('\\', '\\\\')
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                try:
+                    re.compile(f'[{body}]')
+                except re.error:
+                    # 无效的字符类（如逆序范围 [t-n]）按字面量匹配
+                    out.append(re.escape(c))
+                    i += 1
+                    continue
+                out.append(f'[{body}]')
+                i = j
+        else:
+            out.append(re.escape(c))
+        i += 1
+    flags = re.IGNORECASE if os.name == 'nt' else 0
+    return re.compile('(?s:' + ''.join(out) + r')\Z', flags)
+
+
+def _join(base, name):
+    """拼接路径（保持相对路径形式）"""
+    if not base:
+        return name
+    if base.endswith('/'):
+        return base + name
+    return base + '/' + name
+
+
+def _walk_dirs(cache, cwd, base):
+    """'**' 展开：生成 base 本身及其所有非隐藏子目录"""
+    yield base
+    for name, is_dir in cache.list(_fs_path(cwd, base)):
+        if is_dir and not name.startswith('.'):
+            yield from _walk_dirs(cache, cwd, _join(base, name))
+
+
+def _fs_path(cwd, path):
+    """把展开中的相对路径转换为实际文件系统路径"""
+    if cwd is None or os.path.isabs(path):
+        return path or '.'
+    return os.path.join(cwd, path) if path else cwd
+
+
+def expand_glob(word, cache=None, cwd=None):
+    """
+    通配符展开：支持 * ? [...] 以及递归匹配 **
+    无匹配时保留原单词（去除标记），与shell默认行为一致
+    :param cache: DirectoryCache 实例，可在多个单词之间共享
+    :param cwd: 相对路径的基准目录，默认为进程当前目录
+    :return: 匹配结果列表（已排序）
+    """
+    if not any(c in word for c in _GLOB_CHARS) or not has_magic(word):
+        return [unescape(word)]
+    if cache is None:
+        cache = DirectoryCache()
+
+    if word.startswith('/'):
+        bases = ['/']
+        components = word.lstrip('/').split('/')
+    else:
+        bases = ['']
+        components = word.split('/')
+
+    last = len(components) - 1
+    for index, component in enumerate(components):
+        if not component:
+            continue
+        is_last = index == last
+        next_bases = []
+
+        if component == '**':
+            for base in bases:
+                next_bases.extend(_walk_dirs(cache, cwd, base))
+            if is_last:
+                # 末尾的 ** 匹配所有文件和目录
+                results = []
+                for base in next_bases:
+                    for name, _ in cache.list(_fs_path(cwd, base)):
+                        if not name.startswith('.'):
+                            results.append(_join(base, name))
+                next_bases = results
+        elif has_magic(component):
+            regex = _compile_component(component)
+            show_hidden = unescape(component).startswith('.')
+            for base in bases:
+                for name, is_dir in cache.list(_fs_path(cwd, base)):
+                    if name.startswith('.') and not show_hidden:
+                        continue
+                    if (is_last or is_dir) and regex.match(name):
+                        next_bases.append(_join(base, name))
+        else:
+            name = unescape(component)
+            for base in bases:
+                candidate = _join(base, name)
+                if os.path.lexists(_fs_path(cwd, candidate)):
+                    next_bases.append(candidate)
+
+        bases = next_bases
+        if not bases:
+            break
+
+    if word.endswith('/'):
+        bases = [base + '/' for base in bases if base and not base.endswith('/')]
+    results = [base for base in bases if base]
+    if not results:
+        return [unescape(word)]
+    results = sorted(set(results))
+    return results
+
+
+def expand_words(words, cwd=None):
+    """
+    对单词序列依次进行花括号展开和通配符展开
+    所有单词共享同一个目录缓存，结果以惰性生成器返回
+    """
+    cache = None
+    for word in words:
+        if not has_magic(word):
+            yield unescape(word)
+            continue
+        for expanded in expand_braces(word):
+            if any(c in expanded for c in _GLOB_CHARS):
+                if cache is None:
+                    cache = DirectoryCache()
+                yield from expand_glob(expanded, cache, cwd)
+            else:
+                yield unescape(expanded)
+
+
+def expand_arguments(text, cwd=None):
+    """分词并展开参数字符串，返回惰性生成器"""
+    return expand_words(split_words(text), cwd)
@@ -0,0 +1,261 @@
+"""
+命令历史 - 持久化的历史记录和子串检索
+历史文件只追加写入：新命令先缓存在内存中，按批次以 O_APPEND 方式一次写入，
+写入期间持有文件锁，多个会话同时写入也不会互相截断或交错。
+文件超过容量上限时轮转为 .1 备份文件。
+
+历史文件在第一次查询时才加载，加载后建立三字母组（trigram）倒排索引，
+子串查询只需对候选条目做验证，无需每次扫描全部历史。
+"""
+
+import atexit
+import os
+import threading
+import time
+from array import array
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 历史文件容量上限，超过后轮转
+HISTORY_MAX_BYTES = 8 * 1024 * 1024
+# 累积多少条命令后写入一次
+FLUSH_BATCH = 16
+# 距上次写入超过该时间（秒）时，新命令会触发一次写入
+FLUSH_INTERVAL = 5.0
+# 启动时载入 readline 的最近历史条数
+READLINE_HISTORY = 1000
+
+_GRAM = 3
+
+
+def default_history_path():
+    """默认历史文件路径：环境变量 PCNEXT_HISTFILE，否则为用户主目录下的 .pcnext_history"""
+    path = os.environ.get('PCNEXT_HISTFILE')
+    if path:
+        return path
+    return os.path.join(os.path.expanduser('~'), '.pcnext_history')
+
+
+def _escape(line):
+    """每条历史占一行：转义反斜杠和换行"""
+    return line.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _unescape(text):
+    if '\\' not in text:
+        return text
+    out = []
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == '\\' and i + 1 < n:
+            i += 1
+            out.append('\n' if text[i] == 'n' else text[i])
+        else:
+            out.append(c)
+        i += 1
+    return ''.join(out)
+
+
+def _grams(text):
+    """文本中所有不重复的三字母组（不区分大小写）"""
+    text = text.lower()
+    return {text[i:i + _GRAM] for i in range(len(text) - _GRAM + 1)}
+
+
+class HistoryIndex:
+    """三字母组倒排索引：每个三字母组对应按编号递增的条目编号数组"""
+
+    def __init__(self):
+        self.postings = {}
+
+    def add(self, entry_id, text):
+        postings = self.postings
+        for gram in _grams(text):
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = array('I')
+            ids.append(entry_id)
+
+    def candidates(self, query):
+        """
+        返回可能包含 query 的条目编号集合
+        query 不足三个字符时返回 None，表示无法使用索引
+        """
+        grams = _grams(query)
+        if not grams:
+            return None
+        lists = []
+        for gram in grams:
+            ids = self.postings.get(gram)
+            if ids is None:
+                return set()
+            lists.append(ids)
+        # 从最短的倒排表开始求交集
+        lists.sort(key=len)
+        result = set(lists[0])
+        for ids in lists[1:]:
+            result.intersection_update(ids)
+            if not result:
+                break
+        return result
+
+
+class History:
+    """命令历史：批量追加写入、轮转、延迟加载和子串检索"""
+
+    def __init__(self, path=None, max_bytes=HISTORY_MAX_BYTES):
+        self.path = path or default_history_path()
+        self.max_bytes = max_bytes
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._entries = None
+        self._index = None
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    # ------------------------------------------------------------ 写入
+
+    def add(self, line):
+        """记录一条命令（忽略空行和与上一条相同的命令）"""
+        line = line.rstrip('\n')
+        if not line.strip():
+            return
+        with self._lock:
+            if self._pending and self._pending[-1] == line:
+                return
+            if not self._pending and self._entries and self._entries[-1] == line:
+                return
+            self._pending.append(line)
+            if self._entries is not None:
+                self._append_loaded(line)
+            if len(self._pending) >= FLUSH_BATCH or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                self.flush()
+
+    def flush(self):
+        """把缓存的命令一次性追加到历史文件"""
+        with self._lock:
+            if not self._pending:
+                return
+            data = ''.join(_escape(line) + '\n' for line in self._pending).encode('utf-8')
+            try:
+                self._append(data)
+            except OSError:
+                # 历史记录写入失败不影响命令执行，保留缓存等待下次重试
+                return
+            self._pending.clear()
+            self._last_flush = time.monotonic()
+
+    def _append(self, data):
+        """持有文件锁时以 O_APPEND 追加数据，必要时先轮转文件"""
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        while True:
+            fd = os.open(self.path, flags, 0o600)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    # 等待锁期间文件可能已被其他会话轮转，需重新打开
+                    try:
+                        if os.stat(self.path).st_ino != os.fstat(fd).st_ino:
+                            continue
+                    except FileNotFoundError:
+                        continue
+                # 空文件不再轮转：单批数据超过上限时直接写入新文件，避免反复轮转
+                size = os.fstat(fd).st_size
+                if size > 0 and size + len(data) > self.max_bytes:
+                    os.replace(self.path, self.path + '.1')
+                    continue
+                os.write(fd, data)
+                return
+            finally:
+                os.close(fd)
+
+    # ------------------------------------------------------------ 读取
+
+    def _read_file(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return [_unescape(line.rstrip('\n')) for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def _load(self):
+        """第一次查询时加载历史文件（包含轮转的备份）"""
+        if self._entries is None:
+            entries = self._read_file(self.path + '.1') + self._read_file(self.path)
+            entries.extend(self._pending)
+            self._entries = entries
+            self._index = None
+        return self._entries
+
+    def _append_loaded(self, line):
+        self._entries.append(line)
+        if self._index is not None:
+            self._index.add(len(self._entries) - 1, line)
+
+    def entries(self):
+        """返回全部历史（从旧到新）"""
+        with self._lock:
+            return list(self._load())
+
+    def recent(self, count=READLINE_HISTORY):
+        """
+        读取最近的若干条历史，只读取文件末尾，不加载整个文件
+        """
+        with self._lock:
+            if self._entries is not None:
+                return self._entries[-count:]
+            pending = list(self._pending)
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                # 按平均每条不超过256字节估算需要读取的长度
+                f.seek(max(0, size - count * 256))
+                data = f.read()
+        except OSError:
+            data = b''
+        lines = data.decode('utf-8', errors='replace').split('\n')
+        if data and len(data) < size:
+            lines = lines[1:]  # 第一行可能不完整
+        lines = [_unescape(line) for line in lines if line.strip()]
+        return (lines + pending)[-count:]
+
+    def search(self, query, limit=50):
+        """
+        子串检索（不区分大小写），从新到旧返回 (编号, 命令)
+        第一次检索时建立索引，之后新增的命令增量加入索引
+        """
+        with self._lock:
+            entries = self._load()
+            if self._index is None:
+                self._index = HistoryIndex()
+                for entry_id, line in enumerate(entries):
+                    self._index.add(entry_id, line)
+            needle = query.lower()
+            candidates = self._index.candidates(query)
+            if candidates is None:
+                ids = range(len(entries) - 1, -1, -1)
+            else:
+                ids = sorted(candidates, reverse=True)
+            results = []
+            for entry_id in ids:
+                if needle in entries[entry_id].lower():
+                    results.append((entry_id + 1, entries[entry_id]))
+                    if len(results) >= limit:
+                        break
+            return results
+
+    def attach_readline(self):
+        """把最近的历史载入 readline，使上下键和 Ctrl+R 可以使用"""
+        try:
+            import readline
+        except ImportError:
+            return False
+        for line in self.recent(READLINE_HISTORY):
+            readline.add_history(line)
+        return True
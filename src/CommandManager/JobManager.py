@@ -0,0 +1,235 @@
+"""
+任务管理器 - 后台任务（命令行末尾的 &）
+每个后台任务在独立线程中通过执行器运行，输出写入任务自己的缓冲区，
+不会与前台输出交错；任务完成后在下一次提示符前统一报告。
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from ..BasicManager.OutputManager import install as install_output, redirect_output
+from .Session import session_context
+
+_job_local = threading.local()
+
+
+def current_job():
+    """获取当前线程正在执行的后台任务，前台执行时返回 None"""
+    return getattr(_job_local, 'job', None)
+
+
+@contextmanager
+def job_context(job):
+    """
+    在当前线程内把 job 设为当前任务
+    期间启动的外部进程会登记到 job 上，可通过 job.kill() 统一终止
+    """
+    previous = getattr(_job_local, 'job', None)
+    _job_local.job = job
+    try:
+        yield job
+    finally:
+        _job_local.job = previous
+
+
+class JobOutput:
+    """后台任务的输出缓冲区，超过容量时丢弃最早的输出"""
+
+    MAX_CHARS = 8 * 1024 * 1024
+
+    def __init__(self):
+        self._chunks = deque()
+        self._size = 0
+        self._dropped = 0
+        self._live = None
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            if self._live is not None:
+                self._live.write(text)
+                return len(text)
+            self._chunks.append(text)
+            self._size += len(text)
+            while self._size > self.MAX_CHARS and len(self._chunks) > 1:
+                dropped = self._chunks.popleft()
+                self._size -= len(dropped)
+                self._dropped += len(dropped)
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            if self._live is not None:
+                self._live.flush()
+
+    def drain(self):
+        """取出并清空已缓冲的输出"""
+        with self._lock:
+            return self._take()
+
+    def attach(self, target):
+        """先输出已缓冲内容，之后的输出直接写入 target（用于 fg）"""
+        with self._lock:
+            pending = self._take()
+            if pending:
+                target.write(pending)
+                target.flush()
+            self._live = target
+
+    def detach(self):
+        with self._lock:
+            self._live = None
+
+    def _take(self):
+        text = ''.join(self._chunks)
+        if self._dropped:
+            text = f"...（输出过多，已丢弃 {self._dropped} 个字符）\n" + text
+        self._chunks.clear()
+        self._size = 0
+        self._dropped = 0
+        return text
+
+
+class Job:
+    """后台任务"""
+
+    RUNNING = '运行中'
+    DONE = '已完成'
+    KILLED = '已终止'
+
+    def __init__(self, job_id, command, session=None):
+        self.id = job_id
+        self.command = command
+        self.session = session
+        self.status = Job.RUNNING
+        self.returncode = None
+        self.output = JobOutput()
+        # 仍在运行的外部进程（进程结束时移除，xargs 等长时间任务的登记表不会增长）
+        self.processes = set()
+        self.killed = False
+        self.started = time.time()
+        self.finished = threading.Event()
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def attach_process(self, handle):
+        """登记任务启动的外部进程，便于 kill 时终止"""
+        with self._lock:
+            self.processes.add(handle)
+            killed = self.killed
+        # 进程已结束时回调立即在当前线程执行，因此在锁外注册
+        handle.future.add_done_callback(lambda _: self._detach_process(handle))
+        if killed:
+            handle.interrupt()
+
+    def _detach_process(self, handle):
+        with self._lock:
+            self.processes.discard(handle)
+
+    def running_processes(self):
+        with self._lock:
+            return [handle for handle in self.processes if not handle.done()]
+
+    def kill(self):
+        """终止任务中仍在运行的外部进程"""
+        with self._lock:
+            self.killed = True
+            handles = list(self.processes)
+        for handle in handles:
+            handle.interrupt()
+
+    def wait(self, timeout=None):
+        """等待任务结束，以短间隔轮询以便响应 Ctrl+C"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.finished.wait(0.1):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+        return True
+
+
+class JobManager:
+    """任务表：启动、查询、等待和终止后台任务"""
+
+    def __init__(self, executor):
+        self.executor = executor
+        self._jobs = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def start(self, command, session=None, run=None):
+        """
+        在后台启动一条命令，返回 Job
+        :param session: 任务使用的会话（工作目录和环境变量），默认为执行器的会话
+        :param run: 已编译的命令（无参数的可调用对象），为 None 时由执行器解析执行 command
+        """
+        install_output()
+        with self._lock:
+            job = Job(self._next_id, command, session or self.executor.session)
+            self._next_id += 1
+            self._jobs[job.id] = job
+        job.thread = threading.Thread(target=self._run_job, args=(job, run),
+                                      name=f'job-{job.id}', daemon=True)
+        job.thread.start()
+        return job
+
+    def _run_job(self, job, run=None):
+        """任务线程：输出重定向到任务缓冲区后执行命令"""
+        returncode = 0
+        try:
+            with job_context(job), session_context(job.session), redirect_output(job.output):
+                status = run() if run is not None else self.executor.execute(job.command)
+            if isinstance(status, int):
+                returncode = status
+        except BaseException as e:
+            job.output.write(f"任务异常结束: {e}\n")
+            returncode = 1
+        finally:
+            job.returncode = returncode
+            job.status = Job.KILLED if job.killed else Job.DONE
+            job.finished.set()
+
+    def get(self, spec=None):
+        """
+        按编号查找任务，支持 '1' 和 '%1' 两种写法
+        未指定时返回最近启动的任务
+        :return: Job，不存在时返回 None
+        """
+        with self._lock:
+            if spec is None:
+                return self._jobs[max(self._jobs)] if self._jobs else None
+            text = str(spec).lstrip('%')
+            if not text.isdigit():
+                raise ValueError(f"无效的任务编号: {spec}")
+            return self._jobs.get(int(text))
+
+    def list(self):
+        """返回当前任务表中的所有任务（按编号排序）"""
+        with self._lock:
+            return [self._jobs[job_id] for job_id in sorted(self._jobs)]
+
+    def remove(self, job):
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    def format_status(self, job):
+        """格式化任务状态行"""
+        status = job.status
+        if job.status != Job.RUNNING and job.returncode:
+            status = f"{job.status} (退出码 {job.returncode})"
+        return f"[{job.id}]  {status:<12} {job.command} &"
+
+    def report(self, job):
+        """输出任务缓冲的内容和最终状态，并从任务表中移除"""
+        pending = job.output.drain()
+        if pending:
+            print(pending, end='' if pending.endswith('\n') else '\n')
+        print(self.format_status(job))
+        self.remove(job)
+
+    def report_finished(self):
+        """报告所有已结束但尚未报告的任务（在显示提示符前调用）"""
+        for job in self.list():
+            if job.finished.is_set():
+                self.report(job)
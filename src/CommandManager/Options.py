@@ -0,0 +1,256 @@
+"""
+选项解析 - 由 Commands.json 中的类型化参数描述生成的命令行解析器
+para 为对象时描述带类型的选项和位置参数：
+    "para": {
+        "options": [
+            {"flags": ["-n", "--lines"], "dest": "lines", "type": "int", "default": 10,
+             "min": 0, "metavar": "N", "help": "显示的行数"},
+            {"flags": ["-r", "-R"], "dest": "recursive", "help": "递归删除"},
+            {"flags": ["--json"], "dest": "record_format", "const": "--json", "help": "..."}
+        ],
+        "args": ["file"]
+    }
+选项类型：int、str、size（内存大小，如 64M，转换为字节数）、choice（配合
+choices），未指定 type 的选项不带值，出现时 dest 取 const（默认 True），未出现时
+取 default（默认 False，多个选项共用 dest 时取第一个选项的 default）。
+"append": true 的选项可以重复出现，取值按出现顺序收集到列表中；带值的选项
+同时指定 const 时，列表元素为 (const, 取值)，共用 dest 的多个选项据此区分来源。
+位置参数沿用 para 列表的写法："名称" 必需，"[名称]" 可选，"名称..." 一个或多个，
+"[名称...]" 零个或多个。
+"options_first": true 时选项只能出现在第一个位置参数之前，之后的参数（包括以
+- 开头的）都作为位置参数，用于 time、xargs 等后面跟着另一条命令的命令。
+执行器加载配置时为每个命令预编译一个解析器：选项查找是一次字典查找，
+短选项可以组合（-la）或紧跟取值（-n5），长选项支持 --name=value，
+"--" 之后的参数都作为位置参数。
+"""
+
+from ..BasicManager.ErrorManager import ArgumentError, ErrorCodes
+from ..BasicManager.MemoryManager import parse_size
+
+# 所有命令都支持的帮助选项
+HELP_FLAG = '--help'
+
+
+def _to_int(option, text):
+    try:
+        value = int(text)
+    except (TypeError, ValueError):
+        raise ArgumentError(ErrorCodes.INVALID_OPTION_VALUE, f"选项 '{option.flags[0]}' 需要整数，得到 '{text}'")
+    if option.minimum is not None and value < option.minimum:
+        raise ArgumentError(ErrorCodes.ARGUMENT_OUT_OF_RANGE, f"选项 '{option.flags[0]}' 的值不能小于 {option.minimum}",
+                            f"得到 {value}")
+    if option.maximum is not None and value > option.maximum:
+        raise ArgumentError(ErrorCodes.ARGUMENT_OUT_OF_RANGE, f"选项 '{option.flags[0]}' 的值不能大于 {option.maximum}",
+                            f"得到 {value}")
+    return value
+
+
+def _to_str(option, text):
+    return text
+
+
+def _to_size(option, text):
+    try:
+        return parse_size(text)
+    except ValueError:
+        raise ArgumentError(ErrorCodes.INVALID_OPTION_VALUE, f"选项 '{option.flags[0]}' 需要内存大小，得到 '{text}'",
+                            "例如: 512K、64M、1.5G")
+
+
+def _to_choice(option, text):
+    if text not in option.choices:
+        raise ArgumentError(ErrorCodes.INVALID_OPTION_VALUE, f"选项 '{option.flags[0]}' 的值无效: '{text}'",
+                            f"可选: {', '.join(option.choices)}")
+    return text
+
+
+_CONVERTERS = {'int': _to_int, 'str': _to_str, 'size': _to_size, 'choice': _to_choice}
+
+
+class Option:
+    """一个选项的编译结果"""
+
+    __slots__ = ('flags', 'dest', 'convert', 'const', 'default', 'minimum', 'maximum',
+                 'choices', 'metavar', 'help', 'append')
+
+    def __init__(self, spec):
+        self.flags = tuple(spec['flags'])
+        self.dest = spec.get('dest') or self.flags[-1].lstrip('-').replace('-', '_')
+        value_type = spec.get('type')
+        if value_type is not None and value_type not in _CONVERTERS:
+            raise ValueError(f"未知的选项类型: {value_type}")
+        # 不带值的选项 convert 为 None
+        self.convert = _CONVERTERS.get(value_type)
+        self.append = spec.get('append', False)
+        self.const = spec.get('const', None if self.append and self.convert is not None else True)
+        self.default = spec.get('default', None if self.convert is not None or self.append else False)
+        self.minimum = spec.get('min')
+        self.maximum = spec.get('max')
+        self.choices = tuple(spec.get('choices', ()))
+        self.metavar = spec.get('metavar') or (
+            '|'.join(self.choices) if self.choices else self.dest.upper())
+        self.help = spec.get('help', '')
+
+    def usage(self):
+        flag = self.flags[0]
+        text = f"[{flag}]" if self.convert is None else f"[{flag} {self.metavar}]"
+        return text + '...' if self.append else text
+
+    def store(self, values, value):
+        """把选项的取值写入结果字典（append 选项追加到新建的列表，不修改默认值）"""
+        if not self.append:
+            values[self.dest] = value
+            return
+        if self.convert is not None and self.const is not None:
+            value = (self.const, value)
+        values[self.dest] = (values[self.dest] or []) + [value]
+
+
+def _compile_args(names):
+    """把位置参数描述编译为 (显示名称列表, 最少个数, 最多个数)"""
+    shown = []
+    minimum = 0
+    maximum = 0
+    for name in names:
+        optional = name.startswith('[') and name.endswith(']')
+        if optional:
+            name = name[1:-1]
+        variadic = name.endswith('...')
+        if variadic:
+            name = name[:-3]
+        if not optional:
+            minimum += 1
+        maximum = None if variadic or maximum is None else maximum + 1
+        text = f"{name}..." if variadic else name
+        shown.append(f"[{text}]" if optional else f"<{text}>")
+    return shown, minimum, maximum
+
+
+class OptionParser:
+    """一个命令的预编译解析器"""
+
+    def __init__(self, command, spec):
+        self.command = command
+        self.options = [Option(item) for item in spec.get('options', ())]
+        self.table = {}
+        self.defaults = {}
+        for option in self.options:
+            for flag in option.flags:
+                if flag in self.table:
+                    raise ValueError(f"命令 '{command}' 的选项 '{flag}' 重复定义")
+                self.table[flag] = option
+            self.defaults.setdefault(option.dest, option.default)
+        self.arg_names, self.min_args, self.max_args = _compile_args(spec.get('args', ()))
+        self.options_first = spec.get('options_first', False)
+
+    def parse(self, argv):
+        """
+        解析参数
+        :return: (位置参数列表, 选项字典)；请求帮助时返回 (None, None)
+        :raises ArgumentError: 未知选项、缺少取值、取值无效或位置参数个数不符
+        """
+        table = self.table
+        values = self.defaults.copy()
+        positional = []
+        args = iter(argv)
+        for arg in args:
+            if arg[:1] != '-' or arg == '-':
+                positional.append(arg)
+                if self.options_first:
+                    positional.extend(args)
+                    break
+                continue
+            option = table.get(arg)
+            if option is not None:
+                if option.convert is None:
+                    option.store(values, option.const)
+                else:
+                    option.store(values, option.convert(option, self._value(option, args)))
+                continue
+            if arg == '--':
+                positional.extend(args)
+                break
+            if arg == HELP_FLAG:
+                return None, None
+            if arg.startswith('--'):
+                name, sep, text = arg.partition('=')
+                option = table.get(name)
+                if option is None or not sep:
+                    if option is not None:
+                        raise ArgumentError(ErrorCodes.INVALID_OPTION_VALUE, f"选项 '{name}' 需要一个值",
+                                            f"例如: {name}={option.metavar}")
+                    raise ArgumentError(ErrorCodes.UNKNOWN_OPTION, f"无法识别的选项 '{arg}'")
+                if option.convert is None:
+                    raise ArgumentError(ErrorCodes.INVALID_OPTION_VALUE, f"选项 '{name}' 不接受取值")
+                option.store(values, option.convert(option, text))
+                continue
+            self._parse_cluster(arg, args, values)
+
+        count = len(positional)
+        if count < self.min_args:
+            missing = self.arg_names[count] if count < len(self.arg_names) else self.arg_names[-1]
+            raise ArgumentError(ErrorCodes.MISSING_ARGUMENT, f"缺少参数 {missing}")
+        if self.max_args is not None and count > self.max_args:
+            raise ArgumentError(ErrorCodes.TOO_MANY_ARGUMENTS, f"参数过多: 最多 {self.max_args} 个，得到 {count} 个",
+                                f"多余的参数: {' '.join(positional[self.max_args:])}")
+        return positional, values
+
+    def _value(self, option, args):
+        value = next(args, None)
+        if value is None:
+            raise ArgumentError(ErrorCodes.MISSING_ARGUMENT, f"选项 '{option.flags[0]}' 需要一个参数",
+                                f"用法: {option.flags[0]} {option.metavar}")
+        return value
+
+    def _parse_cluster(self, arg, args, values):
+        """组合的短选项（-la）和紧跟取值的短选项（-n5）"""
+        for index in range(1, len(arg)):
+            option = self.table.get('-' + arg[index])
+            if option is None:
+                unknown = arg if index == 1 else '-' + arg[index]
+                raise ArgumentError(ErrorCodes.UNKNOWN_OPTION, f"无法识别的选项 '{unknown}'")
+            if option.convert is None:
+                option.store(values, option.const)
+                continue
+            rest = arg[index + 1:]
+            option.store(values, option.convert(option, rest if rest else self._value(option, args)))
+            return
+
+    # ------------------------------------------------------------ 帮助信息
+
+    def usage(self):
+        """单行用法，如 head [-n N] <file>"""
+        parts = [self.command]
+        grouped = set()
+        for option in self.options:
+            group = [o.flags[0] for o in self.options if o.dest == option.dest and o.convert is None]
+            if option.convert is None and len(group) > 1:
+                # 共用 dest 的互斥选项合并显示，如 [--json|--ndjson]
+                if option.dest not in grouped:
+                    grouped.add(option.dest)
+                    parts.append('[' + '|'.join(group) + ']')
+                continue
+            parts.append(option.usage())
+        parts.extend(self.arg_names)
+        return ' '.join(parts)
+
+    def help_lines(self):
+        """每个选项一行的说明"""
+        lines = []
+        for option in self.options:
+            flags = ', '.join(option.flags)
+            if option.convert is not None:
+                flags += f" {option.metavar}"
+            text = option.help
+            if option.convert is not None and option.default is not None:
+                text += f"（默认 {option.default}）"
+            lines.append(f"  {flags:<24}{text}")
+        lines.append(f"  {HELP_FLAG:<24}显示此帮助信息")
+        return lines
+
+
+def compile_parser(command, para):
+    """para 为对象时返回预编译的解析器，否则返回 None"""
+    if isinstance(para, dict):
+        return OptionParser(command, para)
+    return None
@@ -0,0 +1,383 @@
+"""
+命令行解析器 - 词法分析和语法分析
+把一行输入解析为小型语法树：
+    Sequence    ::= AndOrList ((';' | '&' | 换行) AndOrList)* [';' | '&']
+    AndOrList   ::= Command (('&&' | '||') Command)*
+    Command     ::= SimpleCommand | ForCommand | IfCommand | WhileCommand
+    SimpleCommand ::= WORD+
+    ForCommand  ::= 'for' NAME 'in' WORD* 分隔符 'do' Sequence 'done'
+    IfCommand   ::= 'if' Sequence 'then' Sequence ('elif' Sequence 'then' Sequence)*
+                    ['else' Sequence] 'fi'
+    WhileCommand ::= 'while' Sequence 'do' Sequence 'done'
+关键字只在命令位置识别。引号和反斜杠转义会被正确处理，引号内的操作符不会
+被当作分隔符；命令替换 $(...) 整体作为单词的一部分，其中的操作符也不分隔。
+语法树是不可变的，解析结果通过 LRU 缓存复用，历史命令和脚本中
+重复出现的行无需再次分词。
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from ..BasicManager.ErrorManager import ErrorCodes, PythonCMDError
+
+# 字面量标记：紧跟其后的字符不参与展开（见 Expansion 模块）
+LITERAL = '\x00'
+
+# 需要在引号内保护的展开元字符（双引号内的 $ 仍然展开）
+_META_CHARS = frozenset('*?[]{},$')
+
+# 双引号内反斜杠可转义的字符（与POSIX shell一致）
+_DQUOTE_ESCAPES = frozenset('"\\$`')
+
+# 操作符（按长度优先匹配）
+_OPERATORS = ('&&', '||', ';', '&', '\n')
+
+# 解析缓存容量
+PARSE_CACHE_SIZE = 1024
+
+Token = namedtuple('Token', ['kind', 'value', 'start', 'end'])
+WORD = 'WORD'
+OPERATOR = 'OP'
+
+SimpleCommand = namedtuple('SimpleCommand', ['words'])
+AndOrList = namedtuple('AndOrList', ['commands', 'operators', 'text'])
+Sequence = namedtuple('Sequence', ['items'])
+SequenceItem = namedtuple('SequenceItem', ['command', 'background'])
+ForCommand = namedtuple('ForCommand', ['name', 'words', 'body'])
+# clauses 为 ((条件, 分支), ...)，依次对应 if 和各个 elif
+IfCommand = namedtuple('IfCommand', ['clauses', 'else_body'])
+WhileCommand = namedtuple('WhileCommand', ['condition', 'body'])
+
+# 复合命令的开始关键字和只能出现在复合命令内部的关键字
+_COMPOUND_KEYWORDS = frozenset(('for', 'if', 'while'))
+_CLOSING_KEYWORDS = frozenset(('then', 'elif', 'else', 'fi', 'do', 'done'))
+
+_NAME_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+
+
+class IncompleteInput(PythonCMDError):
+    """输入在复合命令或命令替换内部结束（可以继续读取下一行）"""
+
+
+def _syntax_error(message, details=None):
+    return PythonCMDError(ErrorCodes.COMMAND_SYNTAX_ERROR, message, details)
+
+
+def _incomplete(expected):
+    return IncompleteInput(ErrorCodes.COMMAND_SYNTAX_ERROR, "语法错误", f"输入在 '{expected}' 之前结束")
+
+
+def valid_name(name):
+    """变量名：字母或下划线开头，由字母、数字和下划线组成"""
+    return bool(name) and not name[0].isdigit() and all(c in _NAME_CHARS for c in name)
+
+
+def substitution_end(text, start):
+    """
+    查找从 start 处 '$(' 开始的命令替换的结束位置（匹配的 ')'）
+    括号可以嵌套，引号内的括号不计入
+    :raises IncompleteInput: 没有匹配的 ')'
+    """
+    depth = 0
+    quote = None
+    i = start + 1
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if quote is not None:
+            if c == quote:
+                quote = None
+            elif c == '\\' and quote == '"':
+                i += 1
+        elif c in ('"', "'"):
+            quote = c
+        elif c == '\\':
+            i += 1
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise _incomplete(')')
+
+
+def tokenize(line, operators=True):
+    """
+    词法分析
+    :param operators: 是否识别 ; && || & 等操作符，关闭时行为与 shlex.split 一致
+    :return: Token 列表；单词中被引号或转义保护的元字符带有 LITERAL 标记
+    """
+    tokens = []
+    current = []
+    word_start = None
+    quote = None
+    i = 0
+    n = len(line)
+
+    while i < n:
+        c = line[i]
+        if quote == "'":
+            if c == "'":
+                quote = None
+            else:
+                current.append(LITERAL + c if c in _META_CHARS else c)
+        elif quote == '"':
+            if c == '"':
+                quote = None
+            elif c == '\\' and i + 1 < n and line[i + 1] in _DQUOTE_ESCAPES:
+                i += 1
+                c = line[i]
+                current.append(LITERAL + c if c in _META_CHARS else c)
+            elif c == '$':
+                if line.startswith('$(', i):
+                    end = substitution_end(line, i)
+                    current.append(line[i:end + 1])
+                    i = end + 1
+                    continue
+                current.append(c)
+            else:
+                current.append(LITERAL + c if c in _META_CHARS else c)
+        elif operators and c in '&|;\n':
+            op = None
+            for candidate in _OPERATORS:
+                if line.startswith(candidate, i):
+                    op = candidate
+                    break
+            if op is None:
+                # 单独的 '|' 不是操作符，按普通字符处理
+                if word_start is None:
+                    word_start = i
+                current.append(c)
+            else:
+                if word_start is not None:
+                    tokens.append(Token(WORD, ''.join(current), word_start, i))
+                    current = []
+                    word_start = None
+                tokens.append(Token(OPERATOR, op, i, i + len(op)))
+                i += len(op)
+                continue
+        elif c.isspace():
+            if word_start is not None:
+                tokens.append(Token(WORD, ''.join(current), word_start, i))
+                current = []
+                word_start = None
+        elif c in ('"', "'"):
+            quote = c
+            if word_start is None:
+                word_start = i
+        elif c == '$' and line.startswith('$(', i):
+            # 命令替换原样保留，由编译器解析其中的命令
+            if word_start is None:
+                word_start = i
+            end = substitution_end(line, i)
+            current.append(line[i:end + 1])
+            i = end + 1
+            continue
+        elif c == '\\':
+            if word_start is None:
+                word_start = i
+            if i + 1 < n:
+                i += 1
+                c = line[i]
+                current.append(LITERAL + c if c in _META_CHARS else c)
+        else:
+            if word_start is None:
+                word_start = i
+            current.append(c)
+        i += 1
+
+    if quote is not None:
+        raise ValueError("No closing quotation")
+    if word_start is not None:
+        tokens.append(Token(WORD, ''.join(current), word_start, n))
+    return tokens
+
+
+def literal(text):
+    """把文本标记为字面量：其中的元字符不参与花括号和通配符展开"""
+    if not any(c in _META_CHARS for c in text):
+        return text
+    return ''.join(LITERAL + c if c in _META_CHARS else c for c in text)
+
+
+def split_words(text):
+    """按shell规则分词（不识别操作符），返回带 LITERAL 标记的单词列表"""
+    return [token.value for token in tokenize(text, operators=False)]
+
+
+class _Parser:
+    """递归下降语法分析器"""
+
+    def __init__(self, line, tokens):
+        self.line = line
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def at_keyword(self, keywords):
+        """当前位置（命令开头）是否为给定关键字之一"""
+        token = self.peek()
+        return token is not None and token.kind == WORD and token.value in keywords
+
+    def expect(self, keyword):
+        token = self.peek()
+        if token is None:
+            raise _incomplete(keyword)
+        if token.kind != WORD or token.value != keyword:
+            near = token.value.replace('\n', '换行')
+            raise _syntax_error("语法错误", f"'{near}' 附近应为 '{keyword}'")
+        self.next()
+
+    def skip_separators(self):
+        while self.peek() is not None and self.peek().kind == OPERATOR and self.peek().value in (';', '\n'):
+            self.next()
+
+    def parse_sequence(self, terminators=None):
+        """
+        :param terminators: 复合命令内部的列表在遇到这些关键字时结束；
+                            为 None 时解析到输入末尾
+        """
+        items = []
+        while True:
+            token = self.peek()
+            if token is None:
+                if terminators is not None:
+                    raise _incomplete('/'.join(sorted(terminators)))
+                break
+            if token.kind == OPERATOR and token.value in (';', '\n'):
+                # 允许空语句（如连续换行）
+                self.next()
+                continue
+            if terminators is not None and token.kind == WORD and token.value in terminators:
+                if not items:
+                    raise _syntax_error("语法错误", f"'{token.value}' 之前缺少命令")
+                break
+            command = self.parse_and_or()
+            background = False
+            token = self.peek()
+            if token is not None:
+                if token.kind == WORD:
+                    raise _syntax_error("语法错误", f"'{token.value}' 附近有多余的内容")
+                if token.value == '&':
+                    background = True
+                self.next()
+            items.append(SequenceItem(command, background))
+        return Sequence(tuple(items))
+
+    def parse_and_or(self):
+        first_token = self.peek()
+        commands = [self.parse_command()]
+        operators = []
+        while True:
+            token = self.peek()
+            if token is None or token.kind != OPERATOR or token.value not in ('&&', '||'):
+                break
+            self.next()
+            # 操作符后允许换行续行
+            while self.peek() is not None and self.peek().value == '\n':
+                self.next()
+            operators.append(token.value)
+            commands.append(self.parse_command())
+        last_token = self.tokens[self.pos - 1]
+        text = self.line[first_token.start:last_token.end]
+        return AndOrList(tuple(commands), tuple(operators), text)
+
+    def parse_command(self):
+        token = self.peek()
+        if token is not None and token.kind == WORD:
+            if token.value in _COMPOUND_KEYWORDS:
+                self.next()
+                return getattr(self, 'parse_' + token.value)()
+            if token.value in _CLOSING_KEYWORDS:
+                raise _syntax_error("语法错误", f"意外的 '{token.value}'")
+        return self.parse_simple_command()
+
+    def parse_for(self):
+        token = self.next()
+        if token is None:
+            raise _incomplete('in')
+        if token.kind != WORD or not valid_name(token.value):
+            raise _syntax_error("语法错误", f"for 之后应为变量名，得到 '{token.value}'")
+        name = token.value
+        self.expect('in')
+        words = []
+        while self.peek() is not None and self.peek().kind == WORD:
+            words.append(self.next().value)
+        token = self.peek()
+        if token is None:
+            raise _incomplete('do')
+        if token.value not in (';', '\n'):
+            raise _syntax_error("语法错误", f"'{token.value}' 附近应为 ';'")
+        self.skip_separators()
+        self.expect('do')
+        body = self.parse_sequence(('done',))
+        self.expect('done')
+        return ForCommand(name, tuple(words), body)
+
+    def parse_if(self):
+        clauses = []
+        else_body = None
+        while True:
+            condition = self.parse_sequence(('then',))
+            self.expect('then')
+            body = self.parse_sequence(('elif', 'else', 'fi'))
+            clauses.append((condition, body))
+            keyword = self.next().value
+            if keyword == 'elif':
+                continue
+            if keyword == 'else':
+                else_body = self.parse_sequence(('fi',))
+                self.expect('fi')
+            break
+        return IfCommand(tuple(clauses), else_body)
+
+    def parse_while(self):
+        condition = self.parse_sequence(('do',))
+        self.expect('do')
+        body = self.parse_sequence(('done',))
+        self.expect('done')
+        return WhileCommand(condition, body)
+
+    def parse_simple_command(self):
+        words = []
+        while True:
+            token = self.peek()
+            if token is None or token.kind != WORD:
+                break
+            words.append(self.next().value)
+        if not words:
+            token = self.peek()
+            near = token.value.replace('\n', '换行') if token is not None else '行尾'
+            raise _syntax_error("语法错误", f"'{near}' 附近缺少命令")
+        return SimpleCommand(tuple(words))
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse(line):
+    """
+    解析一行命令为语法树（结果被缓存）
+    :raises PythonCMDError: 语法错误
+    :raises ValueError: 引号未闭合
+    """
+    parser = _Parser(line, tokenize(line))
+    return parser.parse_sequence()
+
+
+def is_incomplete(text):
+    """输入是否在复合命令或命令替换内部结束（交互界面和脚本据此继续读取下一行）"""
+    try:
+        parse(text)
+    except IncompleteInput:
+        return True
+    except (PythonCMDError, ValueError):
+        return False
+    return False
@@ -0,0 +1,346 @@
+"""
+进程运行器 - 外部程序的统一启动入口
+事件循环运行在独立的后台线程中，子进程的输出由事件循环异步转发到输出端，
+调用方线程只等待结果，因此可以随时响应 Ctrl+C 和超时。
+输出没有被重定向（直接显示在终端上）时子进程继承终端，分页器、编辑器和
+彩色输出等依赖 isatty 的程序行为不变。
+在POSIX系统上通过 os.wait4 回收子进程，同时取得其资源使用情况（rusage）；
+每个运行中的子进程由一个专用线程等待，并发的子进程再多也不会互相阻塞。
+"""
+
+import asyncio
+import codecs
+import locale
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from ..BasicManager.OutputManager import current_output, current_error_output
+
+# 终止子进程后等待其退出的宽限时间（秒），超时后强制结束
+TERMINATE_GRACE_PERIOD = 2.0
+# 终止子进程后等待管道中剩余输出的时间（秒），超时后不再读取
+PIPE_DRAIN_TIMEOUT = 1.0
+# 单次读取的最大字节数
+READ_CHUNK_SIZE = 65536
+
+
+class ProcessResult:
+    """外部进程的执行结果"""
+
+    __slots__ = ('argv', 'pid', 'returncode', 'rusage', 'timed_out', 'interrupted', 'elapsed',
+                 'output_bytes')
+
+    def __init__(self, argv):
+        self.argv = argv
+        self.pid = None
+        self.returncode = None
+        self.rusage = None
+        self.timed_out = False
+        self.interrupted = False
+        self.elapsed = 0.0
+        # 标准输出和标准错误转发的总字节数（继承终端的输出不经过运行器，不计入）
+        self.output_bytes = 0
+
+
+class ProcessHandle:
+    """正在运行的外部进程句柄，可在任意线程中等待或中断"""
+
+    def __init__(self, runner, argv):
+        self.runner = runner
+        self.argv = argv
+        self.process = None
+        self.future = None
+        self._stop_event = None
+        # 事件循环尚未开始运行进程时收到的中断请求
+        self._interrupt_requested = False
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else None
+
+    def done(self):
+        """进程是否已经结束"""
+        return self.future.done()
+
+    def interrupt(self):
+        """
+        请求终止进程（线程安全）
+        事件循环还没有开始处理该进程时只记录请求，进程启动后立即终止
+        """
+        self._interrupt_requested = True
+        stop_event = self._stop_event
+        if stop_event is not None and not self.future.done():
+            self.runner._loop.call_soon_threadsafe(stop_event.set)
+
+    def wait(self, timeout=None):
+        """
+        等待进程结束并返回 ProcessResult
+        以短间隔轮询，保证主线程在等待期间能及时收到 KeyboardInterrupt
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = 0.1
+            if deadline is not None:
+                remaining = min(remaining, deadline - time.monotonic())
+                if remaining <= 0:
+                    raise FutureTimeoutError()
+            try:
+                return self.future.result(timeout=remaining)
+            except FutureTimeoutError:
+                continue
+
+
+class _StreamSink:
+    """把子进程的字节输出增量解码后写入文本输出端"""
+
+    def __init__(self, target, encoding):
+        self.target = target
+        self.decoder = codecs.getincrementaldecoder(encoding)('replace')
+        self.bytes = 0
+
+    def feed(self, data, final=False):
+        self.bytes += len(data)
+        text = self.decoder.decode(data, final)
+        if text:
+            self.target.write(text)
+            self.target.flush()
+
+
+def _set_result(future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+def _set_exception(future, error):
+    if not future.done():
+        future.set_exception(error)
+
+
+class ProcessRunner:
+    """基于事件循环的外部进程运行器"""
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        if os.name == 'nt':
+            self.encoding = locale.getpreferredencoding(False)
+        else:
+            self.encoding = 'utf-8'
+
+    def _ensure_loop(self):
+        """按需启动后台事件循环线程"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name='process-runner', daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def start(self, argv, timeout=None, stdout=None, stderr=None, stdin=None, cwd=None, env=None,
+              new_session=False):
+        """
+        启动外部进程（不等待）
+        :param argv: 参数列表，argv[0]为可执行文件路径
+        :param timeout: 超时时间（秒），None表示不限制
+        :param stdout: 标准输出的文本输出端（需提供write/flush），默认为调用线程当前的输出端；
+                       当前输出端就是原始标准输出时子进程直接继承它
+        :param stderr: 标准错误的文本输出端，默认为调用线程当前的错误输出端（同样可能直接继承）
+        :param stdin: 传给子进程的标准输入，默认继承
+        :param new_session: 是否放入独立的进程组（后台任务不应收到终端的 Ctrl+C）
+        :return: ProcessHandle
+        """
+        loop = self._ensure_loop()
+        handle = ProcessHandle(self, list(argv))
+        # 输出端在调用线程中确定，事件循环线程只负责写入
+        original = getattr(sys.stdout, 'original', sys.stdout)
+        stdout_sink = stderr_sink = None
+        if stdout is None:
+            stdout = current_output()
+            if stdout is original:
+                # 输出未被捕获：继承终端，先写出已缓冲的输出以保持顺序
+                original.flush()
+                stdout = None
+        if stdout is not None:
+            stdout_sink = _StreamSink(stdout, self.encoding)
+        if stderr is None:
+            stderr = current_error_output()
+            if stderr is sys.stderr or stderr is original:
+                stderr.flush()
+                stderr = None
+        if stderr is not None:
+            stderr_sink = _StreamSink(stderr, self.encoding)
+        popen_kwargs = {'stdin': stdin, 'cwd': cwd, 'env': env}
+        if new_session:
+            if os.name == 'nt':
+                popen_kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+            else:
+                popen_kwargs['start_new_session'] = True
+        coro = self._run(handle, timeout, stdout_sink, stderr_sink, popen_kwargs)
+        handle.future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return handle
+
+    def wait(self, handle):
+        """
+        在前台等待进程结束
+        等待期间按下 Ctrl+C 会终止子进程，结果中 interrupted 为 True
+        """
+        try:
+            return handle.wait()
+        except KeyboardInterrupt:
+            handle.interrupt()
+            return handle.wait()
+
+    def run(self, argv, timeout=None, **kwargs):
+        """在前台运行外部进程并等待结束"""
+        return self.wait(self.start(argv, timeout=timeout, **kwargs))
+
+    async def _run(self, handle, timeout, stdout_sink, stderr_sink, popen_kwargs):
+        """事件循环内：启动进程、转发输出、处理超时和中断"""
+        loop = asyncio.get_running_loop()
+        result = ProcessResult(handle.argv)
+        handle._stop_event = asyncio.Event()
+        if handle._interrupt_requested:
+            # 中断请求先于事件循环到达
+            handle._stop_event.set()
+        start_time = time.perf_counter()
+
+        # 继承的输出（sink 为 None）不经过管道
+        process = subprocess.Popen(handle.argv,
+                                   stdout=subprocess.PIPE if stdout_sink is not None else None,
+                                   stderr=subprocess.PIPE if stderr_sink is not None else None,
+                                   **popen_kwargs)
+        handle.process = process
+        result.pid = process.pid
+
+        waiter = self._wait_in_thread(loop, process)
+        sinks = [sink for sink in (stdout_sink, stderr_sink) if sink is not None]
+        pumps = [asyncio.ensure_future(self._pump(pipe, sink))
+                 for pipe, sink in ((process.stdout, stdout_sink), (process.stderr, stderr_sink))
+                 if sink is not None]
+        finished = asyncio.gather(waiter, *pumps)
+        stop_waiter = asyncio.ensure_future(handle._stop_event.wait())
+
+        done, _ = await asyncio.wait({finished, stop_waiter}, timeout=timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        abandoned = False
+        if finished not in done:
+            if stop_waiter in done:
+                result.interrupted = True
+            else:
+                result.timed_out = True
+            self._terminate(process, waiter)
+            await asyncio.wait({waiter})
+            # 继承了管道的孙进程（如 sh -c 'sleep 1000 &'）可能仍持有写端，
+            # 限时等待剩余输出，之后取消读取并关闭管道
+            _, pending = await asyncio.wait({finished}, timeout=PIPE_DRAIN_TIMEOUT)
+            if pending:
+                abandoned = True
+                for pump in pumps:
+                    pump.cancel()
+                await asyncio.wait({finished})
+        stop_waiter.cancel()
+
+        status, rusage = await waiter
+        if abandoned:
+            # 读取已被取消：只取回结果，避免事件循环报告未取回的异常
+            if not finished.cancelled():
+                finished.exception()
+        else:
+            await finished
+        result.returncode = status
+        result.rusage = rusage
+        result.elapsed = time.perf_counter() - start_time
+        result.output_bytes = sum(sink.bytes for sink in sinks)
+        return result
+
+    def _terminate(self, process, waiter):
+        """先温和终止进程，宽限期后仍未退出则强制结束"""
+        loop = asyncio.get_running_loop()
+        if not waiter.done():
+            try:
+                process.terminate()
+            except OSError:
+                pass
+
+        def kill_if_alive():
+            if not waiter.done():
+                try:
+                    process.kill()
+                except OSError:
+                    pass
+
+        loop.call_later(TERMINATE_GRACE_PERIOD, kill_if_alive)
+
+    def _wait_in_thread(self, loop, process):
+        """
+        在专用线程中回收子进程，返回事件循环中的 Future
+        阻塞的 wait4 每个子进程占用一个线程，线程数随并发子进程数增减，
+        不会因为线程池满而无法回收新的子进程
+        """
+        future = loop.create_future()
+
+        def wait():
+            try:
+                value = self._wait_process(process)
+            except BaseException as e:
+                loop.call_soon_threadsafe(_set_exception, future, e)
+            else:
+                loop.call_soon_threadsafe(_set_result, future, value)
+
+        threading.Thread(target=wait, name=f'proc-wait-{process.pid}', daemon=True).start()
+        return future
+
+    @staticmethod
+    def _wait_process(process):
+        """回收子进程，POSIX上使用 os.wait4 同时取得 rusage"""
+        if hasattr(os, 'wait4'):
+            while True:
+                try:
+                    _, status, rusage = os.wait4(process.pid, 0)
+                    break
+                except InterruptedError:
+                    continue
+                except ChildProcessError:
+                    # 进程已被其他地方回收
+                    return process.wait(), None
+            returncode = os.waitstatus_to_exitcode(status)
+            process.returncode = returncode
+            return returncode, rusage
+        return process.wait(), None
+
+    async def _pump(self, pipe, sink):
+        """把管道中的数据持续转发到输出端"""
+        loop = asyncio.get_running_loop()
+        try:
+            if os.name == 'nt':
+                # Windows匿名管道不支持事件循环直接读取，改用执行器
+                while True:
+                    data = await loop.run_in_executor(None, pipe.read1, READ_CHUNK_SIZE)
+                    if not data:
+                        break
+                    sink.feed(data)
+            else:
+                reader = asyncio.StreamReader(limit=READ_CHUNK_SIZE)
+                transport, _ = await loop.connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(reader), pipe)
+                try:
+                    while True:
+                        data = await reader.read(READ_CHUNK_SIZE)
+                        if not data:
+                            break
+                        sink.feed(data)
+                finally:
+                    transport.close()
+            sink.feed(b'', final=True)
+        finally:
+            pipe.close()
+
+
+# 全局进程运行器实例
+process_runner = ProcessRunner()
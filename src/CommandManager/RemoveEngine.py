@@ -0,0 +1,242 @@
+"""
+并行删除引擎 - 用于 rm -r 删除大型目录树
+每个目录的扫描和文件删除作为独立任务提交到有界线程池，
+目录在其所有子项删除完成后由最后完成的任务负责 rmdir，
+这样叶子目录可以并发删除，unlink 延迟不再串行累加。
+"""
+
+import os
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..BasicManager.ErrorManager import ErrorCodes, error_manager
+from ..BasicManager.OutputManager import current_output
+
+
+class RemoveStats:
+    """删除统计信息"""
+
+    def __init__(self):
+        self.removed = 0
+        self.failed = 0
+        self.skipped_mounts = 0
+        self.errors = []
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    @property
+    def elapsed(self):
+        """已用时间（秒）"""
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        return end - self.start_time
+
+    @property
+    def rate(self):
+        """删除速率（条目/秒）"""
+        elapsed = self.elapsed
+        return self.removed / elapsed if elapsed > 0 else 0.0
+
+
+class _DirNode:
+    """目录节点：记录未完成的子任务数量，归零时删除目录本身"""
+
+    __slots__ = ('path', 'parent', 'pending', 'blocked')
+
+    def __init__(self, path, parent):
+        self.path = path
+        self.parent = parent
+        self.pending = 1  # 目录自身的扫描任务
+        self.blocked = False
+
+
+class RemoveEngine:
+    """并行递归删除引擎"""
+
+    # 单个目录中文件过多时，按批次拆分为多个删除任务
+    BATCH_SIZE = 512
+    # 保留的错误详情数量上限，避免海量失败时内存无限增长
+    MAX_ERROR_DETAILS = 100
+
+    def __init__(self, max_workers=None, cross_mounts=False, progress=False, progress_interval=0.5):
+        """
+        :param max_workers: 线程池大小，默认为CPU核数的4倍（上限32），删除是I/O密集型操作
+        :param cross_mounts: 是否允许跨越挂载点删除
+        :param progress: 是否在删除过程中输出进度
+        :param progress_interval: 进度输出间隔（秒）
+        """
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) * 4)
+        self.max_workers = max(1, max_workers)
+        self.cross_mounts = cross_mounts
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+    def remove_tree(self, root):
+        """
+        递归删除目录树
+        :param root: 要删除的目录路径
+        :return: RemoveStats 统计信息
+        """
+        self._stats = RemoveStats()
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._done = threading.Event()
+        # 工作线程和进度线程没有发起线程的输出重定向和错误收集器，开始时记下并沿用
+        self._output = current_output()
+        self._error_context = error_manager.capture_context()
+
+        try:
+            self._root_dev = os.lstat(root).st_dev
+        except OSError as e:
+            self._record_failure(root, e)
+            self._stats.end_time = time.perf_counter()
+            return self._stats
+
+        reporter = None
+        if self.progress:
+            reporter = threading.Thread(target=self._report_progress, daemon=True)
+            reporter.start()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='rm') as pool:
+            self._pool = pool
+            self._submit(self._scan_dir, _DirNode(root, None))
+            self._done.wait()
+
+        self._stats.end_time = time.perf_counter()
+        if reporter is not None:
+            reporter.join()
+        return self._stats
+
+    def _submit(self, func, *args):
+        """提交任务并记录未完成任务数"""
+        with self._lock:
+            self._outstanding += 1
+        self._pool.submit(self._run_task, func, *args)
+
+    def _run_task(self, func, *args):
+        """执行任务，所有任务完成时通知等待方"""
+        try:
+            with error_manager.error_context(self._error_context):
+                func(*args)
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+                finished = self._outstanding == 0
+            if finished:
+                self._done.set()
+
+    def _scan_dir(self, node):
+        """扫描目录：子目录作为新任务提交，文件按批次删除"""
+        batch = []
+        try:
+            with os.scandir(node.path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+
+                    if is_dir:
+                        if not self.cross_mounts and not self._same_device(entry):
+                            # 拒绝跨越挂载点，保留挂载点及其父目录
+                            with self._lock:
+                                self._stats.skipped_mounts += 1
+                            self._record_failure(entry.path, "跳过挂载点（使用 --cross-mounts 允许跨越）")
+                            node.blocked = True
+                            continue
+                        child = _DirNode(entry.path, node)
+                        with self._lock:
+                            node.pending += 1
+                        self._submit(self._scan_dir, child)
+                    else:
+                        batch.append(entry.path)
+                        if len(batch) >= self.BATCH_SIZE:
+                            with self._lock:
+                                node.pending += 1
+                            self._submit(self._unlink_batch, node, batch)
+                            batch = []
+        except OSError as e:
+            self._record_failure(node.path, e)
+            node.blocked = True
+
+        if batch:
+            self._unlink_batch(node, batch, own_task=False)
+        self._finish(node)
+
+    def _unlink_batch(self, node, paths, own_task=True):
+        """删除一批文件"""
+        removed = 0
+        for path in paths:
+            try:
+                self._unlink(path)
+                removed += 1
+            except OSError as e:
+                self._record_failure(path, e)
+                node.blocked = True
+        with self._lock:
+            self._stats.removed += removed
+        if own_task:
+            self._finish(node)
+
+    def _unlink(self, path):
+        """删除单个文件，Windows上自动清除只读属性后重试"""
+        try:
+            os.unlink(path)
+        except PermissionError:
+            if os.name != 'nt':
+                raise
+            os.chmod(path, stat.S_IWRITE)
+            os.unlink(path)
+
+    def _finish(self, node):
+        """子任务完成：计数归零时删除目录并向上传递"""
+        while node is not None:
+            with self._lock:
+                node.pending -= 1
+                if node.pending > 0:
+                    return
+
+            if node.blocked:
+                # 目录中仍有无法删除的内容，父目录同样无法删除
+                if node.parent is not None:
+                    node.parent.blocked = True
+            else:
+                try:
+                    os.rmdir(node.path)
+                    with self._lock:
+                        self._stats.removed += 1
+                except OSError as e:
+                    self._record_failure(node.path, e)
+                    if node.parent is not None:
+                        node.parent.blocked = True
+            node = node.parent
+
+    def _same_device(self, entry):
+        """检查目录是否与根目录位于同一设备"""
+        try:
+            return entry.stat(follow_symlinks=False).st_dev == self._root_dev
+        except OSError:
+            return True
+
+    def _record_failure(self, path, error):
+        """记录删除失败的条目"""
+        with self._lock:
+            self._stats.failed += 1
+            if len(self._stats.errors) < self.MAX_ERROR_DETAILS:
+                self._stats.errors.append((path, str(error)))
+        error_manager.log_error(ErrorCodes.FILE_DELETE_ERROR, f"删除失败: {path}", str(error))
+
+    def _report_progress(self):
+        """周期性输出删除进度"""
+        output = self._output
+        printed = False
+        while not self._done.wait(self.progress_interval):
+            stats = self._stats
+            output.write(f"\r已删除 {stats.removed} 个条目，失败 {stats.failed} 个 ({stats.rate:.0f} 个/秒)")
+            output.flush()
+            printed = True
+        if printed:
+            output.write("\n")
+            output.flush()
@@ -0,0 +1,131 @@
+"""
+执行结果 - 以编程方式执行命令时返回的结构化结果
+CommandExecutor.run_line 返回 CommandResult：退出码、捕获的输出、单独捕获的
+错误信息文本和结构化的错误记录（ErrorRecord）；stream_line 返回 CommandStream，在命令执行期间
+逐块产出输出，迭代结束后可取得 CommandResult。
+输出通过线程级输出代理捕获，不需要替换 sys.stdout，可在多个线程中并发使用。
+"""
+
+import queue
+import threading
+
+from ..BasicManager.ErrorManager import PythonCMDError
+
+_END = object()
+
+
+class CommandResult:
+    """一行命令的执行结果"""
+
+    __slots__ = ('line', 'status', 'output', 'errors', 'duration', 'error_output')
+
+    def __init__(self, line, status, output, errors, duration, error_output=None):
+        self.line = line
+        self.status = status
+        # 捕获的输出文本（不含错误信息）；输出写入调用方提供的输出端时为 None
+        self.output = output
+        # 捕获的错误信息文本；输出写入调用方提供的输出端时为 None（错误信息写到同一输出端）
+        self.error_output = error_output
+        # 执行期间记录的 ErrorRecord 列表
+        self.errors = errors
+        # 耗时（秒）
+        self.duration = duration
+
+    @property
+    def ok(self):
+        return self.status == 0
+
+    def raise_for_status(self):
+        """
+        命令失败时抛出 PythonCMDError（使用第一条错误记录的错误码和信息）
+        :return: self，便于链式调用
+        """
+        if self.status == 0:
+            return self
+        if self.errors:
+            first = self.errors[0]
+            raise PythonCMDError(first.code, first.message, first.details)
+        raise PythonCMDError(self.status, f"命令执行失败: {self.line}", f"退出码 {self.status}")
+
+    def to_dict(self):
+        return {
+            'line': self.line,
+            'status': self.status,
+            'output': self.output,
+            'error_output': self.error_output,
+            'errors': [record.to_dict() for record in self.errors],
+            'duration': self.duration,
+        }
+
+    def __repr__(self):
+        return f"CommandResult(line={self.line!r}, status={self.status}, errors={len(self.errors)})"
+
+
+class _QueueOutput:
+    """把写入的内容放入队列的输出端（供 CommandStream 使用）"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        # 调用方已停止读取时丢弃输出，命令照常执行到结束
+        if text and not self._stream.cancelled:
+            self._stream._chunks.put(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class CommandStream:
+    """
+    流式执行：迭代得到命令的输出块，迭代结束后 result 为 CommandResult
+    命令在后台线程中执行；队列有界，调用方读取较慢时命令的输出会等待。
+    提前结束迭代（break、异常）或调用 close() 后，命令之后的输出被丢弃，
+    后台线程不会阻塞在已满的队列上。
+    """
+
+    def __init__(self, run, max_chunks=256):
+        """
+        :param run: 在后台线程中执行的函数，参数为输出端，返回 CommandResult
+        """
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self._chunks = queue.Queue(max_chunks)
+        self._run = run
+
+    def _worker(self):
+        try:
+            self.result = self._run(_QueueOutput(self))
+        except BaseException as e:
+            self.error = e
+        finally:
+            self._chunks.put(_END)
+
+    def __iter__(self):
+        thread = threading.Thread(target=self._worker, name='command-stream', daemon=True)
+        thread.start()
+        finished = False
+        try:
+            while True:
+                chunk = self._chunks.get()
+                if chunk is _END:
+                    finished = True
+                    break
+                yield chunk
+        finally:
+            if not finished:
+                self.close()
+        thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """停止接收输出：丢弃之后的输出，并清空队列以唤醒等待写入的后台线程"""
+        self.cancelled = True
+        while True:
+            try:
+                self._chunks.get_nowait()
+            except queue.Empty:
+                break
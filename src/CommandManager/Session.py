@@ -0,0 +1,231 @@
+"""
+会话状态 - 每个会话独立的工作目录、环境变量和 shell 变量
+进程的当前目录和 os.environ 是全局状态，多个会话（守护进程的并发连接、
+后台任务）在同一进程的不同线程中执行时会互相干扰。内置命令统一通过
+当前会话解析路径：支持 dir_fd 的系统上，相对路径借助工作目录的文件描述符
+以 *at 系统调用访问；其他系统上拼接为绝对路径后访问。
+"""
+
+import os
+import stat
+import threading
+from contextlib import contextmanager
+
+_session_local = threading.local()
+
+# 当前系统是否支持以目录文件描述符为基准的 *at 系统调用
+_HAS_DIR_FD = (os.open in os.supports_dir_fd and os.stat in os.supports_dir_fd
+               and hasattr(os, 'O_DIRECTORY'))
+
+
+def current_session():
+    """获取当前线程绑定的会话，未绑定时返回 None"""
+    return getattr(_session_local, 'session', None)
+
+
+@contextmanager
+def session_context(session):
+    """在当前线程内把 session 设为当前会话"""
+    previous = getattr(_session_local, 'session', None)
+    _session_local.session = session
+    try:
+        yield session
+    finally:
+        _session_local.session = previous
+
+
+class Session:
+    """会话：工作目录、目录文件描述符、环境变量和 shell 变量"""
+
+    def __init__(self, cwd=None, env=None, variables=None):
+        """
+        :param cwd: 工作目录，默认为进程当前目录
+        :param env: 环境变量字典，默认复制 os.environ
+        :param variables: shell 变量（NAME=value 赋值，不传给外部程序）
+        """
+        self.cwd = os.path.abspath(cwd) if cwd else os.getcwd()
+        self.env = dict(os.environ if env is None else env)
+        self.variables = dict(variables or ())
+        # 最近一条命令的退出码（$?）
+        self.status = 0
+        self._dir_fd = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------ 路径解析
+
+    def resolve(self, path):
+        """把路径解析为绝对路径（相对于会话工作目录，支持 ~）"""
+        path = os.fspath(path)
+        if path.startswith('~'):
+            home = self.env.get('HOME') or self.env.get('USERPROFILE')
+            if home and (len(path) == 1 or path[1] in '/\\'):
+                path = home + path[1:]
+            else:
+                path = os.path.expanduser(path)
+        if not os.path.isabs(path):
+            path = os.path.join(self.cwd, path)
+        return os.path.normpath(path)
+
+    def _at(self, path):
+        """
+        返回 (路径, dir_fd) 供 *at 系统调用使用
+        相对路径在支持时以工作目录描述符为基准，否则转换为绝对路径
+        """
+        path = os.fspath(path)
+        if os.path.isabs(path) or path.startswith('~'):
+            return self.resolve(path), None
+        dir_fd = self.dir_fd
+        if dir_fd is None:
+            return self.resolve(path), None
+        return path or '.', dir_fd
+
+    @property
+    def dir_fd(self):
+        """工作目录的文件描述符（按需打开），不支持时为 None"""
+        if not _HAS_DIR_FD:
+            return None
+        with self._lock:
+            if self._dir_fd is None:
+                try:
+                    self._dir_fd = os.open(self.cwd, os.O_RDONLY | os.O_DIRECTORY)
+                except OSError:
+                    return None
+            return self._dir_fd
+
+    # ------------------------------------------------------------ 工作目录
+
+    def chdir(self, path):
+        """
+        切换会话工作目录（不影响进程的当前目录）
+        :raises FileNotFoundError / NotADirectoryError / PermissionError
+        """
+        target = self.resolve(path)
+        if _HAS_DIR_FD:
+            # 先打开新目录再替换，失败时保持原状态
+            fd = os.open(target, os.O_RDONLY | os.O_DIRECTORY)
+        else:
+            fd = None
+            st = os.stat(target)
+            if not stat.S_ISDIR(st.st_mode):
+                raise NotADirectoryError(f"不是目录: {path}")
+            if not os.access(target, os.X_OK):
+                raise PermissionError(f"无法进入目录: {path}")
+        with self._lock:
+            old_fd = self._dir_fd
+            self._dir_fd = fd
+            self.cwd = target
+        if old_fd is not None:
+            os.close(old_fd)
+        return target
+
+    def fork(self):
+        """复制出独立的子会话（后台任务使用，任务内的 cd 不影响原会话）"""
+        return Session(self.cwd, self.env, self.variables)
+
+    def close(self):
+        """关闭目录文件描述符"""
+        with self._lock:
+            fd, self._dir_fd = self._dir_fd, None
+        if fd is not None:
+            os.close(fd)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------ 文件操作
+
+    def stat(self, path, follow_symlinks=True):
+        path, dir_fd = self._at(path)
+        return os.stat(path, dir_fd=dir_fd, follow_symlinks=follow_symlinks)
+
+    def lstat(self, path):
+        return self.stat(path, follow_symlinks=False)
+
+    def exists(self, path):
+        try:
+            self.stat(path)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def lexists(self, path):
+        try:
+            self.lstat(path)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def isfile(self, path):
+        try:
+            return stat.S_ISREG(self.stat(path).st_mode)
+        except (OSError, ValueError):
+            return False
+
+    def isdir(self, path):
+        try:
+            return stat.S_ISDIR(self.stat(path).st_mode)
+        except (OSError, ValueError):
+            return False
+
+    def islink(self, path):
+        try:
+            return stat.S_ISLNK(self.lstat(path).st_mode)
+        except (OSError, ValueError):
+            return False
+
+    def access(self, path, mode):
+        path, dir_fd = self._at(path)
+        if dir_fd is not None and os.access in os.supports_dir_fd:
+            return os.access(path, mode, dir_fd=dir_fd)
+        return os.access(self.resolve(path), mode)
+
+    def open(self, path, mode='r', **kwargs):
+        """与内置 open 相同，相对路径基于会话工作目录"""
+        path, dir_fd = self._at(path)
+        if dir_fd is not None:
+            kwargs['opener'] = lambda name, flags: os.open(name, flags, 0o666, dir_fd=dir_fd)
+        return open(path, mode, **kwargs)
+
+    def os_open(self, path, flags, mode=0o777):
+        path, dir_fd = self._at(path)
+        return os.open(path, flags, mode, dir_fd=dir_fd)
+
+    def mkdir(self, path, mode=0o777):
+        path, dir_fd = self._at(path)
+        if dir_fd is not None and os.mkdir in os.supports_dir_fd:
+            os.mkdir(path, mode, dir_fd=dir_fd)
+        else:
+            os.mkdir(self.resolve(path), mode)
+
+    def makedirs(self, path, mode=0o777):
+        os.makedirs(self.resolve(path), mode)
+
+    def unlink(self, path):
+        path, dir_fd = self._at(path)
+        if dir_fd is not None and os.unlink in os.supports_dir_fd:
+            os.unlink(path, dir_fd=dir_fd)
+        else:
+            os.unlink(self.resolve(path))
+
+    def utime(self, path, times=None):
+        path, dir_fd = self._at(path)
+        if dir_fd is not None and os.utime in os.supports_dir_fd:
+            os.utime(path, times, dir_fd=dir_fd)
+        else:
+            os.utime(self.resolve(path), times)
+
+    def listdir(self, path='.'):
+        return os.listdir(self.resolve(path))
+
+    def getenv(self, key, default=None):
+        return self.env.get(key, default)
+
+    def getvar(self, name, default=''):
+        """$NAME 的值：先查 shell 变量，再查环境变量"""
+        value = self.variables.get(name)
+        if value is None:
+            value = self.env.get(name, default)
+        return value
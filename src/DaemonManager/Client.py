@@ -0,0 +1,113 @@
+"""
+守护进程客户端
+只导入标准库中的轻量模块和通信协议，启动开销远小于完整的解释器，
+把命令行、当前目录和环境变量发送给守护进程，流式输出结果并返回退出码。
+"""
+
+import os
+import shlex
+import socket
+import sys
+
+from . import Protocol
+
+USAGE = """用法: python client.py [--socket 路径] [-c 命令行 | 命令 [参数...]]
+  --socket 路径   守护进程套接字路径（默认读取 PCNEXT_SOCKET 环境变量）
+  -c 命令行       按原样发送整行命令（可包含 ; && || 等操作符）
+"""
+
+# 与 ErrorCodes.CONNECTION_REFUSED 一致，避免客户端导入完整的错误管理模块
+_CONNECTION_REFUSED = 607
+_PROTOCOL_ERROR = 605
+
+
+def _error(code, message, details=None):
+    text = f"[错误 {code}] {message}"
+    if details:
+        text += f"\n详细信息: {details}"
+    print(text, file=sys.stderr)
+
+
+def _parse_args(argv):
+    """解析命令行参数，返回 (套接字路径, 命令行)；参数错误时返回 None"""
+    socket_path = None
+    args = list(argv)
+    while args:
+        arg = args[0]
+        if arg == '--socket' and len(args) > 1:
+            socket_path = args[1]
+            del args[:2]
+        elif arg.startswith('--socket='):
+            socket_path = arg.split('=', 1)[1]
+            del args[0]
+        elif arg == '-c' and len(args) > 1:
+            return socket_path, ' '.join(args[1:])
+        elif arg in ('-h', '--help'):
+            return None
+        else:
+            break
+    if not args:
+        return None
+    return socket_path, shlex.join(args)
+
+
+def run(line, socket_path=None, stdout=None):
+    """
+    请求守护进程执行一行命令
+    :param stdout: 输出目标，默认为 sys.stdout
+    :return: 退出码
+    """
+    stdout = stdout or sys.stdout
+    socket_path = socket_path or Protocol.default_socket_path()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError as e:
+        sock.close()
+        _error(_CONNECTION_REFUSED, f"无法连接到守护进程: {socket_path}",
+               f"{e}；请先运行 python main.py --daemon")
+        return 1
+
+    with sock:
+        Protocol.send_frame(sock, {
+            't': Protocol.RUN,
+            'line': line,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ),
+        })
+        while True:
+            try:
+                message = Protocol.recv_frame(sock)
+            except KeyboardInterrupt:
+                # 通知守护进程终止命令，继续接收剩余输出和退出码
+                try:
+                    Protocol.send_frame(sock, {'t': Protocol.INTERRUPT})
+                except OSError:
+                    return 130
+                continue
+            except ValueError as e:
+                _error(_PROTOCOL_ERROR, "守护进程返回了无效数据", str(e))
+                return 1
+            if message is None:
+                _error(_PROTOCOL_ERROR, "守护进程意外断开连接")
+                return 1
+            kind = message.get('t')
+            if kind == Protocol.OUTPUT:
+                stdout.write(message.get('d', ''))
+                stdout.flush()
+            elif kind == Protocol.EXIT:
+                return message.get('c', 0)
+
+
+def main(argv=None):
+    """客户端入口"""
+    parsed = _parse_args(sys.argv[1:] if argv is None else argv)
+    if parsed is None:
+        print(USAGE, end='')
+        return 2
+    socket_path, line = parsed
+    if not hasattr(socket, 'AF_UNIX'):
+        _error(_CONNECTION_REFUSED, "当前系统不支持Unix套接字")
+        return 1
+    return run(line, socket_path)
@@ -0,0 +1,70 @@
+"""
+守护进程通信协议
+客户端与守护进程通过本地Unix套接字交换消息帧：
+每帧由4字节大端长度前缀和UTF-8编码的JSON组成。
+
+客户端 -> 守护进程:
+    {"t": "run", "line": 命令行, "cwd": 工作目录, "env": 环境变量}
+    {"t": "int"}                  请求中断正在执行的命令
+守护进程 -> 客户端:
+    {"t": "out", "d": 文本}       命令输出（流式，可能有多帧）
+    {"t": "exit", "c": 退出码}    命令结束
+"""
+
+import json
+import os
+import struct
+import tempfile
+
+_HEADER = struct.Struct('>I')
+# 单帧最大长度，防止异常数据导致分配过大内存
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+RUN = 'run'
+INTERRUPT = 'int'
+OUTPUT = 'out'
+EXIT = 'exit'
+
+
+def default_socket_path():
+    """默认套接字路径：环境变量 PCNEXT_SOCKET，否则为临时目录下按用户区分的文件"""
+    path = os.environ.get('PCNEXT_SOCKET')
+    if path:
+        return path
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+    return os.path.join(tempfile.gettempdir(), f'pcnext-{user}.sock')
+
+
+def send_frame(sock, message):
+    """发送一帧消息"""
+    payload = json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    """
+    接收一帧消息
+    :return: 消息字典，连接关闭时返回 None
+    :raises ValueError: 帧格式错误
+    """
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"消息帧过大: {size} 字节")
+    payload = _recv_exact(sock, size)
+    if payload is None:
+        return None
+    return json.loads(payload.decode('utf-8'))
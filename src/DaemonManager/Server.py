@@ -0,0 +1,195 @@
+"""
+守护进程 - 在本地Unix套接字上提供预热好的命令执行器
+解释器启动、模块导入和命令配置加载只在守护进程启动时发生一次，
+之后每条命令只需一次本地套接字往返。
+"""
+
+import os
+import signal
+import socket
+import socketserver
+import threading
+
+from ..BasicManager.ErrorManager import (
+    ErrorCodes, error_manager, raise_network_error, raise_system_error
+)
+from ..BasicManager.OutputManager import install as install_output, redirect_output
+from ..CommandManager.Command import CommandExecutor
+from ..CommandManager.JobManager import Job, job_context
+from ..CommandManager.Session import Session, session_context
+from ..TraceManager.Recorder import trace_recorder
+from . import Protocol
+
+
+class _SocketOutput:
+    """把命令输出按帧流式发送给客户端，客户端断开后丢弃后续输出"""
+
+    # 缓冲达到该长度时立即发送
+    FLUSH_SIZE = 64 * 1024
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = []
+        self.size = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            if self.closed:
+                return len(text)
+            self.buffer.append(text)
+            self.size += len(text)
+            if self.size >= self.FLUSH_SIZE:
+                self._send()
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            self._send()
+
+    def _send(self):
+        if not self.buffer or self.closed:
+            return
+        text = ''.join(self.buffer)
+        self.buffer = []
+        self.size = 0
+        try:
+            Protocol.send_frame(self.sock, {'t': Protocol.OUTPUT, 'd': text})
+        except OSError:
+            self.closed = True
+
+
+class _SessionHandler(socketserver.BaseRequestHandler):
+    """处理一个客户端连接：执行一条命令并返回输出和退出码"""
+
+    def handle(self):
+        server = self.server
+        try:
+            request = Protocol.recv_frame(self.request)
+        except (OSError, ValueError) as e:
+            error_manager.log_error(ErrorCodes.PROTOCOL_ERROR, "无法读取客户端请求", str(e))
+            return
+        if request is None or request.get('t') != Protocol.RUN:
+            return
+
+        output = _SocketOutput(self.request)
+        # 所有外部进程登记到会话组上，客户端中断或断开时统一终止
+        group = Job(0, request.get('line', ''))
+        watcher = threading.Thread(target=self._watch_client, args=(group,), daemon=True)
+        watcher.start()
+
+        status = server.run_request(request, output, group)
+
+        output.flush()
+        try:
+            Protocol.send_frame(self.request, {'t': Protocol.EXIT, 'c': status})
+        except OSError:
+            pass
+
+    def _watch_client(self, group):
+        """监听客户端的中断请求或断开连接"""
+        try:
+            while True:
+                message = Protocol.recv_frame(self.request)
+                if message is None or message.get('t') == Protocol.INTERRUPT:
+                    break
+        except (OSError, ValueError):
+            pass
+        if not group.finished.is_set():
+            group.kill()
+
+
+def _terminate(signum, frame):
+    """SIGTERM 与 Ctrl+C 一样正常退出，确保清理套接字文件"""
+    raise KeyboardInterrupt
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """命令执行守护进程"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=None):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise_system_error(ErrorCodes.ENVIRONMENT_ERROR, "当前系统不支持Unix套接字", "无法启动守护进程")
+            raise SystemExit(1)
+
+        self.socket_path = socket_path or Protocol.default_socket_path()
+        self._check_stale_socket()
+
+        # 预热：加载命令配置并创建执行器
+        self.executor = CommandExecutor()
+        self.executor.embedded = True
+        install_output()
+
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(self.socket_path, _SessionHandler)
+        finally:
+            os.umask(old_umask)
+
+    def _check_stale_socket(self):
+        """处理遗留的套接字文件：已有守护进程在运行时报错，否则删除"""
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise_network_error(ErrorCodes.PORT_UNAVAILABLE, f"守护进程已在运行: {self.socket_path}", "请勿重复启动")
+        raise SystemExit(1)
+
+    def run_request(self, request, output, group):
+        """
+        在客户端提供的工作目录和环境变量下执行命令，返回退出码
+        每个连接使用独立的会话，多个客户端的命令可以并发执行
+        """
+        line = request.get('line', '')
+        cwd = request.get('cwd')
+        session = Session(env=request.get('env'))
+        try:
+            if cwd:
+                session.chdir(cwd)
+        except OSError as e:
+            output.write(error_manager.format_error_message(
+                ErrorCodes.DIRECTORY_NOT_FOUND, f"无法切换到目录: {cwd}", str(e)) + '\n')
+            group.finished.set()
+            session.close()
+            return 1
+
+        try:
+            with job_context(group), session_context(session), redirect_output(output):
+                try:
+                    status = trace_recorder.execute(self.executor, line, session.cwd)
+                except SystemExit as e:
+                    # exit 命令只结束本次会话
+                    status = e.code if isinstance(e.code, int) else 0
+                except Exception as e:
+                    output.write(error_manager.format_error_message(
+                        ErrorCodes.COMMAND_EXECUTION_FAILED, "命令执行失败", str(e)) + '\n')
+                    status = 1
+            return status if isinstance(status, int) else 0
+        finally:
+            group.finished.set()
+            session.close()
+
+    def serve(self):
+        """启动服务直到收到 Ctrl+C 或 SIGTERM"""
+        signal.signal(signal.SIGTERM, _terminate)
+        print(f"守护进程已启动: {self.socket_path}", flush=True)
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            print("^C")
+        finally:
+            self.server_close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+            print("守护进程已退出")
@@ -0,0 +1 @@
+# DaemonManager 包初始化文件
\ No newline at end of file
@@ -1,7 +1,13 @@
 from .BasicManager.VersionManager import VersionManager
 from .CommandManager.Command import CommandExecutor
+from .CommandManager import Completion
+from .CommandManager.History import History
+from .CommandManager.Parser import is_incomplete
+from .TraceManager.Recorder import trace_recorder
 
 import os
+import sys
+import time
 
 class pc:
     def __init__(self):
@@ -12,23 +18,55 @@ class pc:
         print(f"{self.versionManager.getVersion()}")
         self.main()
     
+    def run_script(self, path):
+        """
+        非交互地执行脚本文件
+        :return: 最后一条命令的退出码
+        """
+        CE = CommandExecutor()
+        return CE.commands_instance.source(path)
+    
     def main(self):
         """
         主函数，持续接收用户输入并执行命令
         包含异常处理，处理键盘中断和其他未知错误
         """
+        # 执行器在整个会话中复用，避免每条命令重新加载命令配置
+        CE = CommandExecutor()
+        # 启用 Tab 补全（readline 不可用的平台上跳过）
+        Completion.install(CE)
+        # 命令历史：只读取文件末尾载入 readline，完整历史在第一次检索时加载
+        CE.history = History()
+        CE.history.attach_readline()
+        # 执行器已安装线程级输出代理，交互命令的输出写入原始标准输出
+        terminal = getattr(sys.stdout, 'original', sys.stdout)
         while True:
             try:
-                # 显示工作目录
-                directory = os.getcwd()
+                # 报告已结束的后台任务
+                CE.jobs.report_finished()
+                
+                # 显示工作目录（会话维护的目录，无需每次调用 getcwd）
+                directory = CE.session.cwd
                 if os.name == 'nt':
-                    print(f"PC {directory}\\ > ", end="")
+                    prompt = f"PC {directory}\\ > "
                 else:
-                    print(f"PC {directory}/ > ", end="")
-                userInput = input("")
-                CE = CommandExecutor()
-                CE.execute(userInput)
+                    prompt = f"PC {directory}/ > "
+                # 提示符交给 input 输出，readline 重绘行时才能正确处理光标位置
+                userInput = input(prompt)
+                # for/if/while 或命令替换未结束时继续读取后续行
+                while is_incomplete(userInput):
+                    userInput += '\n' + input("> ")
+                CE.history.add(userInput)
+                # 交互界面只负责显示：命令通过 run_line 执行，输出直接写到终端
+                started = time.time()
+                result = CE.run_line(userInput, output=terminal)
+                # 启用录制（--record）时记录命令行、耗时和退出码
+                trace_recorder.record(userInput, directory, result.status, started, result.duration)
             except KeyboardInterrupt:
                 print("^C")
+            except EOFError:
+                # 输入结束（Ctrl+D 或管道输入读完）时正常退出
+                print()
+                CE.commands_instance.exit()
             except Exception as e:
                 print(f"Unknown Error: {e}")
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+会话录制 - 把执行的命令行记录为紧凑的跟踪文件
+跟踪文件为 NDJSON：第一行是文件头，之后每行一条记录（JSON 数组）：
+    [相对开始的毫秒数, 工作目录, 命令行, 退出码, 耗时微秒]
+工作目录与上一条记录相同时记为 null，以减小文件体积。路径以 .gz 结尾时
+使用 gzip 压缩。记录先写入缓冲区，程序退出或调用 close 时写入磁盘。
+"""
+
+import atexit
+import gzip
+import json
+import threading
+import time
+
+TRACE_VERSION = 1
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class TraceRecorder:
+    """会话录制器"""
+
+    def __init__(self):
+        self.path = None
+        self.count = 0
+        self._file = None
+        self._start = 0.0
+        self._last_cwd = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._file is not None
+
+    def open(self, path):
+        """开始录制到 path（覆盖已有文件）"""
+        self.close()
+        self._file = _open(path, 'w')
+        self.path = path
+        self.count = 0
+        self._start = time.time()
+        self._last_cwd = None
+        header = {'version': TRACE_VERSION, 'start': self._start}
+        self._file.write(json.dumps(header) + '\n')
+        atexit.register(self.close)
+
+    def record(self, line, cwd, status, started, duration):
+        """
+        记录一条命令行
+        :param started: 开始执行的时间（time.time()）
+        :param duration: 耗时（秒）
+        """
+        if self._file is None or not line.strip():
+            return
+        with self._lock:
+            if self._file is None:
+                return
+            same_dir = cwd == self._last_cwd
+            self._last_cwd = cwd
+            entry = [int((started - self._start) * 1000), None if same_dir else cwd, line,
+                     status if isinstance(status, int) else 0, int(duration * 1e6)]
+            self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self.count += 1
+
+    def execute(self, executor, line, cwd):
+        """通过 executor 执行一行命令并记录（未启用录制时直接执行）"""
+        if self._file is None:
+            return executor.execute(line)
+        started = time.time()
+        begin = time.perf_counter()
+        status = 1
+        try:
+            status = executor.execute(line)
+            return status
+        finally:
+            self.record(line, cwd, status, started, time.perf_counter() - begin)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class TraceEntry:
+    """跟踪文件中的一条记录"""
+
+    __slots__ = ('offset', 'cwd', 'line', 'status', 'duration')
+
+    def __init__(self, offset, cwd, line, status, duration):
+        self.offset = offset        # 相对录制开始的秒数
+        self.cwd = cwd
+        self.line = line
+        self.status = status
+        self.duration = duration    # 录制时的耗时（秒）
+
+
+def load_trace(path):
+    """
+    读取跟踪文件
+    :return: (文件头字典, TraceEntry 列表)
+    :raises ValueError: 文件格式无效
+    """
+    entries = []
+    cwd = None
+    with _open(path, 'r') as f:
+        first = f.readline()
+        try:
+            header = json.loads(first)
+        except json.JSONDecodeError:
+            header = None
+        if not isinstance(header, dict) or header.get('version') != TRACE_VERSION:
+            raise ValueError(f"不是有效的跟踪文件: {path}")
+        for number, text in enumerate(f, 2):
+            if not text.strip():
+                continue
+            try:
+                offset, entry_cwd, line, status, duration = json.loads(text)
+            except (json.JSONDecodeError, ValueError, TypeError):
+                raise ValueError(f"跟踪文件第 {number} 行格式无效")
+            if entry_cwd is not None:
+                cwd = entry_cwd
+            entries.append(TraceEntry(offset / 1000.0, cwd, line, status, duration / 1e6))
+    return header, entries
+
+
+# 全局录制器（--record 启用）
+trace_recorder = TraceRecorder()
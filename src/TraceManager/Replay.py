@@ -0,0 +1,143 @@
+"""
+会话回放 - 用录制的跟踪文件对命令行进行负载测试
+每个并发会话在独立线程中按顺序回放整个跟踪文件，所有会话共用一个
+CommandExecutor（与守护进程相同），各自拥有独立的会话状态，输出被丢弃。
+速度为 1 时按录制时的时间间隔回放，为 N 时间隔缩短为 1/N，为 0 时不等待。
+结束后报告吞吐量、延迟百分位数和退出码与录制时不一致的命令数。
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from ..BasicManager.MetricsManager import Histogram, metrics
+from ..BasicManager.OutputManager import redirect_output
+from ..CommandManager.Command import CommandExecutor
+from ..CommandManager.Session import Session, session_context
+from .Recorder import load_trace
+
+
+class _Discard:
+    """丢弃回放命令的输出"""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class ReplayStats:
+    """回放结果（所有会话汇总）"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.count = 0
+        self.failures = 0
+        self.mismatched = 0
+        self._lock = threading.Lock()
+
+    def add(self, duration_ns, status, expected):
+        with self._lock:
+            self.latency.record(duration_ns)
+            self.count += 1
+            if status != 0:
+                self.failures += 1
+            if status != expected:
+                self.mismatched += 1
+
+
+def _replay_session(executor, entries, speed, stats, stop):
+    session = Session(entries[0].cwd if entries else None)
+    output = _Discard()
+    begin = time.monotonic()
+    with session_context(session), redirect_output(output):
+        for entry in entries:
+            if stop.is_set():
+                break
+            if speed > 0:
+                delay = begin + entry.offset / speed - time.monotonic()
+                if delay > 0 and stop.wait(delay):
+                    break
+            if entry.cwd and entry.cwd != session.cwd:
+                try:
+                    session.chdir(entry.cwd)
+                except OSError:
+                    pass
+            start = time.perf_counter_ns()
+            try:
+                status = executor.execute(entry.line)
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 0
+            except Exception:
+                status = 1
+            stats.add(time.perf_counter_ns() - start, status if isinstance(status, int) else 0, entry.status)
+    session.close()
+
+
+def replay(entries, sessions=1, speed=1.0):
+    """
+    回放跟踪记录
+    :param sessions: 并发会话数（每个会话回放全部记录）
+    :param speed: 回放速度倍数，0 表示不等待
+    :return: (ReplayStats, 总耗时秒数)
+    """
+    executor = CommandExecutor()
+    # exit 等命令只结束回放会话，不终止进程
+    executor.embedded = True
+    stats = ReplayStats()
+    stop = threading.Event()
+    threads = [threading.Thread(target=_replay_session, args=(executor, entries, speed, stats, stop),
+                                name=f'replay-{i}', daemon=True) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.2)
+    except KeyboardInterrupt:
+        stop.set()
+        print("^C 回放已中断，以下为已完成部分的结果", file=sys.stderr)
+    return stats, time.perf_counter() - start
+
+
+def _format_ms(ns):
+    return f"{ns / 1e6:.2f}ms"
+
+
+def report(stats, elapsed, sessions):
+    latency = stats.latency
+    print(f"会话数      {sessions}")
+    print(f"命令数      {stats.count}（失败 {stats.failures}，退出码与录制不一致 {stats.mismatched}）")
+    print(f"总耗时      {elapsed:.2f}s")
+    print(f"吞吐量      {stats.count / elapsed if elapsed else 0:.1f} 条/秒")
+    print(f"延迟        p50 {_format_ms(latency.percentile(50))}  p95 {_format_ms(latency.percentile(95))}  "
+          f"p99 {_format_ms(latency.percentile(99))}  最大 {_format_ms(latency.max)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='回放录制的命令跟踪文件（负载测试）')
+    parser.add_argument('trace', help='跟踪文件（由 main.py --record 生成）')
+    parser.add_argument('-j', '--sessions', type=int, default=1, help='并发会话数')
+    parser.add_argument('-s', '--speed', type=float, default=1.0,
+                        help='回放速度倍数：1 为原速，N 为 N 倍速，0 为不等待')
+    options = parser.parse_args(argv)
+    if options.sessions < 1 or options.speed < 0:
+        parser.error("会话数必须为正整数，速度不能为负数")
+
+    try:
+        header, entries = load_trace(options.trace)
+    except (OSError, ValueError) as e:
+        print(f"无法读取跟踪文件: {e}", file=sys.stderr)
+        return 1
+    if not entries:
+        print("跟踪文件中没有命令")
+        return 0
+
+    # 回放时不记录每条命令的统计，避免影响测量
+    metrics.enabled = False
+    stats, elapsed = replay(entries, options.sessions, options.speed)
+    report(stats, elapsed, options.sessions)
+    return 0
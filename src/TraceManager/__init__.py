@@ -0,0 +1 @@
+# TraceManager 包初始化文件
\ No newline at end of file
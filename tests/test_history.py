@@ -0,0 +1,26 @@
+"""命令历史的回归测试"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.CommandManager.History import History  # noqa: E402
+
+
+def test_oversized_batch_is_written_without_endless_rotation(tmp_path):
+    path = str(tmp_path / 'history')
+    history = History(path, max_bytes=16)
+    history.add('echo ' + 'x' * 64)
+    history.flush()
+
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == 'echo ' + 'x' * 64 + '\n'
+    assert not os.path.exists(path + '.1')
+
+    # 下一批写入时已有内容的文件照常轮转
+    history.add('pwd')
+    history.flush()
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == 'pwd\n'
+    assert os.path.exists(path + '.1')